@@ -0,0 +1,307 @@
+import re
+import sys
+import gzip
+import json
+import time
+import base64
+import hashlib
+import argparse
+import threading
+from urllib.parse import urlsplit, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Local stand-ins of the Kubernetes API server and of S3, serving synthetic
+# Velero resources and gzipped logs. Started by benchmarks/run.py, prints the
+# ports it listens on as one JSON line.
+
+NAMESPACE = "velero"
+BUCKET = "velero"
+PHASES = ["Completed", "Completed", "Completed", "PartiallyFailed", "Failed", "InProgress"]
+SCHEDULES = 20
+
+# Uncompressed size of the logs, the first backup has the large one
+SMALL_LOG_BYTES = 64 * 1024
+LARGE_LOG_BYTES = 16 * 1024 * 1024
+LARGE_LOG_BACKUP = "bench-00000"
+
+
+def backup_name(index):
+    return f"bench-{index:05d}"
+
+def restore_name(index):
+    return f"bench-restore-{index:05d}"
+
+
+def _timestamp(seconds_ago):
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() - seconds_ago))
+
+
+def make_backup(index):
+    schedule = f"schedule-{index % SCHEDULES:02d}"
+    phase = PHASES[index % len(PHASES)]
+    return {
+        "apiVersion": "velero.io/v1",
+        "kind": "Backup",
+        "metadata": {
+            "name": backup_name(index),
+            "namespace": NAMESPACE,
+            "uid": hashlib.md5(str(index).encode()).hexdigest(),
+            "resourceVersion": str(1000 + index),
+            "creationTimestamp": _timestamp(index * 600),
+            "labels": {"velero.io/schedule-name": schedule, "velero.io/storage-location": "default"},
+        },
+        "spec": {
+            "includedNamespaces": [f"app-{index % 50}"],
+            "storageLocation": "default",
+            "ttl": "720h0m0s",
+            "defaultVolumesToFsBackup": True,
+        },
+        "status": {
+            "phase": phase,
+            "errors": 1 if phase == "Failed" else 0,
+            "warnings": index % 3,
+            "startTimestamp": _timestamp(index * 600),
+            "completionTimestamp": None if phase == "InProgress" else _timestamp(index * 600 - 120),
+            "expiration": _timestamp(index * 600 - 720 * 3600),
+            "version": 1,
+            "formatVersion": "1.1.0",
+            "progress": {"itemsBackedUp": 250, "totalItems": 250},
+        },
+    }
+
+
+def make_restore(index):
+    return {
+        "apiVersion": "velero.io/v1",
+        "kind": "Restore",
+        "metadata": {
+            "name": restore_name(index),
+            "namespace": NAMESPACE,
+            "resourceVersion": str(500 + index),
+            "creationTimestamp": _timestamp(index * 3600),
+        },
+        "spec": {"backupName": backup_name(index * 10), "includedNamespaces": ["*"], "restorePVs": True},
+        "status": {"phase": "Completed", "errors": 0, "warnings": 0,
+                   "startTimestamp": _timestamp(index * 3600), "completionTimestamp": _timestamp(index * 3600 - 60)},
+    }
+
+
+def make_schedule(index):
+    return {
+        "apiVersion": "velero.io/v1",
+        "kind": "Schedule",
+        "metadata": {"name": f"schedule-{index:02d}", "namespace": NAMESPACE, "resourceVersion": str(100 + index),
+                     "creationTimestamp": _timestamp(86400 * 30)},
+        "spec": {"schedule": "0 */6 * * *", "template": {"includedNamespaces": [f"app-{index}"], "ttl": "720h0m0s", "storageLocation": "default"}},
+        "status": {"phase": "Enabled", "lastBackup": _timestamp(3600)},
+    }
+
+
+def make_log(size):
+    lines = []
+    total = 0
+    index = 0
+    while total < size:
+        line = f'time="2024-01-01T00:00:{index % 60:02d}Z" level=info msg="Backed up item" backup=velero/bench resource=pods namespace=app-{index % 50} name=pod-{index}\n'
+        lines.append(line)
+        total += len(line)
+        index += 1
+    return gzip.compress("".join(lines).encode("utf-8"))
+
+
+class FakeCluster:
+    def __init__(self, backups, s3_url):
+        self.lock = threading.Lock()
+        self.collections = {
+            "backups": {backup_name(i): make_backup(i) for i in range(backups)},
+            "restores": {restore_name(i): make_restore(i) for i in range(max(backups // 10, 1))},
+            "schedules": {f"schedule-{i:02d}": make_schedule(i) for i in range(SCHEDULES)},
+            "backupstoragelocations": {"default": {
+                "apiVersion": "velero.io/v1", "kind": "BackupStorageLocation",
+                "metadata": {"name": "default", "namespace": NAMESPACE, "resourceVersion": "10", "creationTimestamp": _timestamp(86400 * 60)},
+                "spec": {"provider": "aws", "default": True, "objectStorage": {"bucket": BUCKET},
+                         "config": {"region": "minio", "s3ForcePathStyle": "true", "s3Url": s3_url}},
+                "status": {"phase": "Available", "lastValidationTime": _timestamp(60)},
+            }},
+            "deletebackuprequests": {},
+            "secrets": {"cloud-credentials": {
+                "apiVersion": "v1", "kind": "Secret", "type": "Opaque",
+                "metadata": {"name": "cloud-credentials", "namespace": NAMESPACE, "resourceVersion": "5"},
+                "data": {"cloud": base64.b64encode(b"[default]\naws_access_key_id=bench\naws_secret_access_key=bench\n").decode()},
+            }},
+            "deployments": {"velero": {
+                "apiVersion": "apps/v1", "kind": "Deployment",
+                "metadata": {"name": "velero", "namespace": NAMESPACE, "resourceVersion": "7"},
+                "spec": {"selector": {"matchLabels": {"app": "velero"}}, "template": {
+                    "metadata": {"labels": {"app": "velero"}},
+                    "spec": {"containers": [{"name": "velero", "image": "velero/velero"}],
+                             "volumes": [{"name": "cloud-credentials", "secret": {"secretName": "cloud-credentials"}}]}}},
+            }},
+        }
+        self.resource_version = 100000
+        small = make_log(SMALL_LOG_BYTES)
+        large = make_log(LARGE_LOG_BYTES)
+        self.objects = {f"backups/{name}/{name}-logs.gz": large if name == LARGE_LOG_BACKUP else small for name in self.collections["backups"]}
+        self.objects.update({f"restores/{name}/restore-{name}-logs.gz": small for name in self.collections["restores"]})
+        self.etags = {id(small): hashlib.md5(small).hexdigest(), id(large): hashlib.md5(large).hexdigest()}
+
+
+def _kind(plural):
+    return {"backupstoragelocations": "BackupStorageLocation", "deletebackuprequests": "DeleteBackupRequest"}.get(plural, plural[:-1].capitalize())
+
+
+class KubeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    cluster = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _not_found(self, name):
+        self._send_json(404, {"kind": "Status", "apiVersion": "v1", "status": "Failure", "reason": "NotFound", "code": 404, "message": f"{name} not found"})
+
+    def _route(self):
+        parts = urlsplit(self.path)
+        match = re.fullmatch(r"/(?:api/v1|apis/[^/]+/v1)/namespaces/[^/]+/([^/]+)(?:/([^/]+))?", parts.path)
+        if not match:
+            return None, None, parse_qs(parts.query)
+        return match.group(1), match.group(2), parse_qs(parts.query)
+
+    def _watch(self, query):
+        # No changes happen, hold the watch until its timeout like the API server
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        self.wfile.flush()
+        time.sleep(int(query.get("timeoutSeconds", ["30"])[0]))
+        self.wfile.write(b"0\r\n\r\n")
+
+    def do_GET(self):
+        plural, name, query = self._route()
+        collection = self.cluster.collections.get(plural)
+        if collection is None:
+            return self._not_found(self.path)
+
+        if query.get("watch", ["false"])[0] == "true":
+            return self._watch(query)
+
+        with self.cluster.lock:
+            if name:
+                item = collection.get(name)
+                if item is None:
+                    return self._not_found(name)
+                return self._send_json(200, item)
+
+            items = list(collection.values())
+            field_selector = query.get("fieldSelector", [None])[0]
+            if field_selector and field_selector.startswith("metadata.name="):
+                items = [item for item in items if item["metadata"]["name"] == field_selector.split("=", 1)[1]]
+            label_selector = query.get("labelSelector", [None])[0]
+            if label_selector:
+                key, _, value = label_selector.partition("=")
+                items = [item for item in items if (item["metadata"].get("labels") or {}).get(key) == value]
+            resource_version = str(self.cluster.resource_version)
+
+        self._send_json(200, {"apiVersion": "v1", "kind": _kind(plural) + "List", "metadata": {"resourceVersion": resource_version}, "items": items})
+
+    def do_POST(self):
+        plural, _, _ = self._route()
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        collection = self.cluster.collections.setdefault(plural, {})
+        with self.cluster.lock:
+            self.cluster.resource_version += 1
+            body.setdefault("metadata", {})["resourceVersion"] = str(self.cluster.resource_version)
+            collection[body["metadata"]["name"]] = body
+        self._send_json(201, body)
+
+    def do_DELETE(self):
+        plural, name, _ = self._route()
+        with self.cluster.lock:
+            item = self.cluster.collections.get(plural, {}).pop(name, None)
+        if item is None:
+            return self._not_found(name)
+        self._send_json(200, item)
+
+
+class S3Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    cluster = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _object(self):
+        path = urlsplit(self.path).path.lstrip("/")
+        bucket, _, key = path.partition("/")
+        return self.cluster.objects.get(key) if bucket == BUCKET else None
+
+    def _headers(self, data):
+        self.send_header("Content-Type", "application/gzip")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("ETag", f'"{self.cluster.etags[id(data)]}"')
+        self.end_headers()
+
+    def _missing(self):
+        body = b"<?xml version=\"1.0\" encoding=\"UTF-8\"?><Error><Code>NoSuchKey</Code><Message>The specified key does not exist.</Message></Error>"
+        self.send_response(404)
+        self.send_header("Content-Type", "application/xml")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command == "GET":
+            self.wfile.write(body)
+
+    def do_HEAD(self):
+        data = self._object()
+        if data is None:
+            return self._missing()
+        self.send_response(200)
+        self._headers(data)
+
+    def do_GET(self):
+        data = self._object()
+        if data is None:
+            return self._missing()
+        self.send_response(200)
+        self._headers(data)
+        self.wfile.write(data)
+
+
+def start(backups, host="127.0.0.1"):
+    s3_server = ThreadingHTTPServer((host, 0), S3Handler)
+    s3_url = f"http://{host}:{s3_server.server_port}"
+    cluster = FakeCluster(backups, s3_url)
+    S3Handler.cluster = cluster
+    KubeHandler.cluster = cluster
+    kube_server = ThreadingHTTPServer((host, 0), KubeHandler)
+
+    for server in (s3_server, kube_server):
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    return kube_server, s3_server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Kubernetes API server and S3 serving synthetic Velero data")
+    parser.add_argument("--backups", type=int, default=1000)
+    args = parser.parse_args()
+
+    kube_server, s3_server = start(args.backups)
+    print(json.dumps({"kube": f"http://127.0.0.1:{kube_server.server_port}", "s3": f"http://127.0.0.1:{s3_server.server_port}"}), flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
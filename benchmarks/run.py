@@ -0,0 +1,317 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import subprocess
+import http.client
+from urllib.parse import urlsplit
+
+from benchmarks.fake_cluster import backup_name, restore_name, PHASES, LARGE_LOG_BACKUP
+
+# Boot create_app() against the fake Kubernetes API and S3 of fake_cluster.py,
+# measure latency, throughput and peak RSS of the main read endpoints for
+# several collection sizes and compare them with stored baselines.
+#
+#   python -m benchmarks.run --sizes 1000,10000,50000 --compare
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+
+# A result regresses when it is this much worse than its baseline
+DEFAULT_TOLERANCE = 0.25
+# Latency differences below this are noise whatever the ratio
+LATENCY_SLACK_MS = 5.0
+
+STARTUP_TIMEOUT_SECONDS = 300
+
+
+def _completed_backups(size, count):
+    # Backups with a finished phase, so their logs can be served
+    return [backup_name(index) for index in range(1, size) if PHASES[index % len(PHASES)] == "Completed"][:count]
+
+
+# (name, share of the requests, function of the request number returning a path)
+def scenarios(size):
+    completed = _completed_backups(size, 200)
+    restores = max(size // 10, 1)
+    batch = "&".join(f"name={name}" for name in completed[:50])
+
+    return [
+        ("backups page", 1.0, lambda i: f"/backups?page={i % 20 + 1}&limit=50"),
+        ("backups full list", 0.1, lambda i: "/backups"),
+        ("backups describe", 1.0, lambda i: f"/backups/describe?name={completed[i % len(completed)]}"),
+        ("backups describe batch", 0.5, lambda i: f"/backups/describe?{batch}"),
+        ("backups logs small", 0.5, lambda i: f"/backups/logs?name={completed[i % len(completed)]}"),
+        ("backups logs large", 0.1, lambda i: f"/backups/logs?name={LARGE_LOG_BACKUP}"),
+        ("backups logs search", 0.5, lambda i: f"/backups/logs?name={LARGE_LOG_BACKUP}&namespace=app-{i % 50}&page={i % 5 + 1}"),
+        ("restores page", 1.0, lambda i: f"/restores?page={i % 20 + 1}&limit=50"),
+        ("restores logs", 0.5, lambda i: f"/restores/logs?name={restore_name(i % restores)}"),
+        ("dashboard summary", 1.0, lambda i: "/dashboard/summary"),
+        ("schedules", 1.0, lambda i: "/schedules"),
+        ("storages", 1.0, lambda i: "/storages"),
+    ]
+
+
+def _read_json_line(process, name):
+    line = process.stdout.readline()
+    if not line:
+        raise RuntimeError(f"{name} exited before starting, return code {process.poll()}")
+    return json.loads(line)
+
+
+def _write_kubeconfig(directory, server):
+    path = os.path.join(directory, "kubeconfig")
+    kubeconfig = {
+        "apiVersion": "v1",
+        "kind": "Config",
+        "clusters": [{"name": "bench", "cluster": {"server": server}}],
+        "users": [{"name": "bench", "user": {"token": "bench"}}],
+        "contexts": [{"name": "bench", "context": {"cluster": "bench", "user": "bench", "namespace": "velero"}}],
+        "current-context": "bench",
+    }
+    with open(path, "w") as f:
+        json.dump(kubeconfig, f)
+    return path
+
+
+class Environment:
+    def __init__(self, size, app_env):
+        self.size = size
+        self.app_env = app_env
+        self.processes = []
+        self.directory = tempfile.TemporaryDirectory(prefix="velero-ui-bench-")
+
+    def __enter__(self):
+        fake = self._spawn("fake_cluster", ["--backups", str(self.size)], os.environ.copy())
+        urls = _read_json_line(fake, "fake_cluster")
+
+        env = os.environ.copy()
+        # Not in a cluster, even when the benchmark itself runs in one
+        env.pop("KUBERNETES_SERVICE_HOST", None)
+        env.pop("PROMETHEUS_MULTIPROC_DIR", None)
+        env.update({
+            "KUBECONFIG": _write_kubeconfig(self.directory.name, urls["kube"]),
+            "VELERO_NAMESPACE": "velero",
+            "DISABLE_AUTH": "true",
+            "LOG_CACHE_DIR": os.path.join(self.directory.name, "log-cache"),
+            "HISTORY_DB": os.path.join(self.directory.name, "history.db"),
+        })
+        env.update(self.app_env)
+        self.app = self._spawn("serve_app", [], env)
+        self.url = _read_json_line(self.app, "serve_app")["app"]
+        return self
+
+    def __exit__(self, *exc):
+        for process in reversed(self.processes):
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        self.directory.cleanup()
+
+    def _spawn(self, module, args, env):
+        process = subprocess.Popen([sys.executable, "-m", f"benchmarks.{module}"] + args, cwd=ROOT_DIR, env=env,
+                                   stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        self.processes.append(process)
+        return process
+
+    # Peak resident set size of the app process in MiB (Linux only)
+    def peak_rss_mb(self):
+        try:
+            with open(f"/proc/{self.app.pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        return round(int(line.split()[1]) / 1024, 1)
+        except OSError:
+            pass
+        return None
+
+
+def _get(connection, path):
+    connection.request("GET", path)
+    response = connection.getresponse()
+    body = response.read()
+    return response.status, len(body)
+
+
+def wait_until_ready(env, paths):
+    netloc = urlsplit(env.url).netloc
+    deadline = time.monotonic() + STARTUP_TIMEOUT_SECONDS
+
+    # The first requests start the watches of the caches, wait until all are synced
+    connection = http.client.HTTPConnection(netloc, timeout=STARTUP_TIMEOUT_SECONDS)
+    for path in paths:
+        _get(connection, path)
+
+    while time.monotonic() < deadline:
+        connection.request("GET", "/stats")
+        stats = json.loads(connection.getresponse().read())
+        caches = stats["resourceCache"].values()
+        if caches and all(cache["synced"] for cache in caches):
+            return
+        time.sleep(0.2)
+    raise RuntimeError(f"Caches not synced after {STARTUP_TIMEOUT_SECONDS} seconds")
+
+
+def _percentile(values, fraction):
+    index = min(int(round(fraction * (len(values) - 1))), len(values) - 1)
+    return values[index]
+
+
+# Send requests GETs of path_func(i) from concurrency threads, each with its
+# own keep-alive connection
+def measure(url, path_func, requests, concurrency):
+    netloc = urlsplit(url).netloc
+    latencies = []
+    errors = []
+    transferred = []
+    counter = iter(range(requests))
+    lock = threading.Lock()
+
+    def worker():
+        connection = http.client.HTTPConnection(netloc, timeout=120)
+        while True:
+            with lock:
+                index = next(counter, None)
+            if index is None:
+                break
+            start = time.perf_counter()
+            try:
+                status, size = _get(connection, path_func(index))
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                connection = http.client.HTTPConnection(netloc, timeout=120)
+                status, size = None, 0
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                transferred.append(size)
+                if status != 200:
+                    errors.append(status)
+        connection.close()
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "p50_ms": round(_percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(_percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(_percentile(latencies, 0.99) * 1000, 2),
+        "throughput_rps": round(len(latencies) / duration, 1),
+        "mean_kb": round(sum(transferred) / len(transferred) / 1024, 1),
+    }
+
+
+def run_size(size, requests, concurrency, app_env):
+    print(f"== {size} backups", flush=True)
+    cases = scenarios(size)
+
+    with Environment(size, app_env) as env:
+        started = time.perf_counter()
+        wait_until_ready(env, sorted({path_func(0) for _, _, path_func in cases}))
+        result = {"startup_seconds": round(time.perf_counter() - started, 1), "scenarios": {}}
+
+        for name, share, path_func in cases:
+            stats = measure(env.url, path_func, max(int(requests * share), concurrency), concurrency)
+            result["scenarios"][name] = stats
+            print(f"  {name:<24} p50 {stats['p50_ms']:>9.2f} ms  p95 {stats['p95_ms']:>9.2f} ms  p99 {stats['p99_ms']:>9.2f} ms  "
+                  f"{stats['throughput_rps']:>8.1f} req/s  {stats['mean_kb']:>9.1f} KiB  errors {stats['errors']}", flush=True)
+
+        result["peak_rss_mb"] = env.peak_rss_mb()
+        print(f"  peak RSS {result['peak_rss_mb']} MiB, ready after {result['startup_seconds']} s", flush=True)
+    return result
+
+
+# Regressions of results against baselines, and results without a baseline,
+# as readable lines
+def compare(results, baselines, tolerance):
+    regressions = []
+    for size, result in results.items():
+        baseline = baselines.get(size)
+        if baseline is None:
+            regressions.append(f"{size}: no baseline, record one with --update-baseline")
+            continue
+
+        for name, stats in result["scenarios"].items():
+            reference = baseline["scenarios"].get(name)
+            if reference is None:
+                regressions.append(f"{size} {name}: no baseline, record one with --update-baseline")
+                continue
+            if stats["errors"]:
+                regressions.append(f"{size} {name}: {stats['errors']} failed requests")
+            if stats["p95_ms"] > reference["p95_ms"] * (1 + tolerance) + LATENCY_SLACK_MS:
+                regressions.append(f"{size} {name}: p95 {stats['p95_ms']} ms, baseline {reference['p95_ms']} ms")
+            if stats["throughput_rps"] * (1 + tolerance) < reference["throughput_rps"]:
+                regressions.append(f"{size} {name}: {stats['throughput_rps']} req/s, baseline {reference['throughput_rps']} req/s")
+
+        if result["peak_rss_mb"] and baseline.get("peak_rss_mb") and result["peak_rss_mb"] > baseline["peak_rss_mb"] * (1 + tolerance):
+            regressions.append(f"{size} peak RSS {result['peak_rss_mb']} MiB, baseline {baseline['peak_rss_mb']} MiB")
+    return regressions
+
+
+def _parse_env(values):
+    env = {}
+    for value in values:
+        key, separator, setting = value.partition("=")
+        if not separator:
+            raise argparse.ArgumentTypeError(f"Invalid --env '{value}', use KEY=VALUE")
+        env[key] = setting
+    return env
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark velero-ui against local fake Kubernetes API and S3 servers")
+    parser.add_argument("--sizes", default="1000,10000,50000", help="Comma separated numbers of backups")
+    parser.add_argument("--requests", type=int, default=200, help="Requests of the main scenarios, others send a share of it")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--env", action="append", default=[], help="KEY=VALUE set for the app, e.g. DISABLE_CACHE=true")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--compare", action="store_true", help="Compare with the baselines and exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--update-baseline", action="store_true", help="Store the results as the new baselines")
+    args = parser.parse_args()
+
+    app_env = _parse_env(args.env)
+    results = {}
+    for size in [int(size) for size in args.sizes.split(",") if size]:
+        results[str(size)] = run_size(size, args.requests, args.concurrency, app_env)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    baselines = {}
+    if os.path.exists(BASELINES_FILE):
+        with open(BASELINES_FILE) as f:
+            baselines = json.load(f)
+
+    if args.update_baseline:
+        baselines.update(results)
+        with open(BASELINES_FILE, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baselines written to {BASELINES_FILE}")
+
+    if args.compare:
+        regressions = compare(results, baselines, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print("No regression")
+
+
+if __name__ == "__main__":
+    main()
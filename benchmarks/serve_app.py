@@ -0,0 +1,23 @@
+import json
+import logging
+
+from werkzeug.serving import make_server
+
+from velero_ui import create_app
+
+# Serve create_app() on a free local port with a threaded server, like the
+# gthread workers of the docker image. Configured through the environment set
+# by benchmarks/run.py, prints the port it listens on as one JSON line.
+
+
+def main():
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+
+    app, _ = create_app()
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    print(json.dumps({"app": f"http://127.0.0.1:{server.server_port}"}), flush=True)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
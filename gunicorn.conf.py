@@ -0,0 +1,21 @@
+import os
+import glob
+
+# Metric samples of the workers, see PROMETHEUS_MULTIPROC_DIR in the docker image
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+
+# Drop the samples left by an earlier run of the container, before any worker
+# writes its own
+def on_starting(server):
+    if MULTIPROC_DIR:
+        for path in glob.glob(os.path.join(MULTIPROC_DIR, "*.db")):
+            os.remove(path)
+
+
+# Stop reporting the gauges of a worker once it exits. Its counters and
+# histograms stay in the totals, as Prometheus expects of counters.
+def child_exit(server, worker):
+    if MULTIPROC_DIR:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
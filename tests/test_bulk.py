@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import velero_ui.bulk as bulk
+from velero_ui.bulk import Pacer, parse_duration, select_names
+
+
+@pytest.mark.parametrize("value, seconds", [("30d", 2592000), ("72h", 259200), ("720h0m0s", 2592000), ("90m", 5400), (45, 45)])
+def test_parse_duration(value, seconds):
+    assert parse_duration(value) == seconds
+
+
+@pytest.mark.parametrize("value", ["", "3w", "1.5h", "h", True, None])
+def test_parse_duration_invalid(value):
+    with pytest.raises(ValueError):
+        parse_duration(value)
+
+
+def test_pacer_spreads_calls(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(bulk.time, "monotonic", lambda: 100.0)
+    monkeypatch.setattr(bulk.time, "sleep", sleeps.append)
+
+    pacer = Pacer(10)
+    for _ in range(3):
+        pacer.wait()
+    assert sleeps == pytest.approx([0.1, 0.2])
+
+
+def test_pacer_unlimited(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(bulk.time, "sleep", sleeps.append)
+
+    pacer = Pacer(0)
+    for _ in range(3):
+        pacer.wait()
+    assert sleeps == []
+
+
+def backup(name, age, phase="Completed", labels=None):
+    created = datetime.now(timezone.utc) - timedelta(seconds=age)
+    return {
+        "metadata": {"name": name, "creationTimestamp": created.strftime("%Y-%m-%dT%H:%M:%SZ"), "labels": labels},
+        "status": {"phase": phase},
+    }
+
+
+@pytest.fixture
+def backups(monkeypatch):
+    items = [
+        backup("old-daily", 40 * 86400, labels={"velero.io/schedule-name": "daily"}),
+        backup("old-failed", 40 * 86400, phase="Failed"),
+        backup("new-daily", 3600, labels={"velero.io/schedule-name": "daily", "team": "a"}),
+        {"metadata": {"name": "undated"}, "status": {}},
+    ]
+    monkeypatch.setattr(bulk, "list_custom_objects", lambda plural: {"items": items})
+
+
+@pytest.mark.parametrize("selector, names", [
+    ({"olderThan": "30d"}, ["old-daily", "old-failed"]),
+    ({"newerThan": "1d"}, ["new-daily"]),
+    ({"labels": "velero.io/schedule-name=daily"}, ["new-daily", "old-daily"]),
+    ({"labels": {"velero.io/schedule-name": "daily", "team": "a"}}, ["new-daily"]),
+    ({"phase": "Failed,New"}, ["old-failed", "undated"]),
+    ({"olderThan": "30d", "phase": ["Completed"]}, ["old-daily"]),
+])
+def test_select_names(backups, selector, names):
+    assert select_names("backups", selector) == names
+
+
+@pytest.mark.parametrize("selector", [{}, [], {"name": "x"}, {"labels": "team"}, {"labels": 1}, {"olderThan": "soon"}])
+def test_select_names_invalid(backups, selector):
+    with pytest.raises(ValueError):
+        select_names("backups", selector)
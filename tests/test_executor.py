@@ -0,0 +1,82 @@
+import time
+import threading
+
+import pytest
+
+from velero_ui.executor import gather, gather_map, submit_limited
+
+
+def test_gather_keeps_order():
+    assert gather(lambda: 1, lambda: 2, lambda: 3) == [1, 2, 3]
+    assert gather_map(lambda item: item * 2, [1, 2, 3]) == [2, 4, 6]
+
+
+def test_gather_raises():
+    def fail():
+        raise KeyError("missing")
+
+    with pytest.raises(KeyError):
+        gather(lambda: 1, fail)
+
+
+def test_gather_nested_runs_inline():
+    assert gather(lambda: gather(lambda: 1, lambda: 2), lambda: 3) == [[1, 2], 3]
+
+
+def test_submit_limited_results_in_order():
+    futures = submit_limited(lambda item: item * item, range(20), 3)
+    assert [future.result(timeout=10) for future in futures] == [item * item for item in range(20)]
+
+
+def test_submit_limited_bounds_concurrency():
+    lock = threading.Lock()
+    running = [0]
+    peak = [0]
+
+    def call(item):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.01)
+        with lock:
+            running[0] -= 1
+        return item
+
+    futures = submit_limited(call, range(12), 2)
+    assert [future.result(timeout=10) for future in futures] == list(range(12))
+    assert peak[0] <= 2
+
+
+def test_submit_limited_exception():
+    def call(item):
+        if item == 1:
+            raise ValueError(item)
+        return item
+
+    futures = submit_limited(call, range(3), 1)
+    assert futures[0].result(timeout=10) == 0
+    with pytest.raises(ValueError):
+        futures[1].result(timeout=10)
+    assert futures[2].result(timeout=10) == 2
+
+
+def test_submit_limited_cancel_skips_pending():
+    release = threading.Event()
+    called = []
+
+    def call(item):
+        called.append(item)
+        release.wait(10)
+        return item
+
+    futures = submit_limited(call, range(5), 1)
+    for future in futures[1:]:
+        future.cancel()
+    release.set()
+    assert futures[0].result(timeout=10) == 0
+    assert all(future.cancelled() for future in futures[1:])
+    assert called == [0]
+
+
+def test_submit_limited_no_items():
+    assert submit_limited(lambda item: item, [], 4) == []
@@ -0,0 +1,98 @@
+import pytest
+from flask import Flask
+from werkzeug.datastructures import MultiDict
+
+import velero_ui.list_query as list_query
+from velero_ui.cache import sort_items
+from velero_ui.list_query import _ordered_slice, query_list, list_response
+
+
+def backup(i, phase="Completed"):
+    return {
+        "metadata": {"name": f"b{i:02d}", "creationTimestamp": f"2024-01-{i + 1:02d}T00:00:00Z" if i < 8 else None},
+        "spec": {"storageLocation": "default" if i % 2 else "other"},
+        "status": {"phase": phase if i % 3 else "Failed"},
+    }
+
+
+@pytest.fixture
+def backups(monkeypatch):
+    items = [backup(i) for i in range(10)]
+    version = {"value": "100"}
+
+    def sorted_custom_objects(plural, sort, key_func):
+        return (*sort_items(items, key_func), version["value"])
+
+    monkeypatch.setattr(list_query, "multi_cluster_enabled", lambda: False)
+    monkeypatch.setattr(list_query, "sorted_custom_objects", sorted_custom_objects)
+    list_query.encoded_cache.clear()
+    return version
+
+
+def test_ordered_slice_missing_last():
+    valued, missing = [1, 2, 3], ["x", "y"]
+    assert _ordered_slice(valued, missing, False, 0, 10) == [1, 2, 3, "x", "y"]
+    assert _ordered_slice(valued, missing, True, 0, 10) == [3, 2, 1, "x", "y"]
+    assert _ordered_slice(valued, missing, True, 2, 4) == [1, "x"]
+    assert _ordered_slice(valued, missing, False, 4, 6) == ["y"]
+    assert _ordered_slice(valued, missing, False, 6, 8) == []
+
+
+def names(result):
+    return [item["metadata"]["name"] for item in result["items"]]
+
+
+def test_query_list_pages(backups):
+    result, version = query_list("backups", MultiDict({"page": "2", "limit": "3"}))
+    assert version == "100"
+    assert (result["total"], result["page"], result["limit"], result["order"]) == (10, 2, 3, "desc")
+    assert names(result) == ["b04", "b03", "b02"]
+
+    result, _ = query_list("backups", MultiDict({"page": "3", "limit": "3"}))
+    assert names(result) == ["b01", "b00", "b08"]
+
+
+def test_query_list_whole_collection(backups):
+    result, _ = query_list("backups", MultiDict({"sort": "name"}))
+    assert result["limit"] is None
+    assert names(result) == [f"b{i:02d}" for i in range(10)]
+
+
+def test_query_list_filters(backups):
+    result, _ = query_list("backups", MultiDict({"phase": "Failed", "storageLocation": "other", "sort": "name"}))
+    assert names(result) == ["b00", "b06"]
+    assert result["total"] == 2
+
+
+@pytest.mark.parametrize("args", [{"sort": "size"}, {"order": "up"}, {"page": "0"}, {"limit": "x"}])
+def test_query_list_invalid(backups, args):
+    with pytest.raises(ValueError):
+        query_list("backups", MultiDict(args))
+
+
+def test_query_list_storage_location_not_supported(backups):
+    with pytest.raises(ValueError):
+        query_list("restores", MultiDict({"storageLocation": "default"}))
+
+
+def test_list_response_etag(backups):
+    app = Flask(__name__)
+    with app.test_request_context("/backups?page=1&limit=2"):
+        response = list_response("backups")
+        etag = response.headers["ETag"]
+        assert response.status_code == 200
+        assert response.get_json()["items"][0]["name"] == "b07"
+
+    with app.test_request_context("/backups?page=1&limit=2", headers={"If-None-Match": etag}):
+        response = list_response("backups")
+        assert response.status_code == 304
+        assert response.headers["ETag"] == etag
+
+    with app.test_request_context("/backups?page=2&limit=2", headers={"If-None-Match": etag}):
+        assert list_response("backups").status_code == 200
+
+    backups["value"] = "101"
+    with app.test_request_context("/backups?page=1&limit=2", headers={"If-None-Match": etag}):
+        response = list_response("backups")
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
@@ -0,0 +1,90 @@
+import pytest
+from werkzeug.datastructures import MultiDict
+
+from velero_ui.log_index import LogIndex, parse_logfmt, parse_search_options, is_log_search, _stream_search
+
+LINES = [
+    b'time="2024-01-01T00:00:00Z" level=info msg="Starting backup" backup=velero/daily logSource="pkg/backup/backup.go:1"\n',
+    b'time="2024-01-01T00:00:01Z" level=info msg="Processing item" backup=velero/daily name=web namespace=shop resource=pods\n',
+    b'time="2024-01-01T00:00:02Z" level=warning msg="Skipping item namespace=shop" backup=velero/daily name=cfg namespace=shop resource=configmaps\n',
+    b'time="2024-01-01T00:00:03Z" level=error msg="Error backing up item" backup=velero/daily error="timed out" name=db namespace=data resource=pods\n',
+    b'time="2024-01-01T00:00:04Z" level=info msg="Processing item" backup=velero/daily name=db namespace=data resource=persistentvolumeclaims\n',
+    b'plain line without fields\n',
+]
+
+
+@pytest.fixture
+def index(tmp_path):
+    path = tmp_path / "log"
+    path.write_bytes(b"".join(LINES))
+    return LogIndex(str(path))
+
+
+def test_parse_logfmt():
+    fields = parse_logfmt(LINES[3])
+    assert fields["level"] == "error"
+    assert fields["msg"] == "Error backing up item"
+    assert fields["error"] == "timed out"
+    assert fields["namespace"] == "data"
+
+
+def test_index_postings(index):
+    assert len(index) == len(LINES)
+    assert list(index.fields["namespace"].postings[index.fields["namespace"].names.index("shop")]) == [1, 2]
+    counts = index.counts()
+    assert {"name": "info", "count": 3} in counts["level"]
+    assert {"name": None, "count": 2} in counts["namespace"]
+    assert {"name": "pods", "count": 2} in counts["resource"]
+
+
+@pytest.mark.parametrize("filters, q, numbers", [
+    ({}, None, [0, 1, 2, 3, 4, 5]),
+    ({"level": {"info"}}, None, [0, 1, 4]),
+    ({"level": {"info", "error"}, "namespace": {"data"}}, None, [3, 4]),
+    ({"namespace": {"data"}, "resource": {"pods"}}, None, [3]),
+    ({"namespace": {"nope"}}, None, []),
+    ({}, "PROCESSING", [1, 4]),
+    ({"level": {"info"}}, "db", [4]),
+    ({}, "plain", [5]),
+])
+def test_index_search(index, filters, q, numbers):
+    found, total = index.search(filters, q, 0, 100)
+    assert (found, total) == (numbers, len(numbers))
+    streamed, lines, streamed_total, _ = _stream_search([b"".join(LINES)], filters, q, 0, 100)
+    assert (streamed, streamed_total) == (numbers, len(numbers))
+    assert lines == [LINES[number] for number in numbers]
+
+
+def test_index_search_page(index):
+    assert index.search({}, None, 2, 4) == ([2, 3], 6)
+    assert index.search({"level": {"info"}}, "item", 1, 2) == ([4], 2)
+
+
+def test_index_read_lines(index):
+    assert index.read_lines([3, 0]) == [LINES[3], LINES[0]]
+
+
+def test_empty_index(tmp_path):
+    path = tmp_path / "log"
+    path.write_bytes(b"")
+    index = LogIndex(str(path))
+    assert len(index) == 0
+    assert index.search({}, "x", 0, 10) == ([], 0)
+    assert index.search({"level": {"info"}}, None, 0, 10) == ([], 0)
+
+
+def test_parse_search_options():
+    args = MultiDict({"level": "WARN,err", "namespace": "a,b", "q": "x", "page": "2", "limit": "5000"})
+    assert is_log_search(args)
+    assert parse_search_options(args) == {
+        "filters": {"level": {"warning", "error"}, "namespace": {"a", "b"}},
+        "q": "x",
+        "page": 2,
+        "limit": 1000,
+    }
+    assert not is_log_search(MultiDict({"tail": "10", "bytes": "100"}))
+
+
+def test_parse_search_options_invalid():
+    with pytest.raises(ValueError):
+        parse_search_options(MultiDict({"page": "0"}))
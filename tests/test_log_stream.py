@@ -0,0 +1,91 @@
+import gzip
+
+import pytest
+
+from velero_ui.log_stream import gunzip_stream, byte_window, split_lines, join_lines, tail_lines, filter_log, parse_log_options
+
+
+def chunked(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def test_gunzip_stream_small_chunks():
+    text = b"".join(b"line %d\n" % i for i in range(10000))
+    assert b"".join(gunzip_stream(chunked(gzip.compress(text), 7))) == text
+
+
+def test_gunzip_stream_concatenated_members():
+    data = gzip.compress(b"first\n") + gzip.compress(b"second\n")
+    assert b"".join(gunzip_stream(chunked(data, 5))) == b"first\nsecond\n"
+
+
+def test_gunzip_stream_empty():
+    assert list(gunzip_stream([])) == []
+
+
+def test_gunzip_stream_truncated():
+    data = gzip.compress(b"x" * 100000 + b"".join(b"%d\n" % i for i in range(10000)))
+    with pytest.raises(EOFError):
+        b"".join(gunzip_stream([data[:len(data) // 2]]))
+
+
+def test_gunzip_stream_truncated_second_member():
+    data = gzip.compress(b"first\n") + gzip.compress(b"second\n")
+    with pytest.raises(EOFError):
+        b"".join(gunzip_stream([data[:-4]]))
+
+
+@pytest.mark.parametrize("offset, limit", [(0, None), (0, 5), (3, 4), (5, 0), (9, 100), (30, 5)])
+def test_byte_window(offset, limit):
+    data = b"abcdefghijklmnopqrstuvwxyz"
+    expected = data[offset:offset + limit] if limit else data[offset:]
+    assert b"".join(byte_window(chunked(data, 4), offset, limit)) == expected
+
+
+def test_byte_window_stops_reading():
+    read = []
+
+    def chunks():
+        for chunk in chunked(b"0123456789" * 10, 10):
+            read.append(chunk)
+            yield chunk
+
+    assert b"".join(byte_window(chunks(), 5, 10)) == b"5678901234"
+    assert len(read) == 2
+
+
+def test_split_lines_across_chunks():
+    assert list(split_lines([b"a\nb", b"c\n", b"d"])) == [b"a\n", b"bc\n", b"d"]
+
+
+def test_join_lines():
+    lines = [b"x" * 1000 + b"\n"] * 200
+    chunks = list(join_lines(lines))
+    assert len(chunks) > 1
+    assert b"".join(chunks) == b"".join(lines)
+
+
+def test_tail_lines():
+    assert list(tail_lines(iter([b"1\n", b"2\n", b"3\n"]), 2)) == [b"2\n", b"3\n"]
+
+
+def test_filter_log_grep_then_tail():
+    chunks = chunked(b"".join(b"%s %d\n" % (b"error" if i % 3 == 0 else b"info", i) for i in range(20)), 6)
+    assert b"".join(filter_log(chunks, tail=2, grep="error")) == b"error 15\nerror 18\n"
+
+
+def test_filter_log_without_options():
+    chunks = [b"a\n", b"b\n"]
+    assert list(filter_log(chunks)) == chunks
+
+
+def test_parse_log_options():
+    assert parse_log_options({"tail": "5", "offset": "10", "bytes": "100", "grep": "x"}) == {
+        "tail": 5, "offset": 10, "limit": 100, "grep": "x"}
+    assert parse_log_options({}) == {"tail": None, "offset": 0, "limit": None, "grep": None}
+
+
+@pytest.mark.parametrize("args", [{"tail": "0"}, {"offset": "-1"}, {"bytes": "abc"}])
+def test_parse_log_options_invalid(args):
+    with pytest.raises(ValueError):
+        parse_log_options(args)
@@ -0,0 +1,90 @@
+import velero_ui.relations as relations
+from velero_ui.relations import RelationIndex
+
+
+def backup(name, schedule):
+    return {"metadata": {"name": name, "labels": {"velero.io/schedule-name": schedule} if schedule else {}}}
+
+
+# Collection cache replaying the events recorded after a resourceVersion
+class FakeCache:
+    def __init__(self, items, version):
+        self.items = items
+        self.version = version
+        self.events = []
+        self.fresh = True
+        self.lists = 0
+        self.listed = None
+
+    def is_fresh(self):
+        return self.fresh
+
+    def record(self, event_type, obj):
+        self.version += 1
+        self.events.append((str(self.version), event_type, obj))
+
+    def list(self):
+        self.lists += 1
+        self.listed = str(self.version)
+        self.events = []
+        return {"items": list(self.items), "metadata": {"resourceVersion": self.listed}}
+
+    def events_since(self, resource_version, timeout):
+        versions = [self.listed] + [version for version, _, _ in self.events]
+        if resource_version not in versions:
+            return None
+        return self.events[versions.index(resource_version):]
+
+
+def test_synced_index_replays_events(monkeypatch):
+    cache = FakeCache([backup("a", "daily"), backup("b", "weekly")], 10)
+    monkeypatch.setattr(relations, "get_cache", lambda plural: cache)
+    index = RelationIndex("backups", relations._backup_schedule)
+
+    assert index.related("daily") == {"a"}
+    assert index.resource_version == "10"
+
+    cache.record("ADDED", backup("c", "daily"))
+    cache.record("MODIFIED", backup("b", "daily"))
+    cache.record("DELETED", backup("a", "daily"))
+    assert index.related("daily") == {"b", "c"}
+    assert index.related("weekly") == set()
+    assert index.resource_version == "13"
+    assert cache.lists == 1
+
+
+def test_synced_index_rebuilds_when_events_expired(monkeypatch):
+    cache = FakeCache([backup("a", "daily")], 10)
+    monkeypatch.setattr(relations, "get_cache", lambda plural: cache)
+    index = RelationIndex("backups", relations._backup_schedule)
+    index.sync()
+
+    # The cache listed again, forgetting the changes recorded before
+    cache.items = [backup("b", "daily")]
+    cache.version = 20
+    cache.listed = "20"
+    cache.events = []
+    assert index.related("daily") == {"b"}
+    assert cache.lists == 2
+
+
+def test_synced_index_lists_once_per_version(monkeypatch):
+    cache = FakeCache([], 0)
+    cache.fresh = False
+    lists = []
+
+    def list_custom_objects(plural):
+        lists.append(plural)
+        return {"items": [backup("a", "daily")], "metadata": {"resourceVersion": "5"}}
+
+    monkeypatch.setattr(relations, "get_cache", lambda plural: cache)
+    monkeypatch.setattr(relations, "list_custom_objects", list_custom_objects)
+    index = RelationIndex("backups", relations._backup_schedule)
+    rebuilds = []
+    monkeypatch.setattr(index, "_rebuild", lambda items: rebuilds.append(items) or RelationIndex._rebuild(index, items))
+
+    assert index.sync() is None
+    assert index.sync() is None
+    assert index.related("daily") == {"a"}
+    assert len(lists) == 3
+    assert len(rebuilds) == 1
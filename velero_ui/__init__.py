@@ -7,8 +7,11 @@ from werkzeug.middleware.proxy_fix import ProxyFix
 from flask_restful import Api
 from flask_cors import CORS
 
-from velero_ui.user import create_admin_user_if_not_exists
-from velero_ui.kube_api import auth
+from velero_ui.clusters import init_clusters
+from velero_ui.history import init_history
+from velero_ui.metrics import init_metrics
+from velero_ui.assets import init_assets
+from velero_ui.health import init_startup
 
 from velero_ui.routes import configure_routes
 
@@ -20,7 +23,6 @@ def create_app():
     app.wsgi_app = ProxyFix(app.wsgi_app, x_prefix=1)
     app.template_folder = "templates"
     app.secret_key = "secret_key"
-    app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 0
     CORS(app)
     api = Api(app)
 
@@ -40,13 +42,23 @@ def create_app():
             handler.setFormatter(formatter)
             handler.setLevel(logging.DEBUG)  # Set the desired log level
     
+    # Request metrics first, so the timing covers the other request hooks
+    init_metrics(app)
+
+    # Versioned, compressed static files and compressed JSON responses
+    init_assets(app)
+
     # Configure routing
     configure_routes(app, api, api_version, use_auth)
 
-    # Authenticate Velero UI client toward Velero server
-    auth()
+    # Load the kube config, start the caches and ensure the admin user exists
+    # in the background, so the worker answers health probes at once
+    init_startup()
+
+    # Other clusters merged into the lists, when CLUSTERS is set
+    init_clusters()
 
-    # Call this function at startup to ensure the admin user exists
-    create_admin_user_if_not_exists()
+    # Record backup outcomes in the history database
+    init_history()
 
     return app, api
@@ -0,0 +1,202 @@
+import os
+import re
+import gzip
+import hashlib
+import logging
+import mimetypes
+import posixpath
+import threading
+
+from flask import request, current_app, Response, send_from_directory
+
+logger = logging.getLogger(__name__)
+
+DISABLE_COMPRESSION = os.getenv("DISABLE_COMPRESSION", "").lower() == "true"
+
+# JSON responses at least this large are gzip compressed for clients accepting it
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+
+# Compression level of JSON responses, computed on every response
+JSON_GZIP_LEVEL = 5
+
+# Static assets are compressed once, as much as possible
+ASSET_GZIP_LEVEL = 9
+
+# Assets requested with their current version never change
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+
+# Relative module specifiers of import statements and dynamic imports
+MODULE_IMPORT_PATTERN = re.compile(r"""(\bfrom\s*|\bimport\s*\(?\s*)(["'])(\.{1,2}/[^"'?]+)\2""")
+
+
+# A static file with its content version and its compressed variants,
+# computed when the assets are loaded so requests never compress
+class Asset:
+    def __init__(self, body, mimetype):
+        self.body = body
+        self.mimetype = mimetype
+        self.version = hashlib.sha256(body).hexdigest()[:12]
+        self.compressible = mimetype.startswith(COMPRESSIBLE_TYPES)
+        self.variants = {}
+        if self.compressible and not DISABLE_COMPRESSION:
+            self.variants["gzip"] = self._smaller(gzip.compress(body, ASSET_GZIP_LEVEL, mtime=0))
+
+    # compressed, None when compression does not pay off
+    def _smaller(self, compressed):
+        return compressed if len(compressed) < len(self.body) else None
+
+    # Body compressed with encoding, None when compression does not pay off
+    def variant(self, encoding):
+        return self.variants.get(encoding)
+
+
+# Content hashed static files of a folder. JavaScript modules import each other
+# with relative specifiers, which are rewritten to carry the version of the
+# imported module so a page and its imports share the same module instances.
+class AssetManifest:
+    def __init__(self, folder):
+        self.folder = folder
+        self.lock = threading.Lock()
+        self.assets = {}
+        self.signature = None
+        self.load()
+
+    def _files(self):
+        files = {}
+        for directory, _, names in os.walk(self.folder):
+            for name in names:
+                path = os.path.join(directory, name)
+                stat = os.stat(path)
+                files[os.path.relpath(path, self.folder).replace(os.sep, "/")] = (stat.st_mtime_ns, stat.st_size)
+        return files
+
+    def load(self):
+        files = self._files()
+        sources = {}
+        for filename in files:
+            with open(os.path.join(self.folder, filename), "rb") as f:
+                sources[filename] = f.read()
+
+        assets = {}
+
+        def build(filename, building):
+            if filename in assets:
+                return assets[filename]
+            body = sources[filename]
+            mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+            if filename.endswith(".js"):
+                building = building | {filename}
+
+                def versioned(match):
+                    target = posixpath.normpath(posixpath.join(posixpath.dirname(filename), match.group(3)))
+                    if target not in sources or target in building:
+                        return match.group(0)
+                    version = build(target, building).version
+                    return f"{match.group(1)}{match.group(2)}{match.group(3)}?v={version}{match.group(2)}"
+
+                body = MODULE_IMPORT_PATTERN.sub(versioned, body.decode("utf-8")).encode("utf-8")
+                mimetype = "application/javascript"
+
+            assets[filename] = Asset(body, mimetype)
+            return assets[filename]
+
+        for filename in sources:
+            build(filename, frozenset())
+
+        with self.lock:
+            self.assets = assets
+            self.signature = files
+        logger.debug(f"Loaded {len(assets)} static assets")
+
+    # Reload when a file changed, for local development
+    def refresh(self):
+        if self._files() != self.signature:
+            self.load()
+
+    def get(self, filename):
+        if current_app.debug:
+            self.refresh()
+        with self.lock:
+            return self.assets.get(filename)
+
+
+manifest = None
+
+
+def _preferred_encoding(asset):
+    if DISABLE_COMPRESSION or not asset.compressible:
+        return None
+    if request.accept_encodings["gzip"]:
+        return "gzip"
+    return None
+
+
+def _add_version(endpoint, values):
+    if endpoint != "static" or manifest is None or "filename" not in values:
+        return
+    asset = manifest.get(values["filename"])
+    if asset is not None:
+        values.setdefault("v", asset.version)
+
+
+# Serve a static file from memory, compressed when the client accepts it.
+# Requests carrying the current version of the file may be cached forever,
+# others are revalidated with the ETag.
+def serve_static(filename):
+    asset = manifest.get(filename) if manifest is not None else None
+    if asset is None:
+        return send_from_directory(current_app.static_folder, filename)
+
+    if request.if_none_match.contains_weak(asset.version):
+        response = Response(status=304)
+    else:
+        encoding = _preferred_encoding(asset)
+        body = asset.variant(encoding) if encoding else None
+        response = Response(body if body is not None else asset.body, mimetype=asset.mimetype)
+        if body is not None:
+            response.headers["Content-Encoding"] = encoding
+
+    response.set_etag(asset.version, weak=True)
+    response.vary.add("Accept-Encoding")
+    if request.args.get("v") == asset.version:
+        response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+    else:
+        response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+# gzip JSON responses of at least COMPRESS_MIN_BYTES. Streamed responses
+# (logs, events) are left alone.
+def compress_response(response):
+    if DISABLE_COMPRESSION or response.mimetype != "application/json":
+        return response
+    if response.direct_passthrough or response.is_streamed or "Content-Encoding" in response.headers:
+        return response
+
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_BYTES:
+        return response
+    response.vary.add("Accept-Encoding")
+    if not request.accept_encodings["gzip"]:
+        return response
+
+    response.set_data(gzip.compress(data, JSON_GZIP_LEVEL, mtime=0))
+    response.headers["Content-Encoding"] = "gzip"
+    # The compressed body is another representation of the same content
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+# Fingerprint the static files, version their URLs and compress responses
+def init_assets(app):
+    global manifest
+
+    manifest = AssetManifest(app.static_folder)
+    app.url_defaults(_add_version)
+    app.view_functions["static"] = serve_static
+    app.after_request(compress_response)
@@ -1,16 +1,25 @@
-import json
 import velero_ui.velero_api as velero_api
-import yaml
+from velero_ui.list_query import list_response
+from velero_ui.events import events_response
+from velero_ui.bulk import bulk_delete
+from velero_ui.relations import restores_by_backup, related_summaries
+from velero_ui.log_stream import parse_log_options, log_response
+from velero_ui.log_index import is_log_search, parse_search_options, search_log
+from velero_ui.log_batch import log_batch_response
+from velero_ui.describe import describe_details_response, is_batch_describe
+from velero_ui.contents import query_contents, ContentsUnavailable
 import logging
 
-from flask import request, jsonify
+from flask import request
 
 logger = logging.getLogger(__name__)
 
 # Function for getting the list of backups
 def get_backup_list():
-    backups = json.dumps(velero_api.get_backup_list())
-    return jsonify(backups)
+    try:
+        return list_response("backups")
+    except ValueError as e:
+        return {"message": str(e)}, 400
 
 # Function for creating a backup
 def create_backup():
@@ -93,16 +102,90 @@ def get_backup_logs():
     if not backup_name:
         return {"message": "Backup name is required as a query parameter"}
 
+    try:
+        options = parse_log_options(request.args)
+        search = parse_search_options(request.args) if is_log_search(request.args) else None
+    except ValueError as e:
+        return {"message": str(e)}, 400
+
+    # Structured search: a page of the parsed lines matching the filters
+    if search is not None:
+        log_object = velero_api.find_backup_log(backup_name)
+        if isinstance(log_object, str):
+            return {"message": log_object}
+        result = search_log(log_object, search)
+        if result is None:
+            return {"message": f"Cannot retrieve logs of backup {backup_name}"}
+        return result
+
+    # Either a message explaining why there is no log, or the log content
     output = velero_api.get_backup_log(backup_name)
+    if output is None:
+        return {"message": f"Cannot retrieve logs of backup {backup_name}"}
+    if isinstance(output, str):
+        return {"message": output}
 
-    return {"logs": output}
+    return log_response(output, options)
+
+# Function to stream the logs of several backups at once, by name or by selector
+def get_backup_logs_batch():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return {"message": "Request body must be a JSON object"}, 400
+
+    try:
+        return log_batch_response("backups", data)
+    except ValueError as e:
+        return {"message": str(e)}, 400
 
 # Function to describe a backup
 def describe_backup():
-    backup_name = request.args.get("name")
-    if not backup_name:
+    backup_names = [name for name in request.args.getlist("name") if name]
+    if not backup_names:
         return {"message": "Backup name is required as a query parameter"}
 
-    output = velero_api.get_backup_describe(backup_name)
+    # details=true answers structured descriptions with the progress of the
+    # file system volume backups
+    if request.args.get("details", "").lower() == "true":
+        return describe_details_response("backups", backup_names, is_batch_describe(request.args))
+
+    # Batch form name=a&name=b... or batch=true answers the descriptions of
+    # all found backups
+    if is_batch_describe(request.args):
+        try:
+            return {"items": velero_api.get_describes("backups", backup_names)}
+        except ValueError as e:
+            return {"message": str(e)}, 400
+
+    output = velero_api.get_backup_describe(backup_names[0])
 
     return {"logs": output}
+
+# Function to stream changes of backups as Server-Sent Events
+def get_backup_events():
+    return events_response("backups")
+
+# Function for deleting several backups at once, by name or by selector
+def bulk_delete_backups():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return {"message": "Request body must be a JSON object"}, 400
+
+    try:
+        return bulk_delete("backups", data)
+    except ValueError as e:
+        return {"message": str(e)}, 400
+
+# Restores made from a backup, newest first
+def get_backup_restores(name):
+    items = related_summaries(restores_by_backup, name)
+    return {"backup": name, "items": items, "total": len(items)}
+
+# Resources and volume snapshots included in a backup, paged and filtered
+def get_backup_contents(name):
+    try:
+        return query_contents(name, request.args)
+    except ValueError as e:
+        return {"message": str(e)}, 400
+    except ContentsUnavailable as e:
+        return {"message": str(e)}, e.status
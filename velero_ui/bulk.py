@@ -0,0 +1,205 @@
+import os
+import re
+import json
+import time
+import logging
+import threading
+from datetime import datetime, timezone
+from concurrent.futures import as_completed
+
+from flask import Response
+
+import velero_ui.velero_api as velero_api
+from velero_ui.cache import list_custom_objects, get_custom_objects
+from velero_ui.executor import submit_limited
+from velero_ui.timestamps import parse_time
+
+logger = logging.getLogger(__name__)
+
+# Deletions a bulk request runs at once
+BULK_DELETE_CONCURRENCY = int(os.getenv("BULK_DELETE_CONCURRENCY", "4"))
+
+# Deletions per second a worker sends to the API server, all bulk requests together
+BULK_DELETE_QPS = float(os.getenv("BULK_DELETE_QPS", "10"))
+
+# Maximum number of objects of a bulk request
+MAX_BULK_ITEMS = 1000
+
+# Attempts of a deletion throttled by the API server (429 Too Many Requests)
+THROTTLED_ATTEMPTS = 3
+HTTP_STATUS_TOO_MANY_REQUESTS = 429
+
+DELETE_FUNCTIONS = {
+    # Backups are deleted by Velero itself through a DeleteBackupRequest
+    "backups": velero_api.create_backup_delete_request,
+    "restores": velero_api.delete_restore,
+    "schedules": velero_api.delete_schedule,
+}
+
+DURATION_UNITS = {"d": 86400, "h": 3600, "m": 60, "s": 1}
+
+
+# Spread calls evenly over time, at most rate calls per second across threads
+class Pacer:
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.next_call = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(self.next_call, now)
+            self.next_call = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+pacer = Pacer(BULK_DELETE_QPS)
+
+
+# Parse a duration such as 30d, 72h or 720h0m0s into seconds
+def parse_duration(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if not isinstance(value, str) or not re.fullmatch(r"(\d+[dhms])+", value):
+        raise ValueError(f"Invalid duration '{value}'. Use for example 30d, 72h or 90m")
+    return float(sum(int(amount) * DURATION_UNITS[unit] for amount, unit in re.findall(r"(\d+)([dhms])", value)))
+
+
+def _parse_labels(labels):
+    if isinstance(labels, dict):
+        return labels
+    if not isinstance(labels, str):
+        raise ValueError("Selector 'labels' must be an object or a string key=value,key=value")
+
+    match_labels = {}
+    for label in labels.split(","):
+        key, separator, value = label.partition("=")
+        if not separator or not key.strip():
+            raise ValueError(f"Invalid label '{label}'. Labels must follow the format <key>=<value>")
+        match_labels[key.strip()] = value.strip()
+    return match_labels
+
+
+def _age(item, now):
+    created = parse_time(item["metadata"].get("creationTimestamp"))
+    if created is None:
+        return None
+    return (now - created).total_seconds()
+
+
+# Names of the objects of plural matching a selector made of labels, olderThan,
+# newerThan and phase criteria, all of which must match
+def select_names(plural, selector):
+    if not isinstance(selector, dict) or not selector:
+        raise ValueError("Selector must be an object with at least one of labels, olderThan, newerThan or phase")
+
+    unknown = set(selector) - {"labels", "olderThan", "newerThan", "phase"}
+    if unknown:
+        raise ValueError(f"Unsupported selector fields: {', '.join(sorted(unknown))}")
+
+    match_labels = _parse_labels(selector["labels"]) if "labels" in selector else None
+    older_than = parse_duration(selector["olderThan"]) if "olderThan" in selector else None
+    newer_than = parse_duration(selector["newerThan"]) if "newerThan" in selector else None
+    phases = selector.get("phase")
+    if isinstance(phases, str):
+        phases = phases.split(",")
+
+    now = datetime.now(timezone.utc)
+    names = []
+    for item in list_custom_objects(plural).get("items", []):
+        if match_labels is not None:
+            labels = item["metadata"].get("labels") or {}
+            if any(labels.get(key) != value for key, value in match_labels.items()):
+                continue
+        if older_than is not None or newer_than is not None:
+            age = _age(item, now)
+            if age is None or (older_than is not None and age < older_than) or (newer_than is not None and age > newer_than):
+                continue
+        if phases and (item.get("status", {}).get("phase") or "New") not in phases:
+            continue
+        names.append(item["metadata"]["name"])
+
+    return sorted(names)
+
+
+def _delete(plural, name):
+    delete_function = DELETE_FUNCTIONS[plural]
+
+    for attempt in range(THROTTLED_ATTEMPTS):
+        pacer.wait()
+        outcome = delete_function(name)
+        if outcome["status"] or outcome.get("code") != HTTP_STATUS_TOO_MANY_REQUESTS:
+            break
+        logger.info(f"Deletion of {plural} {name} throttled by the API server, retrying")
+        time.sleep(2 ** attempt)
+
+    return {"name": name, "status": outcome["status"], "message": outcome["message"]}
+
+
+# Names of the objects of plural listed in body["names"] or matching
+# body["selector"], at most limit of them.
+# Raise ValueError on an invalid body.
+def requested_names(plural, body, limit, action):
+    if "names" in body:
+        names = body["names"]
+        if not isinstance(names, list) or not all(isinstance(name, str) and name for name in names):
+            raise ValueError("'names' must be a list of names")
+        names = list(dict.fromkeys(names))
+    elif "selector" in body:
+        names = select_names(plural, body["selector"])
+    else:
+        raise ValueError("Request body must contain either 'names' or 'selector'")
+
+    if len(names) > limit:
+        raise ValueError(f"Cannot {action} more than {limit} {plural} at once, {len(names)} selected")
+    return names
+
+
+def _record(item):
+    return (json.dumps(item) + "\n").encode("utf-8")
+
+
+# Stream the result of every deletion as it completes, then the names not
+# found and a summary. Deletions not started yet are cancelled when the client
+# goes away.
+def _stream_deletions(plural, names, missing):
+    futures = submit_limited(lambda name: _delete(plural, name), names, BULK_DELETE_CONCURRENCY)
+    succeeded = 0
+    try:
+        for future in as_completed(futures):
+            result = future.result()
+            succeeded += 1 if result["status"] else 0
+            yield _record(result)
+        for name in missing:
+            yield _record({"name": name, "status": False, "message": "Not found"})
+        total = len(names) + len(missing)
+        yield _record({"done": True, "succeeded": succeeded, "failed": total - succeeded})
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+# Delete the objects of plural listed in body["names"] or matching
+# body["selector"]. Deletions run BULK_DELETE_CONCURRENCY at a time, paced to
+# BULK_DELETE_QPS, and their results are streamed as NDJSON so a long request
+# keeps sending data through proxies. Return only the selected names when
+# body["dryRun"] is true.
+# Raise ValueError on an invalid body.
+def bulk_delete(plural, body):
+    names = requested_names(plural, body, MAX_BULK_ITEMS, "delete")
+
+    # Report unknown names instead of sending deletions bound to fail
+    existing = get_custom_objects(plural, names)
+    missing = [name for name in names if name not in existing]
+    names = [name for name in names if name in existing]
+
+    if body.get("dryRun"):
+        return {"names": names, "missing": missing}
+
+    logger.info(f"Bulk delete {len(names)} {plural}")
+    response = Response(_stream_deletions(plural, names, missing), mimetype="application/x-ndjson")
+    # Ask reverse proxies such as ingress-nginx not to buffer the results
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
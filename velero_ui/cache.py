@@ -0,0 +1,458 @@
+import os
+import json
+import gzip
+import time
+import random
+import logging
+import threading
+from collections import deque
+
+from kubernetes import watch
+from kubernetes.client.rest import ApiException
+
+from velero_ui.kube_api import get_api_client, custom_objects_api, REQUEST_TIMEOUT, KUBE_CONNECT_TIMEOUT
+from velero_ui.executor import gather_map
+from velero_ui.metrics import count_cache_read
+from velero_ui.singleflight import shared_call
+
+logger = logging.getLogger(__name__)
+
+CACHE_DISABLED = os.getenv("DISABLE_CACHE", "").lower() == "true"
+
+# A cache is only served while it has heard from the API server (list, watch
+# event, bookmark or a cleanly closed watch) within this many seconds
+CACHE_MAX_STALENESS = float(os.getenv("CACHE_MAX_STALENESS_SECONDS", "120"))
+
+# Server side timeout of a single watch call. Must stay well below the
+# staleness bound so a quiet collection still proves it is alive.
+CACHE_WATCH_TIMEOUT = int(os.getenv("CACHE_WATCH_TIMEOUT_SECONDS", "50"))
+
+# Client side read timeout of a watch, a little longer than the server side
+# one so a healthy watch is always closed by the server first
+WATCH_REQUEST_TIMEOUT = (KUBE_CONNECT_TIMEOUT, CACHE_WATCH_TIMEOUT + 15)
+
+VELERO_GROUP = "velero.io"
+VELERO_VERSION = "v1"
+VELERO_NAMESPACE = "velero"
+
+HTTP_STATUS_GONE = 410
+
+# Number of recent changes kept per cache for live update streams to resume from
+CACHE_EVENT_BUFFER = int(os.getenv("CACHE_EVENT_BUFFER", "1000"))
+
+# Above this many names a lookup lists the collection once instead of
+# issuing one GET per name
+BATCH_LIST_THRESHOLD = 5
+
+# Directory the Velero collections are saved to, so a restarted worker serves
+# lists from the last snapshot while it lists and watches again. Unset to
+# disable snapshots.
+CACHE_SNAPSHOT_DIR = os.getenv("CACHE_SNAPSHOT_DIR", "")
+
+# Older snapshots are ignored at startup
+CACHE_SNAPSHOT_MAX_AGE = float(os.getenv("CACHE_SNAPSHOT_MAX_AGE_SECONDS", "3600"))
+
+
+# Informer-style cache of one Kubernetes collection, by default Velero custom
+# resources. List once, then watch from the listed resourceVersion and relist
+# when the watch answers 410 Gone. list_call(**kwargs) must accept the list
+# and watch arguments of the Kubernetes client list functions.
+class ResourceCache:
+    def __init__(self, name, list_call, snapshot=False):
+        self.name = name
+        self.list_call = list_call
+        self.snapshot_path = os.path.join(CACHE_SNAPSHOT_DIR, name.replace("/", "_") + ".json.gz") if snapshot and CACHE_SNAPSHOT_DIR else None
+        self.warm = False
+        self.saved_generation = None
+        self.api_version = ""
+        self.kind = ""
+        self.items = {}
+        self.resource_version = None
+        self.content_version = None
+        self.synced = False
+        self.last_contact = 0.0
+        self.generation = 0
+        self.lock = threading.RLock()
+        self.changed = threading.Condition(self.lock)
+        self.events = deque(maxlen=CACHE_EVENT_BUFFER)
+        self.events_base = None
+        self.thread = None
+        self._snapshot = None
+        self._snapshot_generation = -1
+        self._sorted = {}
+
+    def start(self):
+        with self.lock:
+            if self.thread is not None and self.thread.is_alive():
+                return
+            self.thread = threading.Thread(target=self._run, name=f"cache-{self.name}", daemon=True)
+            self.thread.start()
+
+    def is_fresh(self):
+        return self.synced and (time.monotonic() - self.last_contact) <= CACHE_MAX_STALENESS
+
+    # Holds the objects of a snapshot and has not listed the collection yet
+    def is_warm(self):
+        return self.warm and not self.synced
+
+    def _touch(self):
+        self.last_contact = time.monotonic()
+
+    def _relist(self):
+        response = self.list_call(_request_timeout=REQUEST_TIMEOUT)
+        if not isinstance(response, dict):
+            # Typed list of the core APIs, keep the same JSON shape as watch events
+            response = get_api_client().sanitize_for_serialization(response)
+        items = {item["metadata"]["name"]: item for item in response.get("items", [])}
+
+        with self.lock:
+            # A relist after a broken watch, or the first list after loading
+            # a snapshot, is recorded as the changes it brings, so live update
+            # streams do not have to start over
+            relisted = self.resource_version is not None or self.warm
+            previous = self.items
+
+            self.api_version = response.get("apiVersion") or self.api_version
+            self.kind = response.get("kind") or self.kind
+            self.items = items
+            self.resource_version = response.get("metadata", {}).get("resourceVersion")
+            self.content_version = self.resource_version
+            self.generation += 1
+            self.synced = True
+            self.warm = False
+            self._touch()
+
+            if not relisted:
+                self.events.clear()
+                self.events_base = self.content_version
+            else:
+                for name, item in items.items():
+                    old = previous.get(name)
+                    if old is None:
+                        self._record("ADDED", item)
+                    elif old["metadata"].get("resourceVersion") != item["metadata"].get("resourceVersion"):
+                        self._record("MODIFIED", item)
+                for name, old in previous.items():
+                    if name not in items:
+                        self._record("DELETED", old)
+
+        logger.debug(f"Cache {self.name} listed {len(items)} objects at resourceVersion {self.resource_version}")
+
+    def _apply(self, event):
+        event_type = event["type"]
+        obj = event["raw_object"] if "raw_object" in event else event["object"]
+        metadata = obj.get("metadata", {})
+
+        with self.lock:
+            if event_type == "ADDED" or event_type == "MODIFIED":
+                self.items[metadata["name"]] = obj
+                self.generation += 1
+            elif event_type == "DELETED":
+                self.items.pop(metadata["name"], None)
+                self.generation += 1
+
+            if metadata.get("resourceVersion"):
+                self.resource_version = metadata["resourceVersion"]
+                if event_type != "BOOKMARK":
+                    self.content_version = self.resource_version
+            if event_type in ("ADDED", "MODIFIED", "DELETED"):
+                self._record(event_type, obj)
+            self._touch()
+
+    # Must be called with the lock held, after content_version is updated
+    def _record(self, event_type, obj):
+        if len(self.events) == self.events.maxlen:
+            self.events_base = self.events[0][0]
+        self.events.append((self.content_version, event_type, obj))
+        self.changed.notify_all()
+
+    def _events_after(self, resource_version):
+        if resource_version == self.content_version:
+            return []
+        for index in range(len(self.events) - 1, -1, -1):
+            if self.events[index][0] == resource_version:
+                return list(self.events)[index + 1:]
+        if resource_version == self.events_base:
+            return list(self.events)
+        return None
+
+    # Return the (resourceVersion, type, object) changes recorded after
+    # resource_version, waiting up to timeout seconds when there is none yet.
+    # Return None when resource_version is too old or unknown to this cache,
+    # in which case the caller must start over from a full list.
+    def events_since(self, resource_version, timeout):
+        with self.lock:
+            events = self._events_after(resource_version)
+            if events == []:
+                self.changed.wait(timeout)
+                events = self._events_after(resource_version)
+            return events
+
+    def _watch(self):
+        w = watch.Watch()
+        for event in w.stream(self.list_call,
+                              resource_version=self.resource_version,
+                              timeout_seconds=CACHE_WATCH_TIMEOUT,
+                              allow_watch_bookmarks=True,
+                              _request_timeout=WATCH_REQUEST_TIMEOUT):
+            self._apply(event)
+
+        # The server closed the watch after timeout_seconds without error
+        self._touch()
+
+    def _run(self):
+        backoff = 1
+        while True:
+            try:
+                if not self.synced or self.resource_version is None:
+                    self._relist()
+                    self.save_snapshot()
+                self._watch()
+                self.save_snapshot()
+                backoff = 1
+            except ApiException as e:
+                if e.status == HTTP_STATUS_GONE:
+                    logger.info(f"Cache {self.name} resourceVersion {self.resource_version} expired, relisting")
+                    self.synced = False
+                    continue
+                logger.error(f"Cache {self.name} watch failed: {e.status} {e.reason}")
+                self._sleep(backoff)
+                backoff = min(backoff * 2, 30)
+            except Exception as e:
+                logger.error(f"Cache {self.name} watch failed: {e}")
+                self._sleep(backoff)
+                backoff = min(backoff * 2, 30)
+
+    def _sleep(self, seconds):
+        time.sleep(seconds + random.uniform(0, seconds / 2))
+
+    # Load the objects of a recent snapshot, served by lists until the first
+    # list of the collection replaces them
+    def load_snapshot(self):
+        if self.snapshot_path is None:
+            return
+        try:
+            if time.time() - os.path.getmtime(self.snapshot_path) > CACHE_SNAPSHOT_MAX_AGE:
+                logger.info(f"Cache {self.name} snapshot is too old, ignoring it")
+                return
+            with gzip.open(self.snapshot_path, "rt", encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.error(f"Cannot read cache {self.name} snapshot {self.snapshot_path}: {e}")
+            return
+
+        with self.lock:
+            if self.synced:
+                return
+            self.api_version = snapshot.get("apiVersion", "")
+            self.kind = snapshot.get("kind", "")
+            self.items = {item["metadata"]["name"]: item for item in snapshot.get("items", [])}
+            self.content_version = snapshot.get("resourceVersion")
+            self.events_base = self.content_version
+            self.generation += 1
+            self.warm = True
+        logger.info(f"Cache {self.name} loaded {len(self.items)} objects from snapshot")
+
+    # Save the collection when it changed since the last snapshot. Written to
+    # a temporary file first so workers never read a partial snapshot.
+    def save_snapshot(self):
+        if self.snapshot_path is None:
+            return
+        with self.lock:
+            if not self.synced or self.saved_generation == self.generation:
+                return
+            generation = self.generation
+            snapshot = {
+                "apiVersion": self.api_version,
+                "kind": self.kind,
+                "resourceVersion": self.content_version,
+                "items": list(self.items.values()),
+            }
+
+        temporary = f"{self.snapshot_path}.{os.getpid()}.tmp"
+        try:
+            with gzip.open(temporary, "wt", encoding="utf-8", compresslevel=1) as f:
+                json.dump(snapshot, f, separators=(",", ":"))
+            os.replace(temporary, self.snapshot_path)
+            self.saved_generation = generation
+        except OSError as e:
+            logger.error(f"Cannot save cache {self.name} snapshot {self.snapshot_path}: {e}")
+
+    def get(self, name):
+        with self.lock:
+            return self.items.get(name)
+
+    # Returns the collection in the same shape as list_namespaced_custom_object.
+    # The result is shared between callers and must not be modified.
+    def list(self):
+        with self.lock:
+            if self._snapshot_generation != self.generation:
+                self._snapshot = {
+                    "apiVersion": self.api_version,
+                    "kind": self.kind,
+                    "items": list(self.items.values()),
+                    "metadata": {"resourceVersion": self.content_version},
+                }
+                self._snapshot_generation = self.generation
+            return self._snapshot
+
+    # Returns the collection ordered by key_func and the resourceVersion it
+    # reflects, computed once per change of the collection and shared between
+    # callers
+    def sorted(self, sort_key, key_func):
+        with self.lock:
+            entry = self._sorted.get(sort_key)
+            if entry is None or entry[0] != self.generation:
+                valued, missing = sort_items(self.items.values(), key_func)
+                entry = (self.generation, (valued, missing, self.content_version))
+                self._sorted[sort_key] = entry
+            return entry[1]
+
+    def stats(self):
+        return {
+            "synced": self.synced,
+            "fresh": self.is_fresh(),
+            "warm": self.is_warm(),
+            "items": len(self.items),
+            "bufferedEvents": len(self.events),
+            "resourceVersion": self.resource_version,
+            "secondsSinceContact": round(time.monotonic() - self.last_contact, 1) if self.last_contact else None,
+        }
+
+
+caches = {}
+caches_lock = threading.Lock()
+
+
+# Return the running cache registered under name, creating it with factory()
+# on first use
+def register_cache(name, factory):
+    if CACHE_DISABLED:
+        return None
+
+    with caches_lock:
+        cache = caches.get(name)
+    if cache is None:
+        # Reading the snapshot file is done outside the lock so it does not
+        # hold up the lookups of the other caches. When two threads create the
+        # same cache, the first one published is kept.
+        created = factory()
+        created.load_snapshot()
+        with caches_lock:
+            cache = caches.setdefault(name, created)
+    cache.start()
+    return cache
+
+
+# List function of a Velero collection, by default the one of the cluster the
+# UI is connected to
+def custom_objects_call(plural, api=custom_objects_api, namespace=VELERO_NAMESPACE):
+    def list_call(**kwargs):
+        return api().list_namespaced_custom_object(group=VELERO_GROUP, version=VELERO_VERSION, namespace=namespace, plural=plural, **kwargs)
+    return list_call
+
+
+def get_cache(plural):
+    return register_cache(plural, lambda: ResourceCache(plural, custom_objects_call(plural), snapshot=True))
+
+
+# Whether the cache of plural can serve a read, counted for the cache metrics.
+# Lists may also be served from a snapshot until the first list completes.
+def _serves(cache, plural, warm=False):
+    if cache is not None and cache.is_fresh():
+        count_cache_read(plural, "hit")
+        return True
+    if warm and cache is not None and cache.is_warm():
+        count_cache_read(plural, "snapshot")
+        return True
+    count_cache_read(plural, "miss")
+    return False
+
+
+# Split items into (items with a sort value in ascending order, items without
+# one). Ties and items without a value are ordered by name.
+def sort_items(items, key_func):
+    valued = []
+    missing = []
+
+    for item in items:
+        value = key_func(item)
+        if value is None:
+            missing.append(item)
+        else:
+            valued.append((value, item["metadata"]["name"], item))
+
+    valued.sort(key=lambda entry: (entry[0], entry[1]))
+    missing.sort(key=lambda item: item["metadata"]["name"])
+    return [entry[2] for entry in valued], missing
+
+
+# Concurrent identical reads from the API server share one call
+def list_from_api(plural):
+    return shared_call("list", plural, lambda: custom_objects_call(plural)(_request_timeout=REQUEST_TIMEOUT))
+
+
+# List a Velero collection from the cache, or straight from the API server
+# while the cache is not synced or has gone stale
+def list_custom_objects(plural):
+    cache = get_cache(plural)
+    if _serves(cache, plural, warm=True):
+        return cache.list()
+
+    logger.debug(f"Cache {plural} is not ready, listing from API server")
+    return list_from_api(plural)
+
+
+# Same as list_custom_objects, ordered as described in sort_items, followed by
+# the resourceVersion of the collection
+def sorted_custom_objects(plural, sort_key, key_func):
+    cache = get_cache(plural)
+    if _serves(cache, plural, warm=True):
+        return cache.sorted(sort_key, key_func)
+
+    logger.debug(f"Cache {plural} is not ready, listing from API server")
+    response = list_from_api(plural)
+    valued, missing = sort_items(response.get("items", []), key_func)
+    return valued, missing, response.get("metadata", {}).get("resourceVersion")
+
+
+def get_from_api(plural, name):
+    def get_call():
+        try:
+            return custom_objects_api().get_namespaced_custom_object(group=VELERO_GROUP, version=VELERO_VERSION, namespace=VELERO_NAMESPACE, plural=plural, name=name, _request_timeout=REQUEST_TIMEOUT)
+        except ApiException as e:
+            if e.status == 404:
+                return None
+            raise e
+
+    return shared_call("get", plural, get_call, name=name)
+
+
+# Look up a Velero object by name in the cache, or with a single GET while the
+# cache is not ready. Return None if it does not exist.
+def get_custom_object(plural, name):
+    cache = get_cache(plural)
+    if _serves(cache, plural):
+        return cache.get(name)
+
+    logger.debug(f"Cache {plural} is not ready, reading {name} from API server")
+    return get_from_api(plural, name)
+
+
+# Look up several Velero objects by name. Return a dict of name to object
+# holding the ones that exist.
+def get_custom_objects(plural, names):
+    cache = get_cache(plural)
+    if _serves(cache, plural):
+        found = {name: cache.get(name) for name in names}
+    elif len(names) > BATCH_LIST_THRESHOLD:
+        logger.debug(f"Cache {plural} is not ready, listing from API server")
+        wanted = set(names)
+        found = {item["metadata"]["name"]: item for item in list_from_api(plural).get("items", []) if item["metadata"]["name"] in wanted}
+    else:
+        logger.debug(f"Cache {plural} is not ready, reading from API server")
+        found = dict(zip(names, gather_map(lambda name: get_from_api(plural, name), names)))
+
+    return {name: item for name, item in found.items() if item is not None}
@@ -0,0 +1,217 @@
+import os
+import time
+import heapq
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from kubernetes import client, config
+
+from velero_ui.kube_api import create_api_client, KUBE_CONNECT_TIMEOUT
+from velero_ui.singleflight import shared_call
+from velero_ui.cache import ResourceCache, register_cache, get_cache, list_from_api, custom_objects_call, sort_items, VELERO_NAMESPACE
+
+logger = logging.getLogger(__name__)
+
+# Kubeconfig contexts of the other clusters whose Velero objects are merged
+# into the lists, e.g. CLUSTERS=prod-eu,prod-us. Unset to serve one cluster.
+CLUSTERS = [name.strip() for name in os.getenv("CLUSTERS", "").split(",") if name.strip()]
+
+# Name the cluster the UI is connected to is listed under
+CLUSTER_NAME = os.getenv("CLUSTER_NAME", "local")
+
+# Time a merged list waits for each cluster before leaving it out
+CLUSTER_TIMEOUT = float(os.getenv("CLUSTER_TIMEOUT_SECONDS", "5"))
+
+# After a failure, a cluster is left out of merged lists without being called
+# for this long, unless its cache is fresh again
+CLUSTER_RETRY_SECONDS = float(os.getenv("CLUSTER_RETRY_SECONDS", "30"))
+
+# Threads listing the objects of each cluster, i.e. merged lists of a worker
+# calling a cluster at the same time
+CLUSTER_THREADS = int(os.getenv("CLUSTER_THREADS", "4"))
+
+
+def multi_cluster_enabled():
+    return bool(CLUSTERS)
+
+
+class ClusterUnavailable(Exception):
+    pass
+
+
+# One cluster of a merged list. context is None for the cluster the UI is
+# connected to, which keeps using the shared client and caches. Each cluster
+# is called from its own pool, separate from the shared executor, so a cluster
+# that hangs only holds its own threads.
+class Cluster:
+    def __init__(self, name, context=None, namespace=VELERO_NAMESPACE):
+        self.name = name
+        self.context = context
+        self.namespace = namespace
+        self.api_client = None
+        self.api_client_pid = None
+        self.failure = None
+        self.retry_at = 0.0
+        self.lock = threading.Lock()
+        self.state_lock = threading.Lock()
+        self.executor = None
+        self.executor_pid = None
+
+    def _api(self):
+        with self.lock:
+            if self.api_client is None or self.api_client_pid != os.getpid():
+                configuration = client.Configuration()
+                config.load_kube_config(context=self.context, client_configuration=configuration)
+                self.api_client = create_api_client(configuration)
+                self.api_client_pid = os.getpid()
+            return client.CustomObjectsApi(self.api_client)
+
+    def submit(self, func, *args):
+        with self.lock:
+            if self.executor is None or self.executor_pid != os.getpid():
+                self.executor = ThreadPoolExecutor(max_workers=CLUSTER_THREADS, thread_name_prefix=f"velero-ui-cluster-{self.name}")
+                self.executor_pid = os.getpid()
+            executor = self.executor
+        return executor.submit(func, *args)
+
+    def cache(self, plural):
+        if self.context is None:
+            return get_cache(plural)
+
+        name = f"{self.name}/{plural}"
+        return register_cache(name, lambda: ResourceCache(name, custom_objects_call(plural, self._api, self.namespace), snapshot=True))
+
+    def _list_from_api(self, plural):
+        if self.context is None:
+            return list_from_api(plural)
+        list_call = custom_objects_call(plural, self._api, self.namespace)
+        return shared_call("list", f"{self.name}/{plural}", lambda: list_call(_request_timeout=(KUBE_CONNECT_TIMEOUT, CLUSTER_TIMEOUT)))
+
+    # Collection of plural ordered as described in sort_items, with its
+    # resourceVersion. Raise ClusterUnavailable while the cluster is backing off.
+    def sorted_objects(self, plural, sort_key, key_func):
+        cache = self.cache(plural)
+        if cache is not None and (cache.is_fresh() or cache.is_warm()):
+            return cache.sorted(sort_key, key_func)
+
+        with self.state_lock:
+            if time.monotonic() < self.retry_at:
+                raise ClusterUnavailable(self.failure)
+
+        response = self._list_from_api(plural)
+        valued, missing = sort_items(response.get("items", []), key_func)
+        return valued, missing, response.get("metadata", {}).get("resourceVersion")
+
+    # Start backing off after a failure and return the failure message.
+    # Concurrent merged lists may report the same failure, it is logged once.
+    def failed(self, message):
+        with self.state_lock:
+            if time.monotonic() >= self.retry_at:
+                logger.error(f"Cluster {self.name} unavailable: {message}")
+            self.failure = message
+            self.retry_at = time.monotonic() + CLUSTER_RETRY_SECONDS
+            return message
+
+    def succeeded(self):
+        with self.state_lock:
+            self.failure = None
+            self.retry_at = 0.0
+
+
+clusters = []
+clusters_lock = threading.Lock()
+
+
+# Load the clusters listed in CLUSTERS from the kube config. Contexts that do
+# not exist are logged and skipped.
+def init_clusters():
+    if not CLUSTERS:
+        return
+
+    try:
+        contexts, _ = config.list_kube_config_contexts()
+    except config.config_exception.ConfigException as e:
+        logger.error(f"Cannot read kube config contexts for CLUSTERS: {e}")
+        contexts = []
+    namespaces = {context["name"]: context["context"].get("namespace") for context in contexts}
+
+    loaded = [Cluster(CLUSTER_NAME)]
+    for name in dict.fromkeys(CLUSTERS):
+        if name == CLUSTER_NAME:
+            continue
+        if name not in namespaces:
+            logger.error(f"Kube config has no context {name}, cluster left out")
+            continue
+        loaded.append(Cluster(name, name, namespaces[name] or VELERO_NAMESPACE))
+
+    with clusters_lock:
+        clusters[:] = loaded
+    logger.info(f"Merging Velero objects of clusters {', '.join(cluster.name for cluster in loaded)}")
+
+
+def get_clusters():
+    with clusters_lock:
+        return list(clusters)
+
+
+# Tag a summary of an object of the cluster the UI is connected to, for the
+# live update streams of merged lists
+def tag_local(summary):
+    if multi_cluster_enabled():
+        summary["cluster"] = CLUSTER_NAME
+    return summary
+
+
+# Merge the ordered collections of plural of the clusters named in selected
+# (all when empty), fetched concurrently with a CLUSTER_TIMEOUT bound each.
+# Return the merged (valued, missing) lists, a dict of id(item) to cluster
+# name, the resourceVersion of the cluster the UI is connected to, a version
+# covering all clusters (None when one is unavailable) and the status of every
+# cluster.
+def merged_sorted_objects(plural, sort_key, key_func, selected=None):
+    wanted = set(selected.split(",")) if selected else None
+    targets = [cluster for cluster in get_clusters() if wanted is None or cluster.name in wanted]
+
+    futures = {cluster: cluster.submit(cluster.sorted_objects, plural, sort_key, key_func) for cluster in targets}
+    if futures:
+        wait(futures.values(), timeout=CLUSTER_TIMEOUT)
+
+    valued_lists = []
+    missing_lists = []
+    cluster_of = {}
+    versions = []
+    statuses = []
+    local_version = None
+    for cluster, future in futures.items():
+        status = {"name": cluster.name, "available": False, "local": cluster.context is None}
+        statuses.append(status)
+
+        if not future.done():
+            status["message"] = cluster.failed(f"No answer within {CLUSTER_TIMEOUT:g} seconds")
+            versions = None
+            continue
+        try:
+            valued, missing, resource_version = future.result()
+        except Exception as e:
+            status["message"] = str(e) if isinstance(e, ClusterUnavailable) else cluster.failed(str(e))
+            versions = None
+            continue
+
+        cluster.succeeded()
+        status["available"] = True
+        for item in valued:
+            cluster_of[id(item)] = cluster.name
+        for item in missing:
+            cluster_of[id(item)] = cluster.name
+        valued_lists.append(valued)
+        missing_lists.append(missing)
+        if versions is not None:
+            versions.append(f"{cluster.name}={resource_version}")
+        if cluster.context is None:
+            local_version = resource_version
+
+    merged_valued = list(heapq.merge(*valued_lists, key=lambda item: (key_func(item), item["metadata"]["name"])))
+    merged_missing = list(heapq.merge(*missing_lists, key=lambda item: item["metadata"]["name"]))
+    version = ";".join(versions) if versions else None
+    return merged_valued, merged_missing, cluster_of, local_version, version, statuses
@@ -0,0 +1,254 @@
+import os
+import zlib
+import json
+import bisect
+import logging
+import threading
+from collections import OrderedDict, Counter
+
+from botocore.exceptions import ClientError, BotoCoreError
+
+from velero_ui.velero_api import TERMINAL_PHASES
+from velero_ui.velero_api_utils import find_backup_from_name, find_backup_storageLocation, count_read_bytes
+from velero_ui.object_storage import get_s3_client
+from velero_ui.log_stream import gunzip_stream, CHUNK_SIZE
+from velero_ui.metrics import upstream_call
+from velero_ui.executor import gather
+from velero_ui.list_query import positive_int
+
+logger = logging.getLogger(__name__)
+
+# Resources of the backup contents indexes kept in memory by a worker, least
+# recently browsed backups first out
+CONTENTS_CACHE_MAX_RESOURCES = int(os.getenv("CONTENTS_CACHE_MAX_RESOURCES", "500000"))
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+RESOURCE_LIST_SUFFIX = "-resource-list.json.gz"
+VOLUME_SNAPSHOTS_SUFFIX = "-volumesnapshots.json.gz"
+
+
+# Raised when the contents of a backup cannot be read, with the HTTP status
+# to answer
+class ContentsUnavailable(Exception):
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+
+def _snapshot_summary(snapshot):
+    spec = snapshot.get("spec", {})
+    status = snapshot.get("status", {})
+    return {
+        "persistentVolume": spec.get("persistentVolumeName"),
+        "volumeId": spec.get("providerVolumeID"),
+        "volumeType": spec.get("volumeType"),
+        "availabilityZone": spec.get("volumeAZ"),
+        "snapshotId": status.get("providerSnapshotID"),
+        "phase": status.get("phase"),
+    }
+
+
+# Index of the resources of a backup, built from the resource list Velero
+# uploads next to the backup tarball: {"apps/v1/Deployment": ["ns/name", ...]}.
+# Resources are sorted by namespace, kind and name so a namespace, or a kind
+# within a namespace, is a contiguous range found by bisection.
+class BackupContents:
+    def __init__(self, resource_list, volume_snapshots):
+        resources = []
+        for group_version_kind, names in resource_list.items():
+            api_version, _, kind = group_version_kind.rpartition("/")
+            for full_name in names:
+                namespace, _, name = full_name.rpartition("/")
+                resources.append((namespace, kind, name, api_version))
+        resources.sort()
+
+        self.resources = resources
+        self.namespaces = Counter(resource[0] for resource in resources)
+        self.kinds = Counter(resource[1] for resource in resources)
+        self.by_kind = {}
+        for position, resource in enumerate(resources):
+            self.by_kind.setdefault(resource[1], []).append(position)
+        self.volume_snapshots = [_snapshot_summary(snapshot) for snapshot in volume_snapshots]
+
+    def __len__(self):
+        return len(self.resources)
+
+    def _range(self, low, high):
+        return bisect.bisect_left(self.resources, low), bisect.bisect_left(self.resources, high)
+
+    # Resources of a namespace ("" for cluster scoped ones) and kind, either
+    # left out when None, whose name contains q
+    def select(self, namespace=None, kind=None, q=None):
+        if namespace is not None:
+            if kind is not None:
+                start, stop = self._range((namespace, kind), (namespace, kind + "\0"))
+            else:
+                start, stop = self._range((namespace,), (namespace + "\0",))
+            selected = self.resources[start:stop]
+        elif kind is not None:
+            selected = [self.resources[position] for position in self.by_kind.get(kind, ())]
+        else:
+            selected = self.resources
+
+        if q:
+            q = q.lower()
+            selected = [resource for resource in selected if q in resource[2].lower()]
+        return selected
+
+
+contents_cache = OrderedDict()
+contents_cache_size = 0
+contents_cache_lock = threading.Lock()
+build_locks = {}
+
+
+def _cached(key):
+    with contents_cache_lock:
+        contents = contents_cache.get(key)
+        if contents is not None:
+            contents_cache.move_to_end(key)
+        return contents
+
+def _store(key, contents):
+    global contents_cache_size
+
+    with contents_cache_lock:
+        if key in contents_cache:
+            return
+        contents_cache[key] = contents
+        contents_cache_size += len(contents)
+        while contents_cache_size > CONTENTS_CACHE_MAX_RESOURCES and len(contents_cache) > 1:
+            _, evicted = contents_cache.popitem(last=False)
+            contents_cache_size -= len(evicted)
+
+
+def contents_cache_stats():
+    with contents_cache_lock:
+        return {"backups": len(contents_cache), "resources": contents_cache_size, "maxResources": CONTENTS_CACHE_MAX_RESOURCES}
+
+
+# Content of a gzipped JSON object next to the backup, None if there is no
+# such object. Any other failure raises ContentsUnavailable, so a backup is
+# never indexed from partial data.
+def _read_json(location, name, suffix):
+    endpoint, bucket_name, file_prefix, access_key, secret_key = location
+    file_key = f"backups/{name}/{name}{suffix}"
+    if file_prefix:
+        file_key = f"{file_prefix}/{file_key}"
+
+    s3 = get_s3_client(endpoint, access_key, secret_key)
+    try:
+        with upstream_call("s3", "get", "objects"):
+            response = s3.get_object(Bucket=bucket_name, Key=file_key)
+        body = response["Body"]
+        try:
+            content = b"".join(gunzip_stream(count_read_bytes(body.iter_chunks(CHUNK_SIZE))))
+        finally:
+            body.close()
+    except ClientError as e:
+        code = e.response["Error"]["Code"]
+        if code in ("404", "NoSuchKey"):
+            return None
+        logger.error(f"Cannot read {file_key} in bucket {bucket_name}: {e}")
+        raise ContentsUnavailable(f"Object storage refused to read {file_key} in bucket {bucket_name}: {code}", 502)
+    except BotoCoreError as e:
+        logger.error(f"Cannot read {file_key} in bucket {bucket_name}: {e}")
+        raise ContentsUnavailable(f"Object storage is unavailable to read {file_key} in bucket {bucket_name}", 503)
+    except (zlib.error, EOFError) as e:
+        raise ContentsUnavailable(f"Cannot decompress {file_key} in bucket {bucket_name}: {e}", 502)
+
+    try:
+        return json.loads(content)
+    except ValueError:
+        raise ContentsUnavailable(f"Cannot read {file_key} in bucket {bucket_name}", 502)
+
+
+def _load(backup):
+    name = backup["metadata"]["name"]
+    location = find_backup_storageLocation(name, backup)
+    if not location[0]:
+        raise ContentsUnavailable(f"Cannot retrieve backup storage location of backup {name}", 503)
+
+    resource_list, volume_snapshots = gather(
+        lambda: _read_json(location, name, RESOURCE_LIST_SUFFIX),
+        lambda: _read_json(location, name, VOLUME_SNAPSHOTS_SUFFIX),
+    )
+    if resource_list is None:
+        raise ContentsUnavailable(f"Backup {name} has no resource list in object storage", 404)
+
+    contents = BackupContents(resource_list, volume_snapshots or [])
+    logger.debug(f"Indexed {len(contents)} resources of backup {name}")
+    return contents
+
+
+# Contents of a finished backup. Indexes are kept per backup uid since Velero
+# does not change what a finished backup holds, and built once at a time so
+# concurrent requests for the same backup download its resource list once.
+def get_backup_contents(name):
+    backup = find_backup_from_name(name)
+    if not backup:
+        raise ContentsUnavailable(f"Backup {name} not found", 404)
+
+    phase = backup.get("status", {}).get("phase", "New")
+    if phase not in TERMINAL_PHASES:
+        raise ContentsUnavailable(f"Backup is in {phase} phase. Please wait until the backup is finished to browse its contents", 409)
+
+    key = (name, backup["metadata"].get("uid"))
+    contents = _cached(key)
+    if contents is not None:
+        return contents
+
+    with contents_cache_lock:
+        lock = build_locks.setdefault(key, threading.Lock())
+    try:
+        with lock:
+            contents = _cached(key)
+            if contents is None:
+                contents = _load(backup)
+                _store(key, contents)
+    finally:
+        with contents_cache_lock:
+            build_locks.pop(key, None)
+    return contents
+
+
+def _counts(counter):
+    return [{"name": name or None, "count": count} for name, count in sorted(counter.items())]
+
+
+# One page of the resources of a backup, filtered by the namespace, kind and q
+# (part of the name) query parameters, with the resource counts per namespace
+# and kind and the volume snapshots of the backup.
+# Raise ValueError on invalid parameters and ContentsUnavailable.
+def query_contents(name, args):
+    page = positive_int(args, "page", 1)
+    limit = min(positive_int(args, "limit", DEFAULT_LIMIT), MAX_LIMIT)
+
+    namespace = args.get("namespace") or None
+    if args.get("clusterScoped", "").lower() == "true":
+        if namespace:
+            raise ValueError("Query parameters 'namespace' and 'clusterScoped' cannot be combined")
+        namespace = ""
+    kind = args.get("kind") or None
+
+    contents = get_backup_contents(name)
+    selected = contents.select(namespace, kind, args.get("q"))
+    start = (page - 1) * limit
+
+    items = [
+        {"namespace": resource[0] or None, "kind": resource[1], "name": resource[2], "apiVersion": resource[3]}
+        for resource in selected[start:start + limit]
+    ]
+    return {
+        "backup": name,
+        "items": items,
+        "total": len(selected),
+        "page": page,
+        "limit": limit,
+        "resources": len(contents),
+        "namespaces": _counts(contents.namespaces),
+        "kinds": _counts(contents.kinds),
+        "volumeSnapshots": contents.volume_snapshots,
+    }
@@ -0,0 +1,152 @@
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+
+from flask import request, Response
+
+from velero_ui.cache import get_cache, list_custom_objects
+from velero_ui.relations import SyncedIndex, latest_successes
+from velero_ui.projection import summarize_storage
+from velero_ui.timestamps import parse_time
+from velero_ui.executor import gather
+
+logger = logging.getLogger(__name__)
+
+FAILED_PHASES = ("Failed", "PartiallyFailed", "FailedValidation")
+FAILED_WINDOW_SECONDS = 24 * 3600
+
+
+# Phase counts and failures of the backups, kept up to date from the changes
+# recorded by the backups cache instead of recounting the whole collection for
+# every dashboard request
+class BackupTally(SyncedIndex):
+    def __init__(self):
+        super().__init__("backups")
+
+    def _reset(self):
+        # name -> (phase, failed at)
+        self.entries = {}
+        self.phases = Counter()
+        self.failures = {}
+
+    def _remove(self, name):
+        old = self.entries.pop(name, None)
+        if old is None:
+            return
+
+        phase = old[0]
+        self.phases[phase] -= 1
+        if not self.phases[phase]:
+            del self.phases[phase]
+        self.failures.pop(name, None)
+
+    def _add(self, backup):
+        metadata = backup.get("metadata", {})
+        status = backup.get("status", {})
+        phase = status.get("phase") or "New"
+        failed_at = None
+        if phase in FAILED_PHASES:
+            failed_at = parse_time(status.get("completionTimestamp")) or parse_time(metadata.get("creationTimestamp"))
+
+        name = metadata["name"]
+        self.entries[name] = (phase, failed_at)
+        self.phases[phase] += 1
+        if failed_at is not None:
+            self.failures[name] = failed_at
+
+    def summary(self, now):
+        with self.lock:
+            return {
+                "total": len(self.entries),
+                "byPhase": dict(self.phases),
+                "failedLast24h": sum(1 for failed_at in self.failures.values() if (now - failed_at).total_seconds() <= FAILED_WINDOW_SECONDS),
+            }
+
+
+backup_tally = BackupTally()
+
+encoded_summary = None
+encoded_summary_lock = threading.Lock()
+
+
+def _collection_version(plural):
+    cache = get_cache(plural)
+    if cache is not None and cache.is_fresh():
+        return cache.content_version
+    return None
+
+
+def _build_summary(now):
+    backups = backup_tally.summary(now)
+    last_success, schedule_list, storage_list = gather(
+        latest_successes.latest_successes,
+        lambda: list_custom_objects("schedules"),
+        lambda: list_custom_objects("backupstoragelocations"),
+    )
+
+    schedules = schedule_list.get("items", [])
+    schedule_phases = Counter(schedule.get("status", {}).get("phase") or "New" for schedule in schedules)
+    schedule_items = []
+    for schedule in sorted(schedules, key=lambda item: item["metadata"]["name"]):
+        name = schedule["metadata"]["name"]
+        schedule_items.append({
+            "name": name,
+            "phase": schedule.get("status", {}).get("phase") or "New",
+            "paused": schedule.get("spec", {}).get("paused", False),
+            "lastBackup": schedule.get("status", {}).get("lastBackup"),
+            "lastSuccessfulBackup": last_success.get(name),
+        })
+
+    storages = [summarize_storage(storage) for storage in storage_list.get("items", [])]
+    storages.sort(key=lambda storage: storage["name"])
+
+    return {
+        "backups": backups,
+        "schedules": {
+            "total": len(schedules),
+            "byPhase": dict(schedule_phases),
+            "paused": sum(1 for item in schedule_items if item["paused"]),
+            "items": schedule_items,
+        },
+        "storageLocations": {
+            "total": len(storages),
+            "available": sum(1 for storage in storages if storage["phase"] == "Available"),
+            "items": storages,
+        },
+    }
+
+
+# Dashboard summary as one small JSON document. The encoded body is reused
+# until a collection changes or the minute changes, since failures are counted
+# over a sliding 24 hour window.
+def get_dashboard_summary():
+    global encoded_summary
+
+    backups_version = backup_tally.sync()
+    versions = (backups_version, _collection_version("schedules"), _collection_version("backupstoragelocations"))
+    minute = int(time.time() // 60)
+
+    key = (versions, minute) if None not in versions else None
+    with encoded_summary_lock:
+        cached = encoded_summary if key is not None and encoded_summary is not None and encoded_summary[0] == key else None
+
+    if cached is not None:
+        etag, body = cached[1], cached[2]
+    else:
+        body = json.dumps(_build_summary(datetime.now(timezone.utc)), separators=(",", ":"))
+        etag = "dashboard-" + hashlib.sha1(body.encode("utf-8")).hexdigest()[:20]
+        if key is not None:
+            with encoded_summary_lock:
+                encoded_summary = (key, etag, body)
+
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype="application/json")
+    response.set_etag(etag, weak=True)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
@@ -0,0 +1,221 @@
+import os
+import hashlib
+import logging
+import threading
+from collections import OrderedDict, Counter
+
+from velero_ui.kube_api import REQUEST_TIMEOUT
+from velero_ui.cache import custom_objects_call, get_custom_objects
+from velero_ui.singleflight import shared_call
+from velero_ui.velero_api import TERMINAL_PHASES, MAX_DESCRIBE_BATCH
+
+logger = logging.getLogger(__name__)
+
+# Finished backups and restores whose pod volume details are kept in memory by
+# a worker, least recently described first out
+POD_VOLUME_CACHE_MAX_OBJECTS = int(os.getenv("POD_VOLUME_CACHE_MAX_OBJECTS", "1000"))
+
+# Pod volume collection of each plural and the label Velero puts on its items
+# with the name of their backup or restore
+POD_VOLUMES = {
+    "backups": ("podvolumebackups", "velero.io/backup-name"),
+    "restores": ("podvolumerestores", "velero.io/restore-name"),
+}
+
+# Kubernetes label values are at most 63 characters
+LABEL_VALUE_MAX_LENGTH = 63
+
+# Metadata fields of the described object left out of the details
+OMITTED_METADATA = ("managedFields",)
+OMITTED_ANNOTATIONS = ("kubectl.kubernetes.io/last-applied-configuration",)
+
+
+# Label value Velero stores for name: the name itself, or when too long its
+# beginning followed by the start of its sha256 (label.GetValidName in Velero)
+def label_value(name):
+    if len(name) <= LABEL_VALUE_MAX_LENGTH:
+        return name
+    digest = hashlib.sha256(name.encode("utf-8")).hexdigest()
+    return name[:LABEL_VALUE_MAX_LENGTH - 6] + digest[:6]
+
+
+def _pod_volume(item):
+    spec = item.get("spec", {})
+    status = item.get("status", {})
+    pod = spec.get("pod", {})
+    progress = status.get("progress", {})
+
+    total_bytes = progress.get("totalBytes")
+    bytes_done = progress.get("bytesDone")
+    percent = None
+    if total_bytes:
+        percent = round(100 * (bytes_done or 0) / total_bytes, 1)
+    elif status.get("phase") == "Completed":
+        percent = 100.0
+
+    return {
+        "name": item["metadata"]["name"],
+        "namespace": pod.get("namespace"),
+        "pod": pod.get("name"),
+        "volume": spec.get("volume"),
+        "node": spec.get("node"),
+        "uploaderType": spec.get("uploaderType"),
+        "phase": status.get("phase") or "New",
+        "totalBytes": total_bytes,
+        "bytesDone": bytes_done,
+        "progress": percent,
+        "snapshotId": status.get("snapshotID") or spec.get("snapshotID"),
+        "startTimestamp": status.get("startTimestamp"),
+        "completionTimestamp": status.get("completionTimestamp"),
+        "message": status.get("message") or None,
+    }
+
+
+# Per volume details of the pod volume backups or restores of an object,
+# ordered by pod and volume, with their totals
+class PodVolumes:
+    def __init__(self, items):
+        volumes = [_pod_volume(item) for item in items]
+        volumes.sort(key=lambda volume: (volume["namespace"] or "", volume["pod"] or "", volume["volume"] or ""))
+        self.volumes = volumes
+
+    def summary(self):
+        return {
+            "items": self.volumes,
+            "total": len(self.volumes),
+            "phases": dict(Counter(volume["phase"] for volume in self.volumes)),
+            "totalBytes": sum(volume["totalBytes"] or 0 for volume in self.volumes),
+            "bytesDone": sum(volume["bytesDone"] or 0 for volume in self.volumes),
+        }
+
+
+pod_volume_cache = OrderedDict()
+pod_volume_cache_lock = threading.Lock()
+
+
+def _cached(key):
+    with pod_volume_cache_lock:
+        volumes = pod_volume_cache.get(key)
+        if volumes is not None:
+            pod_volume_cache.move_to_end(key)
+        return volumes
+
+def _store(key, volumes):
+    with pod_volume_cache_lock:
+        pod_volume_cache[key] = volumes
+        pod_volume_cache.move_to_end(key)
+        while len(pod_volume_cache) > POD_VOLUME_CACHE_MAX_OBJECTS:
+            pod_volume_cache.popitem(last=False)
+
+
+def pod_volume_cache_stats():
+    with pod_volume_cache_lock:
+        return {"objects": len(pod_volume_cache), "maxObjects": POD_VOLUME_CACHE_MAX_OBJECTS}
+
+
+def _cache_key(plural, obj):
+    return (plural, obj["metadata"]["name"], obj["metadata"].get("uid"))
+
+
+def _finished(obj):
+    return obj.get("status", {}).get("phase") in TERMINAL_PHASES
+
+
+# Pod volume items of the objects named names, read with a single LIST selecting
+# them by label. Return a dict of name to items.
+def _list_pod_volumes(plural, names):
+    volume_plural, label = POD_VOLUMES[plural]
+    values = {label_value(name): name for name in names}
+    if len(values) == 1:
+        selector = f"{label}={next(iter(values))}"
+    else:
+        selector = f"{label} in ({','.join(sorted(values))})"
+
+    list_call = custom_objects_call(volume_plural)
+    response = shared_call("list", volume_plural, lambda: list_call(label_selector=selector, _request_timeout=REQUEST_TIMEOUT), selector=selector)
+    found = {name: [] for name in names}
+    for item in response.get("items", []):
+        name = values.get(item["metadata"].get("labels", {}).get(label))
+        if name is not None:
+            found[name].append(item)
+
+    logger.debug(f"Listed {len(response.get('items', []))} {volume_plural} of {len(names)} {plural}")
+    return found
+
+
+# PodVolumes of each object. Those of finished objects no longer change and are
+# kept, the others are read with one LIST for all of them.
+def _pod_volumes(plural, objects):
+    volumes = {}
+    missing = []
+    for obj in objects:
+        cached = _cached(_cache_key(plural, obj)) if _finished(obj) else None
+        if cached is not None:
+            volumes[obj["metadata"]["name"]] = cached
+        else:
+            missing.append(obj)
+
+    if missing:
+        listed = _list_pod_volumes(plural, [obj["metadata"]["name"] for obj in missing])
+        for obj in missing:
+            name = obj["metadata"]["name"]
+            volumes[name] = PodVolumes(listed[name])
+            if _finished(obj):
+                _store(_cache_key(plural, obj), volumes[name])
+    return volumes
+
+
+def _metadata(obj):
+    metadata = {key: value for key, value in obj.get("metadata", {}).items() if key not in OMITTED_METADATA}
+    annotations = metadata.get("annotations")
+    if annotations:
+        metadata["annotations"] = {key: value for key, value in annotations.items() if key not in OMITTED_ANNOTATIONS}
+    return metadata
+
+
+def _details(obj, volumes):
+    return {
+        "name": obj["metadata"]["name"],
+        "phase": obj.get("status", {}).get("phase") or "New",
+        "metadata": _metadata(obj),
+        "spec": obj.get("spec", {}),
+        "status": obj.get("status", {}),
+        "podVolumes": volumes.summary(),
+    }
+
+
+# Structured descriptions of the backups or restores named names, with the
+# progress and bytes of each of their file system volume backups or restores.
+# Return a dict of name to details holding the objects that exist.
+# Raise ValueError when too many names are given.
+def describe_details(plural, names):
+    if len(names) > MAX_DESCRIBE_BATCH:
+        raise ValueError(f"Cannot describe more than {MAX_DESCRIBE_BATCH} objects at once")
+
+    objects = get_custom_objects(plural, list(dict.fromkeys(names)))
+    if not objects:
+        return {}
+
+    volumes = _pod_volumes(plural, list(objects.values()))
+    return {name: _details(obj, volumes[name]) for name, obj in objects.items()}
+
+
+# Whether a describe request uses the batch form, the name parameter repeated
+# or batch=true, answered with {"items": {name: description}} even for one name
+def is_batch_describe(args):
+    return len(args.getlist("name")) > 1 or args.get("batch", "").lower() == "true"
+
+
+# Answer of /<plural>/describe?details=true: {"items": {name: details}} in the
+# batch form, else the details of the named object
+def describe_details_response(plural, names, batch):
+    try:
+        details = describe_details(plural, names)
+    except ValueError as e:
+        return {"message": str(e)}, 400
+
+    if batch:
+        return {"items": details}
+    if names[0] not in details:
+        return {"message": f"{plural[:-1].capitalize()} {names[0]} not found"}, 404
+    return details[names[0]]
@@ -0,0 +1,90 @@
+import os
+import json
+import time
+import logging
+import threading
+
+from flask import request, Response
+
+from velero_ui.cache import get_cache
+from velero_ui.projection import PROJECTIONS
+from velero_ui.clusters import tag_local
+
+logger = logging.getLogger(__name__)
+
+# Threads of a gunicorn worker, set by the docker image
+GUNICORN_THREADS = int(os.getenv("GUNICORN_THREADS", "8"))
+
+# Live update streams a worker serves at once. Each one holds a worker thread,
+# by default half of them so the other half keeps serving the other requests.
+EVENTS_MAX_STREAMS = int(os.getenv("EVENTS_MAX_STREAMS") or max(GUNICORN_THREADS // 2, 1))
+
+# A stream is closed after this long and the browser reconnects from the last
+# event it received, so threads are handed back regularly
+EVENTS_STREAM_SECONDS = int(os.getenv("EVENTS_STREAM_SECONDS", "300"))
+
+KEEPALIVE_SECONDS = 15
+RETRY_MILLISECONDS = 3000
+
+streams = threading.BoundedSemaphore(EVENTS_MAX_STREAMS)
+
+
+def _message(event_type, resource_version, data):
+    message = f"event: {event_type}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+    if resource_version is None:
+        return message
+    return f"id: {resource_version}\n{message}"
+
+
+def _stream(cache, plural, resource_version):
+    yield f"retry: {RETRY_MILLISECONDS}\n\n"
+
+    deadline = time.monotonic() + EVENTS_STREAM_SECONDS
+    while time.monotonic() < deadline:
+        events = cache.events_since(resource_version, KEEPALIVE_SECONDS)
+
+        if events is None:
+            # The changes since resource_version are gone, the client has to
+            # fetch the list again
+            resource_version = cache.content_version
+            yield _message("RESYNC", resource_version, {})
+        elif not events:
+            yield ": keep-alive\n\n"
+        else:
+            for index, (version, event_type, obj) in enumerate(events):
+                if event_type == "DELETED":
+                    data = {"name": obj["metadata"]["name"]}
+                else:
+                    data = tag_local(PROJECTIONS[plural](obj))
+
+                # The changes found by a relist share its resourceVersion. Only
+                # the last one carries the id, so a client disconnected in the
+                # middle resumes before all of them.
+                last_of_version = index == len(events) - 1 or events[index + 1][0] != version
+                yield _message(event_type, version if last_of_version else None, data)
+            resource_version = events[-1][0]
+
+
+# Server-Sent Events stream of the ADDED, MODIFIED and DELETED changes of a
+# Velero collection, as the summaries of the list endpoint. The stream starts
+# after the resourceVersion of a list response (resourceVersion query
+# parameter) or of the last event received (Last-Event-ID header on reconnect).
+# A RESYNC event asks the client to fetch the list again.
+def events_response(plural):
+    cache = get_cache(plural)
+    if cache is None:
+        return {"message": "Live updates are not available while the cache is disabled"}, 503
+
+    # The pages then refresh their list after their own changes and try to
+    # subscribe again when they list the collection
+    if not streams.acquire(blocking=False):
+        return {"message": "Too many live update streams, try again later"}, 503, {"Retry-After": str(RETRY_MILLISECONDS // 1000)}
+
+    resource_version = request.headers.get("Last-Event-ID") or request.args.get("resourceVersion") or cache.content_version
+    logger.debug(f"Stream {plural} changes after resourceVersion {resource_version}")
+
+    response = Response(_stream(cache, plural, resource_version), mimetype="text/event-stream")
+    response.call_on_close(streams.release)
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
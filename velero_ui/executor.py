@@ -0,0 +1,83 @@
+import os
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+
+logger = logging.getLogger(__name__)
+
+# Threads of a worker running independent Kubernetes and S3 calls concurrently
+IO_THREADS = int(os.getenv("IO_THREADS", "16"))
+
+executor = None
+executor_pid = None
+executor_lock = threading.Lock()
+
+# Set in the executor threads, where nested calls run inline so a full pool
+# never waits on itself
+in_executor = threading.local()
+
+
+def get_executor():
+    global executor, executor_pid
+
+    with executor_lock:
+        if executor is None or executor_pid != os.getpid():
+            executor = ThreadPoolExecutor(max_workers=IO_THREADS, thread_name_prefix="velero-ui-io")
+            executor_pid = os.getpid()
+        return executor
+
+
+def _run_in_executor(call):
+    in_executor.active = True
+    try:
+        return call()
+    finally:
+        in_executor.active = False
+
+
+# Run independent blocking calls concurrently on the bounded executor and
+# return their results in order. An exception raised by a call is raised
+# again here.
+def gather(*calls):
+    if len(calls) < 2 or getattr(in_executor, "active", False):
+        return [call() for call in calls]
+
+    futures = [get_executor().submit(_run_in_executor, call) for call in calls]
+    return [future.result() for future in futures]
+
+
+# gather() of func(item) for each item
+def gather_map(func, items):
+    return gather(*(lambda item=item: func(item) for item in items))
+
+
+# Submit func(item) for every item to the executor, at most limit of them at
+# once for this caller, the next one starting when one finishes, so a large
+# request does not take every thread of the pool. Return the futures of the
+# calls in the order of items. Cancelling them skips the calls not started yet.
+def submit_limited(func, items, limit):
+    futures = [Future() for _ in items]
+    pending = iter(list(zip(items, futures)))
+    pending_lock = threading.Lock()
+    slots = threading.Semaphore(max(limit, 1))
+
+    def run(item, future):
+        try:
+            future.set_result(_run_in_executor(lambda: func(item)))
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            slots.release()
+            start()
+
+    def start():
+        while slots.acquire(blocking=False):
+            with pending_lock:
+                entry = next((entry for entry in pending if entry[1].set_running_or_notify_cancel()), None)
+            if entry is None:
+                slots.release()
+                return
+            get_executor().submit(run, *entry)
+
+    start()
+    return futures
@@ -0,0 +1,102 @@
+import time
+import random
+import logging
+import threading
+
+from velero_ui.kube_api import load_config, is_config_loaded
+from velero_ui.cache import get_cache, caches, CACHE_DISABLED
+from velero_ui.user import create_admin_user_if_not_exists
+
+logger = logging.getLogger(__name__)
+
+# Collections listed by the UI pages, watched from startup so the first
+# requests are served from their caches
+STARTUP_CACHES = ("backups", "restores", "schedules", "backupstoragelocations")
+
+# Longest wait between two attempts of a failed startup step
+STARTUP_MAX_BACKOFF = 30
+
+
+# Steps run once a worker is up: loading the kube config, starting the
+# caches and making sure the admin user exists. They run in the background
+# so the worker serves /healthz and /readyz at once, and are retried until
+# they succeed.
+class Startup:
+    def __init__(self):
+        self.caches_started = False
+        self.admin_user = False
+        self.error = None
+        self.thread = None
+
+    def _attempt(self):
+        load_config()
+
+        if not self.caches_started:
+            for plural in STARTUP_CACHES:
+                get_cache(plural)
+            self.caches_started = True
+
+        if not self.admin_user:
+            create_admin_user_if_not_exists()
+            self.admin_user = True
+
+    def _run(self):
+        backoff = 1
+        while True:
+            try:
+                self._attempt()
+                self.error = None
+                logger.info("Startup is complete")
+                return
+            except Exception as e:
+                self.error = str(e)
+                logger.error(f"Startup failed, retrying in {backoff}s: {e}")
+            time.sleep(backoff + random.uniform(0, backoff / 2))
+            backoff = min(backoff * 2, STARTUP_MAX_BACKOFF)
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="startup", daemon=True)
+        self.thread.start()
+
+    def done(self):
+        return self.caches_started and self.admin_user
+
+
+startup = Startup()
+
+
+def init_startup():
+    startup.start()
+
+
+def _cache_state(cache):
+    if cache.is_fresh():
+        return "synced"
+    if cache.last_contact:
+        return "stale"
+    if cache.is_warm():
+        return "snapshot"
+    return "syncing"
+
+
+# Liveness: the worker answers requests
+def get_healthz():
+    return {"status": "ok"}
+
+
+# Readiness: the kube config is loaded and the collections of the pages hold
+# their objects, listed or from a snapshot. A cache going stale later does not
+# make the worker unready, its lists then go to the API server directly.
+# Never calls the API server.
+def get_readyz():
+    states = {name: _cache_state(cache) for name, cache in list(caches.items()) if name in STARTUP_CACHES}
+
+    ready = is_config_loaded() and (CACHE_DISABLED or (startup.caches_started and "syncing" not in states.values()))
+    body = {
+        "status": "ready" if ready else "starting",
+        "caches": states,
+        "adminUser": startup.admin_user,
+    }
+    if startup.error:
+        body["error"] = startup.error
+    return body, 200 if ready else 503
@@ -0,0 +1,398 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+from datetime import datetime, timezone
+
+from flask import request
+
+from velero_ui.cache import get_cache
+from velero_ui.relations import SyncedIndex, SCHEDULE_LABEL
+from velero_ui.velero_api import TERMINAL_PHASES
+from velero_ui.bulk import parse_duration
+from velero_ui.timestamps import parse_time
+
+logger = logging.getLogger(__name__)
+
+HISTORY_DISABLED = os.getenv("DISABLE_HISTORY", "").lower() == "true"
+
+# SQLite database of backup outcomes, shared by the workers. Put it on a
+# persistent volume to keep the history across restarts.
+HISTORY_DB = os.getenv("HISTORY_DB", "/tmp/velero-ui-history.db")
+
+# Pending changes are written at most this often, in one transaction
+HISTORY_FLUSH_SECONDS = float(os.getenv("HISTORY_FLUSH_SECONDS", "5"))
+
+# Backups finished longer ago than this are removed from the history
+HISTORY_RETENTION_DAYS = float(os.getenv("HISTORY_RETENTION_DAYS", "180"))
+
+RETENTION_INTERVAL_SECONDS = 3600
+
+# Changes kept for the next flush while the database cannot be written, oldest
+# dropped first
+MAX_PENDING_CHANGES = 10000
+DEFAULT_WINDOW = "7d"
+MAX_FAILURES = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS backups (
+    name TEXT PRIMARY KEY,
+    schedule TEXT,
+    phase TEXT NOT NULL,
+    errors INTEGER NOT NULL DEFAULT 0,
+    warnings INTEGER NOT NULL DEFAULT 0,
+    items INTEGER,
+    created REAL,
+    started REAL,
+    completed REAL,
+    deleted REAL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS backups_completed ON backups (completed);
+CREATE INDEX IF NOT EXISTS backups_schedule_completed ON backups (schedule, completed);
+CREATE TABLE IF NOT EXISTS transitions (
+    name TEXT NOT NULL,
+    phase TEXT NOT NULL,
+    at REAL NOT NULL,
+    PRIMARY KEY (name, phase)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS transitions_at ON transitions (at);
+"""
+
+# Every worker records the same changes, the statements are idempotent
+UPSERT_BACKUP = """
+INSERT INTO backups (name, schedule, phase, errors, warnings, items, created, started, completed, deleted, updated)
+VALUES (:name, :schedule, :phase, :errors, :warnings, :items, :created, :started, :completed, NULL, :updated)
+ON CONFLICT (name) DO UPDATE SET
+    schedule = excluded.schedule, phase = excluded.phase, errors = excluded.errors, warnings = excluded.warnings,
+    items = excluded.items, created = excluded.created, started = excluded.started, completed = excluded.completed,
+    deleted = NULL, updated = excluded.updated
+"""
+INSERT_TRANSITION = "INSERT OR IGNORE INTO transitions (name, phase, at) VALUES (:name, :phase, :at)"
+MARK_DELETED = "UPDATE backups SET deleted = :deleted WHERE name = :name AND deleted IS NULL"
+RECORDED_PHASES = "SELECT name, phase FROM backups WHERE deleted IS NULL"
+
+connections = threading.local()
+
+
+def _epoch(value):
+    parsed = parse_time(value)
+    return parsed.timestamp() if parsed else None
+
+def _iso(epoch):
+    if epoch is None:
+        return None
+    return datetime.fromtimestamp(epoch, timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+# Connection of the current thread, WAL mode so readers do not wait for the
+# writer of another worker
+def _connection():
+    connection = getattr(connections, "connection", None)
+    if connection is None or getattr(connections, "pid", None) != os.getpid():
+        connection = sqlite3.connect(HISTORY_DB, timeout=10)
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        connection.execute("PRAGMA journal_mode = WAL")
+        connection.execute("PRAGMA synchronous = NORMAL")
+        connection.executescript(SCHEMA)
+        connections.connection = connection
+        connections.pid = os.getpid()
+    return connection
+
+
+def _record(backup):
+    metadata = backup.get("metadata", {})
+    status = backup.get("status", {})
+    phase = status.get("phase") or "New"
+    started = _epoch(status.get("startTimestamp"))
+    completed = _epoch(status.get("completionTimestamp"))
+    now = time.time()
+
+    if phase in TERMINAL_PHASES:
+        at = completed or now
+    elif phase == "InProgress":
+        at = started or now
+    else:
+        at = _epoch(metadata.get("creationTimestamp")) or now
+
+    return {
+        "name": metadata["name"],
+        "schedule": (metadata.get("labels") or {}).get(SCHEDULE_LABEL),
+        "phase": phase,
+        "errors": status.get("errors", 0),
+        "warnings": status.get("warnings", 0),
+        "items": (status.get("progress") or {}).get("itemsBackedUp"),
+        "created": _epoch(metadata.get("creationTimestamp")),
+        "started": started,
+        "completed": completed,
+        "updated": now,
+        "at": at,
+    }
+
+
+# Drop the oldest changes beyond MAX_PENDING_CHANGES, return how many
+def _trim(changes):
+    dropped = max(len(changes) - MAX_PENDING_CHANGES, 0)
+    del changes[:dropped]
+    return dropped
+
+
+# Follow the backups cache and queue a record whenever a backup changes
+# phase or disappears. The queue is written in one transaction per flush.
+class HistoryRecorder(SyncedIndex):
+    def __init__(self):
+        self.pending = []
+        self.deleted = []
+        self.loaded = False
+        super().__init__("backups")
+
+    def _reset(self):
+        # name -> last recorded phase
+        self.phases = {}
+
+    # Compare the listed backups with the phases recorded so far, read from
+    # the database on the first rebuild of a worker. Only the backups whose
+    # phase changed are queued, and the ones missing from the list were deleted
+    # while the changes were not followed.
+    def _rebuild(self, items):
+        if not self.loaded:
+            with _connection() as connection:
+                self.phases = {row["name"]: row["phase"] for row in connection.execute(RECORDED_PHASES)}
+            self.loaded = True
+
+        previous = self.phases
+        self.phases = {}
+        for backup in items:
+            self._add(backup, previous.get(backup["metadata"]["name"]))
+
+        deleted = previous.keys() - self.phases.keys()
+        now = time.time()
+        self.deleted.extend({"name": name, "deleted": now} for name in deleted)
+        logger.debug(f"History compared {len(items)} backups, {len(deleted)} deleted since the last sync")
+
+    def _add(self, backup, recorded=None):
+        name = backup["metadata"]["name"]
+        phase = backup.get("status", {}).get("phase") or "New"
+        if self.phases.get(name, recorded) != phase:
+            self.pending.append(_record(backup))
+        self.phases[name] = phase
+
+    def _remove(self, name):
+        if self.phases.pop(name, None) is not None:
+            self.deleted.append({"name": name, "deleted": time.time()})
+
+    def _apply(self, event_type, backup):
+        if event_type == "DELETED":
+            self._remove(backup["metadata"]["name"])
+        else:
+            self._add(backup)
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, []
+            deleted, self.deleted = self.deleted, []
+        if not pending and not deleted:
+            return
+
+        try:
+            connection = _connection()
+            with connection:
+                connection.executemany(UPSERT_BACKUP, pending)
+                connection.executemany(INSERT_TRANSITION, pending)
+                connection.executemany(MARK_DELETED, deleted)
+        except sqlite3.Error:
+            # Keep the most recent changes for the next flush
+            with self.lock:
+                self.pending[:0] = pending
+                self.deleted[:0] = deleted
+                dropped = _trim(self.pending) + _trim(self.deleted)
+            if dropped:
+                logger.warning(f"History dropped {dropped} changes that could not be written")
+            raise
+        logger.debug(f"History recorded {len(pending)} backup changes and {len(deleted)} deletions")
+
+    def _run(self):
+        next_retention = 0.0
+        while True:
+            try:
+                # Only follow a synced cache, never list the API server from here
+                cache = get_cache("backups")
+                if cache is not None and cache.is_fresh():
+                    self.sync()
+                    self.flush()
+
+                if time.monotonic() >= next_retention:
+                    apply_retention()
+                    next_retention = time.monotonic() + RETENTION_INTERVAL_SECONDS
+            except Exception as e:
+                logger.error(f"History recording failed: {e}")
+            time.sleep(HISTORY_FLUSH_SECONDS)
+
+    def start(self):
+        threading.Thread(target=self._run, name="history-recorder", daemon=True).start()
+
+
+# Remove backups finished before the retention period and give the freed
+# pages back to the file system
+def apply_retention():
+    cutoff = time.time() - HISTORY_RETENTION_DAYS * 86400
+    connection = _connection()
+    with connection:
+        removed = connection.execute("DELETE FROM backups WHERE COALESCE(completed, started, created, updated) < ?", (cutoff,)).rowcount
+        connection.execute("DELETE FROM transitions WHERE at < ?", (cutoff,))
+    connection.execute("PRAGMA incremental_vacuum")
+    if removed:
+        logger.info(f"History retention removed {removed} backups")
+
+
+def init_history():
+    if HISTORY_DISABLED:
+        logger.info("Backup history is disabled")
+        return
+    if get_cache("backups") is None:
+        logger.info("Backup history needs the resource cache, it is disabled")
+        return
+
+    try:
+        _connection()
+    except sqlite3.Error as e:
+        logger.error(f"Cannot open backup history database {HISTORY_DB}: {e}")
+        return
+    HistoryRecorder().start()
+
+
+# (from, to) epoch seconds of the request window: window=30d ending now, or
+# from and to as ISO 8601 timestamps.
+# Raise ValueError on invalid parameters.
+def _window(args):
+    try:
+        end = _epoch(args.get("to")) or time.time()
+        start = _epoch(args.get("from"))
+    except ValueError:
+        raise ValueError("Query parameters 'from' and 'to' must be ISO 8601 timestamps")
+    if start is None:
+        start = end - parse_duration(args.get("window") or DEFAULT_WINDOW)
+    if start >= end:
+        raise ValueError("The window must end after it starts")
+    return start, end
+
+
+# WHERE clause and parameters selecting the backups finished in the request
+# window, optionally of one schedule, and the window as returned to clients
+def _finished(args):
+    start, end = _window(args)
+    where = f"completed >= ? AND completed < ? AND phase IN ({','.join('?' * len(TERMINAL_PHASES))})"
+    params = [start, end, *TERMINAL_PHASES]
+    if args.get("schedule"):
+        where += " AND schedule = ?"
+        params.append(args["schedule"])
+    return where, params, {"from": _iso(start), "to": _iso(end), "schedule": args.get("schedule")}
+
+
+def _limit(args):
+    try:
+        limit = int(args.get("limit") or 100)
+    except ValueError:
+        raise ValueError("Query parameter 'limit' must be an integer")
+    if limit < 1:
+        raise ValueError("Query parameter 'limit' must be greater than 0")
+    return min(limit, MAX_FAILURES)
+
+
+def _history_error(e):
+    if isinstance(e, ValueError):
+        return {"message": str(e)}, 400
+    logger.error(f"History query failed: {e}")
+    return {"message": f"History is not available. {e}"}, 503
+
+
+# Share of the backups finished in the window that completed, overall and per
+# schedule
+def get_success_rate():
+    if HISTORY_DISABLED:
+        return {"message": "Backup history is disabled"}, 404
+    try:
+        where, params, window = _finished(request.args)
+        rows = _connection().execute(f"SELECT schedule, phase, COUNT(*) AS count FROM backups WHERE {where} GROUP BY schedule, phase", params).fetchall()
+    except (ValueError, sqlite3.Error) as e:
+        return _history_error(e)
+
+    schedules = {}
+    for row in rows:
+        counts = schedules.setdefault(row["schedule"], {})
+        counts[row["phase"]] = row["count"]
+
+    def rate(counts):
+        total = sum(counts.values())
+        succeeded = counts.get("Completed", 0)
+        return {"total": total, "succeeded": succeeded, "failed": total - succeeded, "byPhase": counts,
+                "successRate": round(succeeded / total, 4) if total else None}
+
+    overall = {}
+    for counts in schedules.values():
+        for phase, count in counts.items():
+            overall[phase] = overall.get(phase, 0) + count
+
+    return {**window, **rate(overall), "bySchedule": [{"schedule": schedule, **rate(counts)} for schedule, counts in sorted(schedules.items(), key=lambda entry: entry[0] or "")]}
+
+
+def _percentile(values, fraction):
+    return values[min(int(round(fraction * (len(values) - 1))), len(values) - 1)]
+
+# Duration percentiles in seconds of the backups finished in the window
+def get_duration_percentiles():
+    if HISTORY_DISABLED:
+        return {"message": "Backup history is disabled"}, 404
+    try:
+        where, params, window = _finished(request.args)
+        rows = _connection().execute(f"SELECT completed - started AS duration FROM backups WHERE {where} AND started IS NOT NULL ORDER BY duration", params).fetchall()
+    except (ValueError, sqlite3.Error) as e:
+        return _history_error(e)
+
+    durations = [row["duration"] for row in rows]
+    if not durations:
+        return {**window, "count": 0}
+    return {
+        **window,
+        "count": len(durations),
+        "mean": round(sum(durations) / len(durations), 1),
+        "p50": _percentile(durations, 0.50),
+        "p90": _percentile(durations, 0.90),
+        "p95": _percentile(durations, 0.95),
+        "p99": _percentile(durations, 0.99),
+        "max": durations[-1],
+    }
+
+
+# Failed and partially failed backups of the window, newest first, with the
+# number of failures per schedule
+def get_failures():
+    if HISTORY_DISABLED:
+        return {"message": "Backup history is disabled"}, 404
+    try:
+        limit = _limit(request.args)
+        where, params, window = _finished(request.args)
+        where += " AND phase != 'Completed'"
+        connection = _connection()
+        rows = connection.execute(f"SELECT name, schedule, phase, errors, warnings, started, completed, deleted FROM backups WHERE {where} ORDER BY completed DESC LIMIT ?", params + [limit]).fetchall()
+        counts = connection.execute(f"SELECT schedule, COUNT(*) AS count FROM backups WHERE {where} GROUP BY schedule", params).fetchall()
+    except (ValueError, sqlite3.Error) as e:
+        return _history_error(e)
+
+    return {
+        **window,
+        "total": sum(row["count"] for row in counts),
+        "bySchedule": [{"schedule": row["schedule"], "count": row["count"]} for row in counts],
+        "items": [{
+            "name": row["name"],
+            "schedule": row["schedule"],
+            "phase": row["phase"],
+            "errors": row["errors"],
+            "warnings": row["warnings"],
+            "started": _iso(row["started"]),
+            "completed": _iso(row["completed"]),
+            "deleted": row["deleted"] is not None,
+        } for row in rows],
+    }
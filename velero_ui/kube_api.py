@@ -1,44 +1,95 @@
 from kubernetes import client, config
-from kubernetes.client.rest import ApiException
+from urllib3.connection import HTTPConnection
+
+from velero_ui.metrics import instrument_api_client
 
 
 import os
+import socket
 import logging
+import threading
 
 logger = logging.getLogger(__name__)
+
+# Connections to the API server kept open by the shared client of a worker
+KUBE_POOL_MAXSIZE = int(os.getenv("KUBE_POOL_MAXSIZE", "16"))
+# Enable TCP keep-alive on API server connections so idle pooled connections
+# and long watches survive NAT and load balancer idle timeouts
+KUBE_TCP_KEEPALIVE = os.getenv("KUBE_TCP_KEEPALIVE", "true").lower() == "true"
+KUBE_CONNECT_TIMEOUT = float(os.getenv("KUBE_CONNECT_TIMEOUT_SECONDS", "5"))
+KUBE_READ_TIMEOUT = float(os.getenv("KUBE_READ_TIMEOUT_SECONDS", "30"))
+
+# (connect, read) timeout passed as _request_timeout to every API call
+REQUEST_TIMEOUT = (KUBE_CONNECT_TIMEOUT, KUBE_READ_TIMEOUT)
+
+config_loaded = False
+config_lock = threading.Lock()
+
+api_client = None
+api_client_pid = None
+api_client_lock = threading.Lock()
+
+
+# API client with the shared pool settings, by default for the loaded kube config
+def create_api_client(configuration=None):
+    configuration = configuration or client.Configuration.get_default_copy()
+    configuration.connection_pool_maxsize = KUBE_POOL_MAXSIZE
+    if KUBE_TCP_KEEPALIVE:
+        configuration.socket_options = HTTPConnection.default_socket_options + [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+    return instrument_api_client(client.ApiClient(configuration))
+
+# (Re)create the process wide API client from the loaded kube config
+def init_api_client():
+    global api_client, api_client_pid
+
+    load_config()
+    with api_client_lock:
+        api_client = create_api_client()
+        api_client_pid = os.getpid()
+        return api_client
+
+# Process wide API client, so all calls share one urllib3 connection pool
+# instead of opening a new TLS connection each. A forked worker creates its
+# own client rather than reusing the connections of its parent.
+def get_api_client():
+    with api_client_lock:
+        if api_client is not None and api_client_pid == os.getpid():
+            return api_client
+    return init_api_client()
+
+def custom_objects_api():
+    return client.CustomObjectsApi(get_api_client())
+
+def core_v1_api():
+    return client.CoreV1Api(get_api_client())
+
+def apps_v1_api():
+    return client.AppsV1Api(get_api_client())
     
-# Check authentication
-def auth():
-    # Create the Kubernetes API client
-    try:
-        config.load_incluster_config()
-        logger.debug("Authenticate using incluster config")
-    except config.config_exception.ConfigException:
+# Load the in-cluster config, or the kube config outside a cluster. Done once,
+# on the first API call rather than at startup, since kube config auth plugins
+# may run commands.
+def load_config():
+    global config_loaded
+
+    with config_lock:
+        if config_loaded:
+            return
         try:
-            logger.debug("Authenticate using kubeconfig")
-            config.load_kube_config()
-        except config.config_exception.ConfigException as e:
-            logger.debug("Authentication is failed!")
-            logger.error(f"Could not load kube config: {str(e)}")
-            raise
-    
-    try:
-      configuration = client.ApiClient().configuration
-      logger.info("Kube API server is running at: " + configuration.host)
-      logger.info("Authentication is succesful!")
-          
-    except ApiException as e:
-        # Catch specific API exceptions related to authentication issues
-        if e.status == 403:
-            logger.error("Unauthorized: Access forbidden (403)")
-        else:
-            logger.error(f"API Exception: {e}")
-        
-        return False
-
-    except Exception as e:
-        logger.error(f"Exception: {e}")
-        return False
+            config.load_incluster_config()
+            logger.debug("Authenticate using incluster config")
+        except config.config_exception.ConfigException:
+            try:
+                logger.debug("Authenticate using kubeconfig")
+                config.load_kube_config()
+            except config.config_exception.ConfigException as e:
+                logger.error(f"Could not load kube config: {str(e)}")
+                raise
+        config_loaded = True
+        logger.info("Kube API server is running at: " + client.Configuration.get_default_copy().host)
+
+def is_config_loaded():
+    return config_loaded
 
 def get_namespace():
     current_namespace = f"default"
@@ -0,0 +1,223 @@
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+from flask import request, Response
+
+from velero_ui.cache import sorted_custom_objects
+from velero_ui.clusters import multi_cluster_enabled, merged_sorted_objects, CLUSTER_NAME
+from velero_ui.projection import PROJECTIONS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 500
+
+# Number of encoded list responses kept for identical requests
+ENCODED_CACHE_SIZE = 128
+
+
+def _name(item):
+    return item["metadata"]["name"]
+
+def _created(item):
+    return item["metadata"].get("creationTimestamp")
+
+def _phase(item):
+    return item.get("status", {}).get("phase") or "New"
+
+def _errors(item):
+    return item.get("status", {}).get("errors", 0)
+
+def _warnings(item):
+    return item.get("status", {}).get("warnings", 0)
+
+def _backup_storage_location(item):
+    return item.get("spec", {}).get("storageLocation")
+
+def _schedule_storage_location(item):
+    return item.get("spec", {}).get("template", {}).get("storageLocation")
+
+
+# Fields the list endpoints can be sorted by, per plural
+SORT_FIELDS = {
+    "backups": {
+        "name": _name,
+        "created": _created,
+        "phase": _phase,
+        "errors": _errors,
+        "warnings": _warnings,
+        "expiration": lambda item: item.get("status", {}).get("expiration"),
+        "storageLocation": _backup_storage_location,
+    },
+    "restores": {
+        "name": _name,
+        "created": _created,
+        "phase": _phase,
+        "errors": _errors,
+        "warnings": _warnings,
+        "backup": lambda item: item.get("spec", {}).get("backupName") or item.get("spec", {}).get("scheduleName"),
+    },
+    "schedules": {
+        "name": _name,
+        "created": _created,
+        "phase": _phase,
+        "lastBackup": lambda item: item.get("status", {}).get("lastBackup"),
+    },
+    "backupstoragelocations": {
+        "name": _name,
+        "created": _created,
+        "phase": _phase,
+    },
+}
+
+STORAGE_LOCATION_FIELDS = {
+    "backups": _backup_storage_location,
+    "schedules": _schedule_storage_location,
+}
+
+
+def positive_int(args, param, default):
+    value = args.get(param)
+    if value is None or value == "":
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise ValueError(f"Query parameter '{param}' must be an integer")
+    if number < 1:
+        raise ValueError(f"Query parameter '{param}' must be greater than 0")
+    return number
+
+
+# Items start..stop of the sorted collection, where items without a sort
+# value always come last regardless of the order
+def _ordered_slice(valued, missing, descending, start, stop):
+    count = len(valued)
+    head = []
+    if start < count:
+        if descending:
+            head = valued[max(count - stop, 0):count - start][::-1]
+        else:
+            head = valued[start:min(stop, count)]
+    tail = missing[max(start - count, 0):max(stop - count, 0)]
+    return head + tail
+
+
+# Return one page of a Velero collection filtered and sorted according to the
+# request query parameters, with the resourceVersion of the collection.
+# Without page and limit the whole collection is returned.
+# With several clusters the collections of all clusters are merged, items are
+# tagged with their cluster and the version covers every cluster.
+# Raise ValueError on invalid parameters.
+def query_list(plural, args):
+    fields = SORT_FIELDS[plural]
+
+    sort = args.get("sort") or "created"
+    if sort not in fields:
+        raise ValueError(f"Cannot sort {plural} by '{sort}'. Supported fields: {', '.join(fields)}")
+
+    order = args.get("order") or ("desc" if sort == "created" else "asc")
+    if order not in ("asc", "desc"):
+        raise ValueError("Query parameter 'order' must be 'asc' or 'desc'")
+
+    page = positive_int(args, "page", 1)
+    if "page" in args or "limit" in args:
+        limit = min(positive_int(args, "limit", DEFAULT_LIMIT), MAX_LIMIT)
+    else:
+        limit = None
+
+    phases = set(args.get("phase").split(",")) if args.get("phase") else None
+    prefix = args.get("prefix")
+    storage_location = args.get("storageLocation")
+    if storage_location and plural not in STORAGE_LOCATION_FIELDS:
+        raise ValueError(f"Cannot filter {plural} by storageLocation")
+
+    if multi_cluster_enabled():
+        valued, missing, cluster_of, resource_version, version, statuses = merged_sorted_objects(plural, sort, fields[sort], args.get("cluster"))
+    else:
+        valued, missing, resource_version = sorted_custom_objects(plural, sort, fields[sort])
+        cluster_of, version, statuses = None, resource_version, None
+    descending = order == "desc"
+    start = (page - 1) * limit if limit else 0
+    stop = start + limit if limit else len(valued) + len(missing)
+
+    if not phases and not prefix and not storage_location:
+        items = _ordered_slice(valued, missing, descending, start, stop)
+        total = len(valued) + len(missing)
+    else:
+        def matches(item):
+            if phases and _phase(item) not in phases:
+                return False
+            if prefix and not _name(item).startswith(prefix):
+                return False
+            if storage_location and STORAGE_LOCATION_FIELDS[plural](item) != storage_location:
+                return False
+            return True
+
+        matching_valued = [item for item in valued if matches(item)]
+        matching_missing = [item for item in missing if matches(item)]
+        items = _ordered_slice(matching_valued, matching_missing, descending, start, stop)
+        total = len(matching_valued) + len(matching_missing)
+
+    result = {"items": items, "total": total, "page": page, "limit": limit, "sort": sort, "order": order, "resourceVersion": resource_version}
+    if cluster_of is not None:
+        result["items"] = [dict(item, cluster=cluster_of[id(item)]) for item in items]
+        result["clusters"] = statuses
+    return result, version
+
+
+# Summary of an item, with its cluster when lists are merged. Objects of the
+# other clusters are read-only, actions go to the cluster the UI is connected to.
+def _project(plural, item):
+    summary = PROJECTIONS[plural](item)
+    if "cluster" in item:
+        summary["cluster"] = item["cluster"]
+        summary["readOnly"] = item["cluster"] != CLUSTER_NAME
+    return summary
+
+
+encoded_cache = OrderedDict()
+encoded_cache_lock = threading.Lock()
+
+
+def _list_etag(plural, resource_version, args):
+    query = "&".join(f"{key}={value}" for key, value in sorted(args.items(multi=True)))
+    digest = hashlib.sha1(f"{plural}|{resource_version}|{query}".encode("utf-8")).hexdigest()[:20]
+    return f"{plural}-{digest}"
+
+
+# Build the list response of a Velero collection: projected summaries encoded
+# once, tagged with an ETag derived from the collection resourceVersion so an
+# unchanged list answers 304 Not Modified.
+# Raise ValueError on invalid query parameters.
+def list_response(plural):
+    result, resource_version = query_list(plural, request.args)
+    etag = _list_etag(plural, resource_version, request.args) if resource_version else None
+
+    if etag and request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        with encoded_cache_lock:
+            body = encoded_cache.get(etag) if etag else None
+            if body is not None:
+                encoded_cache.move_to_end(etag)
+
+        if body is None:
+            result["items"] = [_project(plural, item) for item in result["items"]]
+            body = json.dumps(result, separators=(",", ":"))
+
+            if etag:
+                with encoded_cache_lock:
+                    encoded_cache[etag] = body
+                    while len(encoded_cache) > ENCODED_CACHE_SIZE:
+                        encoded_cache.popitem(last=False)
+
+        response = Response(body, mimetype="application/json")
+
+    if etag:
+        response.set_etag(etag, weak=True)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
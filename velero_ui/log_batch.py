@@ -0,0 +1,132 @@
+import os
+import json
+import queue
+import logging
+import threading
+
+from flask import Response
+
+import velero_ui.velero_api as velero_api
+from velero_ui.bulk import requested_names
+from velero_ui.executor import submit_limited
+from velero_ui.log_stream import split_lines, join_lines
+from velero_ui.log_index import level_lines, parse_levels, block_lines
+
+logger = logging.getLogger(__name__)
+
+# Logs a batch request downloads at once
+LOG_BATCH_CONCURRENCY = int(os.getenv("LOG_BATCH_CONCURRENCY", "4"))
+
+# Maximum number of logs of a batch request
+MAX_BATCH_LOGS = 200
+
+# Blocks of encoded lines waiting to be sent, so fast downloads wait for a slow
+# client instead of piling up in memory
+BATCH_QUEUE_SIZE = 16
+
+# Seconds between checks that the client is still reading while the queue is full
+PUT_TIMEOUT = 1.0
+
+LOG_FUNCTIONS = {
+    "backups": velero_api.get_backup_log,
+    "restores": velero_api.get_restore_log,
+}
+
+
+class BatchClosed(Exception):
+    pass
+
+
+def _put(output, item, closed):
+    while True:
+        if closed.is_set():
+            raise BatchClosed()
+        try:
+            output.put(item, timeout=PUT_TIMEOUT)
+            return
+        except queue.Full:
+            pass
+
+
+def _records(name, lines):
+    return "".join(json.dumps({"name": name, "line": line.decode("utf-8", "replace").rstrip("\n")}) + "\n" for line in lines).encode("utf-8")
+
+
+# Download one log and queue its lines as NDJSON records, followed by a record
+# telling whether the whole log was read. A download or decompression failure,
+# raised by the content while it is read, ends the log with an error record
+# holding the number of lines sent before it.
+def _fetch(plural, name, levels, output, closed):
+    count = 0
+    try:
+        content = LOG_FUNCTIONS[plural](name)
+        if content is None:
+            status = {"name": name, "error": f"Cannot retrieve logs of {plural[:-1]} {name}"}
+        elif isinstance(content, str):
+            status = {"name": name, "error": content}
+        else:
+            try:
+                lines = level_lines(content, levels) if levels else split_lines(content)
+                for block in join_lines(lines):
+                    records = block_lines(block)
+                    count += len(records)
+                    _put(output, _records(name, records), closed)
+            finally:
+                content.close()
+            status = {"name": name, "done": True, "lines": count}
+    except BatchClosed:
+        return
+    except Exception as e:
+        logger.error(f"Cannot read log of {plural[:-1]} {name}: {e}")
+        status = {"name": name, "error": f"Log of {plural[:-1]} {name} could not be read completely: {e}", "lines": count}
+
+    try:
+        _put(output, status, closed)
+    except BatchClosed:
+        pass
+
+
+# Stream the logs of names, downloaded LOG_BATCH_CONCURRENCY at a time. Lines
+# of different logs are interleaved by blocks, every record carries the name of
+# its log. The workers stop when the client goes away.
+def _stream(plural, names, levels):
+    output = queue.Queue(maxsize=BATCH_QUEUE_SIZE)
+    closed = threading.Event()
+    futures = submit_limited(lambda name: _fetch(plural, name, levels, output, closed), names, LOG_BATCH_CONCURRENCY)
+
+    remaining = len(names)
+    failed = 0
+    try:
+        while remaining:
+            item = output.get()
+            if isinstance(item, bytes):
+                yield item
+                continue
+            remaining -= 1
+            if "error" in item:
+                failed += 1
+            yield (json.dumps(item) + "\n").encode("utf-8")
+        yield (json.dumps({"done": True, "logs": len(names), "failed": failed}) + "\n").encode("utf-8")
+    finally:
+        closed.set()
+        for future in futures:
+            future.cancel()
+
+
+# NDJSON response with the logs of the backups or restores listed in
+# body["names"] or matching body["selector"], optionally only the lines logged
+# at one of body["level"] (e.g. "error" or "error,warning").
+# Raise ValueError on an invalid body.
+def log_batch_response(plural, body):
+    names = requested_names(plural, body, MAX_BATCH_LOGS, "read logs of")
+
+    levels = body.get("level")
+    if levels is not None and not isinstance(levels, str):
+        raise ValueError("'level' must be a string such as error or error,warning")
+    levels = parse_levels(levels) if levels else None
+
+    logger.info(f"Batch of {len(names)} {plural} logs")
+    response = Response(_stream(plural, names, levels), mimetype="application/x-ndjson")
+    # Ask reverse proxies such as ingress-nginx not to buffer the logs
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
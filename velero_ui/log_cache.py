@@ -0,0 +1,193 @@
+import os
+import time
+import hashlib
+import logging
+import threading
+
+from velero_ui.log_stream import CHUNK_SIZE
+from velero_ui.metrics import count_cache_read
+
+logger = logging.getLogger(__name__)
+
+LOG_CACHE_DISABLED = os.getenv("DISABLE_LOG_CACHE", "").lower() == "true"
+LOG_CACHE_DIR = os.getenv("LOG_CACHE_DIR", "/tmp/velero-ui-log-cache")
+LOG_CACHE_MAX_BYTES = int(os.getenv("LOG_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+# Temporary files older than this are leftovers of a crashed writer
+STALE_TMP_SECONDS = 3600
+
+
+# Size-bounded on-disk cache of decompressed logs, keyed by bucket, object
+# key and S3 ETag so a rewritten object is never served from a stale entry.
+# Entries are plain files, which lets every gunicorn worker share them; the
+# file modification time is the LRU clock.
+class LogCache:
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes_served = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, bucket, key, etag):
+        digest = hashlib.sha256(f"{bucket}|{key}|{etag}".encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, digest + ".log")
+
+    def _count(self, counter, amount=1):
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    # Path of a cached log, or None when it is not cached
+    def entry_path(self, bucket, key, etag):
+        path = self._path(bucket, key, etag)
+        return path if os.path.exists(path) else None
+
+    # Return a generator of the cached log, or None on a miss
+    def read(self, bucket, key, etag):
+        path = self._path(bucket, key, etag)
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            self._count("misses")
+            count_cache_read("log", "miss")
+            return None
+
+        self._count("hits")
+        count_cache_read("log", "hit")
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        logger.debug(f"Serve {key} from log cache")
+        return self._read_file(f)
+
+    def _read_file(self, f):
+        with f:
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                self._count("bytes_served", len(chunk))
+                yield chunk
+
+    # Pass chunks through while writing them to the cache. The entry is only
+    # published once the stream has been fully consumed without error.
+    def write_through(self, bucket, key, etag, chunks):
+        path = self._path(bucket, key, etag)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        size = 0
+        complete = False
+
+        try:
+            f = open(tmp_path, "wb")
+        except OSError as e:
+            logger.error(f"Cannot write log cache entry: {e}")
+            f = None
+
+        try:
+            for chunk in chunks:
+                if f is not None:
+                    size += len(chunk)
+                    try:
+                        if size > self.max_bytes:
+                            raise OSError(f"{key} is larger than the log cache")
+                        f.write(chunk)
+                    except OSError as e:
+                        logger.info(f"Do not cache {key}: {e}")
+                        f.close()
+                        os.remove(tmp_path)
+                        f = None
+                yield chunk
+            complete = True
+        finally:
+            if f is not None:
+                f.close()
+                if complete:
+                    os.replace(tmp_path, path)
+                    self.evict()
+                else:
+                    os.remove(tmp_path)
+
+    # Remove least recently used entries until the cache fits its budget
+    def evict(self):
+        entries = []
+        total = 0
+        now = time.time()
+
+        for entry in os.scandir(self.directory):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            if entry.name.endswith(".tmp"):
+                if now - stat.st_mtime > STALE_TMP_SECONDS:
+                    self._remove(entry.path)
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+
+        if total <= self.max_bytes:
+            return
+
+        entries.sort()
+        for _, size, path in entries:
+            if self._remove(path):
+                self._count("evictions")
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def stats(self):
+        entries = 0
+        size = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".log"):
+                try:
+                    size += entry.stat().st_size
+                    entries += 1
+                except FileNotFoundError:
+                    pass
+
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRatio": round(self.hits / lookups, 3) if lookups else None,
+                "evictions": self.evictions,
+                "bytesServed": self.bytes_served,
+                "entries": entries,
+                "bytes": size,
+                "maxBytes": self.max_bytes,
+            }
+
+
+log_cache = None
+log_cache_lock = threading.Lock()
+
+
+def get_log_cache():
+    global log_cache
+
+    if LOG_CACHE_DISABLED:
+        return None
+
+    with log_cache_lock:
+        if log_cache is None:
+            try:
+                log_cache = LogCache(LOG_CACHE_DIR, LOG_CACHE_MAX_BYTES)
+            except OSError as e:
+                logger.error(f"Cannot create log cache in {LOG_CACHE_DIR}: {e}")
+                return None
+    return log_cache
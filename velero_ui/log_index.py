@@ -0,0 +1,451 @@
+import os
+import re
+import json
+import mmap
+import heapq
+import itertools
+import bisect
+import logging
+import threading
+from array import array
+from collections import OrderedDict, Counter
+
+from botocore.exceptions import ClientError
+
+from velero_ui.log_stream import split_lines, join_lines
+from velero_ui.log_cache import get_log_cache
+from velero_ui.object_storage import get_s3_client
+from velero_ui.velero_api_utils import download_file_from_minio
+from velero_ui.list_query import positive_int
+from velero_ui.metrics import upstream_call
+
+logger = logging.getLogger(__name__)
+
+# Log lines of the search indexes kept in memory by a worker, least recently
+# searched logs first out
+LOG_INDEX_MAX_LINES = int(os.getenv("LOG_INDEX_MAX_LINES", "1000000"))
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+# Query parameters that turn a log request into a structured search
+SEARCH_PARAMS = ("level", "namespace", "resource", "q", "page", "limit")
+
+# Fields of the log lines that are indexed
+INDEXED_FIELDS = ("level", "namespace", "resource")
+
+LEVEL_ALIASES = {"warn": "warning", "err": "error"}
+
+# Lines read at once when searching a log for a text
+SEARCH_BLOCK_SIZE = 4 * 1024 * 1024
+
+# Candidate lines checked one by one for a text, above which the whole log is
+# scanned instead
+MAX_CANDIDATES_CHECKED = 10000
+
+# key=value pairs of a logfmt line, values either quoted with Go escapes or
+# running to the next space
+LOGFMT_PATTERN = re.compile(rb'([^\s="]+)=("(?:[^"\\]|\\.)*"|[^\s"]*)')
+
+QUOTED_OR_BARE = rb'("(?:[^"\\\n]|\\.)*"|[^\s"]*)'
+
+# Value of an indexed field of every line of a block of lines, b"" when a line
+# has none. Velero logs the level right after the time and sorts the other
+# fields by name after the message, so the level is searched from the start of
+# the line and namespace and resource from its end, which also skips matches
+# inside the quoted message and error.
+FIELD_PATTERNS = {
+    "level": re.compile(rb'^(?:[^\n]*? level=' + QUOTED_OR_BARE + rb')?[^\n]*$', re.MULTILINE),
+    "namespace": re.compile(rb'^(?:[^\n]* namespace=' + QUOTED_OR_BARE + rb')?[^\n]*$', re.MULTILINE),
+    "resource": re.compile(rb'^(?:[^\n]* resource=' + QUOTED_OR_BARE + rb')?[^\n]*$', re.MULTILINE),
+}
+
+
+def _value(raw):
+    if raw.startswith(b'"'):
+        try:
+            return json.loads(raw)
+        except ValueError:
+            return raw[1:-1].decode("utf-8", "replace")
+    return raw.decode("utf-8", "replace")
+
+
+# Fields of a logfmt line as a dict of str
+def parse_logfmt(line):
+    return {key.decode("utf-8", "replace"): _value(value) for key, value in LOGFMT_PATTERN.findall(line)}
+
+
+def _field_name(field, raw):
+    name = _value(raw)
+    if field == "level":
+        name = name.lower()
+        name = LEVEL_ALIASES.get(name, name)
+    return name
+
+
+# Values of the indexed fields of the lines of a block, the block holding count
+# lines
+def _block_values(block, count):
+    return {field: pattern.findall(block)[:count] for field, pattern in FIELD_PATTERNS.items()}
+
+
+# Lines of a block, each with its line feed
+def block_lines(block):
+    lines = block.split(b"\n")
+    last = lines.pop()
+    lines = [line + b"\n" for line in lines]
+    if last:
+        lines.append(last)
+    return lines
+
+
+# Lines of a stream of chunks logged at one of levels
+def level_lines(chunks, levels):
+    for block in join_lines(split_lines(chunks)):
+        for line, raw in zip(block_lines(block), FIELD_PATTERNS["level"].findall(block)):
+            if _field_name("level", raw) in levels:
+                yield line
+
+
+def parse_levels(value):
+    return {LEVEL_ALIASES.get(level, level) for level in value.lower().split(",") if level}
+
+
+def _counts(counter):
+    return [{"name": name or None, "count": count} for name, count in sorted(counter.items())]
+
+
+# Lines of one indexed field grouped by value: the value id of every line and
+# the ordered lines of every value id
+class FieldIndex:
+    def __init__(self, field, raw_values):
+        ids = {}
+        self.values = array("I", [ids.setdefault(raw, len(ids)) for raw in raw_values])
+        self.names = [_field_name(field, raw) for raw in ids]
+
+        counts = Counter(self.values)
+        order = sorted(range(len(self.values)), key=self.values.__getitem__)
+        self.postings = []
+        start = 0
+        for value_id in range(len(self.names)):
+            self.postings.append(array("I", order[start:start + counts[value_id]]))
+            start += counts[value_id]
+
+    def ids_of(self, accepted):
+        return {value_id for value_id, name in enumerate(self.names) if name in accepted}
+
+    def counts(self):
+        counter = Counter()
+        for value_id, name in enumerate(self.names):
+            counter[name] += len(self.postings[value_id])
+        return _counts(counter)
+
+
+# Compact index of a log kept in the log cache: the offset of every line in
+# the cached file and, for each indexed field, the value of every line and the
+# lines of every value. Lines are read back from the file for the page served.
+class LogIndex:
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.offsets = array("Q", itertools.accumulate(map(len, f), initial=0))
+            values = {field: [] for field in INDEXED_FIELDS}
+            if len(self):
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as content:
+                    values = _block_values(content, len(self))
+        self.fields = {field: FieldIndex(field, values[field]) for field in INDEXED_FIELDS}
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    # (values, accepted value ids) of every filter, a dict of field to a set of
+    # accepted values, most selective first, with the number of lines each
+    # selects. None when a filter selects nothing.
+    def _selections(self, filters):
+        selections = []
+        for field, accepted in filters.items():
+            index = self.fields[field]
+            value_ids = index.ids_of(accepted)
+            if not value_ids:
+                return None
+            selections.append((sum(len(index.postings[value_id]) for value_id in value_ids), index, value_ids))
+        selections.sort(key=lambda selection: selection[0])
+        return selections
+
+    # Numbers of the lines matching every selection, in order
+    def _candidates(self, selections):
+        _, index, value_ids = selections[0]
+        lines = heapq.merge(*(index.postings[value_id] for value_id in sorted(value_ids)))
+        others = [(other.values, other_ids) for _, other, other_ids in selections[1:]]
+        return [number for number in lines if all(values[number] in ids for values, ids in others)]
+
+    # Numbers of the lines containing needle, ignoring ASCII case, read in
+    # blocks of whole lines
+    def _scan(self, content, needle):
+        matching = []
+        first = 0
+        while first < len(self):
+            last = min(max(bisect.bisect_left(self.offsets, self.offsets[first] + SEARCH_BLOCK_SIZE), first + 1), len(self))
+            base = self.offsets[first]
+            block = content[base:self.offsets[last]].lower()
+
+            position = block.find(needle)
+            while position != -1:
+                number = bisect.bisect_right(self.offsets, base + position) - 1
+                matching.append(number)
+                position = block.find(needle, self.offsets[number + 1] - base)
+            first = last
+        return matching
+
+    # Numbers of the matching lines start..stop and the number of matching lines
+    def search(self, filters, q, start, stop):
+        selections = self._selections(filters)
+        if selections is None:
+            return [], 0
+        if not q:
+            if not selections:
+                return list(range(start, min(stop, len(self)))), len(self)
+            candidates = self._candidates(selections)
+            return candidates[start:stop], len(candidates)
+        if not len(self):
+            return [], 0
+
+        needle = q.encode("utf-8").lower()
+        with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as content:
+            if selections and selections[0][0] <= MAX_CANDIDATES_CHECKED:
+                candidates = self._candidates(selections)
+                matching = [number for number in candidates if needle in content[self.offsets[number]:self.offsets[number + 1]].lower()]
+            else:
+                checks = [(index.values, value_ids) for _, index, value_ids in selections]
+                matching = [number for number in self._scan(content, needle) if all(values[number] in ids for values, ids in checks)]
+        return matching[start:stop], len(matching)
+
+    def read_lines(self, numbers):
+        with open(self.path, "rb") as f:
+            lines = []
+            for number in numbers:
+                f.seek(self.offsets[number])
+                lines.append(f.read(self.offsets[number + 1] - self.offsets[number]))
+            return lines
+
+    def counts(self):
+        return {field: index.counts() for field, index in self.fields.items()}
+
+
+log_indexes = OrderedDict()
+log_indexes_lines = 0
+log_indexes_lock = threading.Lock()
+# key -> [lock, number of requests using it] of the indexes being built. An
+# entry lives as long as a request holds or waits for its lock, so every
+# request for the same log shares it until the index is stored.
+build_locks = {}
+
+
+def _cached_index(key):
+    with log_indexes_lock:
+        index = log_indexes.get(key)
+        if index is not None:
+            log_indexes.move_to_end(key)
+        return index
+
+def _store_index(key, index):
+    global log_indexes_lines
+
+    with log_indexes_lock:
+        if key in log_indexes:
+            return
+        log_indexes[key] = index
+        log_indexes_lines += len(index)
+        while log_indexes_lines > LOG_INDEX_MAX_LINES and len(log_indexes) > 1:
+            _, evicted = log_indexes.popitem(last=False)
+            log_indexes_lines -= len(evicted)
+
+def _drop_index(key):
+    global log_indexes_lines
+
+    with log_indexes_lock:
+        index = log_indexes.pop(key, None)
+        if index is not None:
+            log_indexes_lines -= len(index)
+
+
+def log_index_stats():
+    with log_indexes_lock:
+        return {"logs": len(log_indexes), "lines": log_indexes_lines, "maxLines": LOG_INDEX_MAX_LINES}
+
+
+# Path of the log in the log cache, downloading it into the cache first if
+# needed. None when the log cannot be cached, e.g. it is larger than the cache.
+def _cached_log(log_cache, log_object, etag):
+    path = log_cache.entry_path(log_object["bucket_name"], log_object["file_key"], etag)
+    if path is not None:
+        return path
+
+    chunks = download_file_from_minio(**log_object)
+    if chunks is None:
+        return None
+    try:
+        for _ in chunks:
+            pass
+    except Exception:
+        # Logged by the download, the log is searched while streamed instead
+        return None
+    return log_cache.entry_path(log_object["bucket_name"], log_object["file_key"], etag)
+
+
+# Index of a finished log, built from its copy in the log cache once per S3
+# ETag and kept in memory. None when the log cannot be indexed.
+def _get_index(log_object):
+    log_cache = get_log_cache()
+    if log_cache is None or not log_object["cacheable"]:
+        return None
+
+    s3 = get_s3_client(log_object["endpoint_url"], log_object["access_key"], log_object["secret_key"])
+    try:
+        with upstream_call("s3", "head", "objects"):
+            etag = s3.head_object(Bucket=log_object["bucket_name"], Key=log_object["file_key"])["ETag"]
+    except ClientError as e:
+        logger.error(f"Cannot read {log_object['file_key']} in bucket {log_object['bucket_name']}: {e}")
+        return None
+
+    key = (log_object["bucket_name"], log_object["file_key"], etag)
+    index = _cached_index(key)
+    if index is not None and os.path.exists(index.path):
+        return index
+
+    with log_indexes_lock:
+        entry = build_locks.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            index = _cached_index(key)
+            if index is not None and os.path.exists(index.path):
+                return index
+            _drop_index(key)
+
+            path = _cached_log(log_cache, log_object, etag)
+            if path is None:
+                return None
+            index = LogIndex(path)
+            logger.debug(f"Indexed {len(index)} lines of {log_object['file_key']}")
+            _store_index(key, index)
+            return index
+    except FileNotFoundError:
+        # Evicted from the log cache while being indexed
+        return None
+    finally:
+        with log_indexes_lock:
+            entry[1] -= 1
+            if not entry[1]:
+                del build_locks[key]
+
+
+# Search a log while streaming it, for logs that cannot be indexed
+def _stream_search(chunks, filters, q, start, stop):
+    needle = q.encode("utf-8").lower() if q else None
+    counts = {field: Counter() for field in INDEXED_FIELDS}
+    names = {field: {} for field in INDEXED_FIELDS}
+    numbers = []
+    lines = []
+    total = 0
+    number = 0
+
+    for block in join_lines(split_lines(chunks)):
+        lines_of_block = block_lines(block)
+        block_values = _block_values(block, len(lines_of_block))
+        for field, raw_values in block_values.items():
+            field_names = names[field]
+            for raw in raw_values:
+                if raw not in field_names:
+                    field_names[raw] = _field_name(field, raw)
+                counts[field][field_names[raw]] += 1
+
+        for position, line in enumerate(lines_of_block):
+            if all(names[field][block_values[field][position]] in accepted for field, accepted in filters.items()):
+                if needle is None or needle in line.lower():
+                    if start <= total < stop:
+                        numbers.append(number + position)
+                        lines.append(line)
+                    total += 1
+        number += len(lines_of_block)
+
+    return numbers, lines, total, {field: _counts(counter) for field, counter in counts.items()}
+
+
+def _item(number, line):
+    fields = parse_logfmt(line)
+    text = line.decode("utf-8", "replace").rstrip("\n")
+    return {
+        "line": number + 1,
+        "time": fields.pop("time", None),
+        "level": fields.pop("level", None),
+        "msg": fields.pop("msg", None if fields else text),
+        "fields": fields,
+    }
+
+
+def is_log_search(args):
+    return any(args.get(param) for param in SEARCH_PARAMS)
+
+
+# Read the structured search options from the request query parameters.
+# Raise ValueError on invalid parameters.
+def parse_search_options(args):
+    filters = {}
+    if args.get("level"):
+        filters["level"] = parse_levels(args.get("level"))
+    for field in ("namespace", "resource"):
+        if args.get(field):
+            filters[field] = set(args.get(field).split(","))
+
+    return {
+        "filters": filters,
+        "q": args.get("q") or None,
+        "page": positive_int(args, "page", 1),
+        "limit": min(positive_int(args, "limit", DEFAULT_LIMIT), MAX_LIMIT),
+    }
+
+
+# One page of the lines of a log matching the level, namespace and resource
+# filters and containing q, parsed into their logfmt fields, with the number of
+# lines per level, namespace and resource of the whole log. Finished logs are
+# answered from their index, others are searched while streamed.
+# None when the log cannot be read.
+def search_log(log_object, options):
+    filters, q = options["filters"], options["q"]
+    start = (options["page"] - 1) * options["limit"]
+    stop = start + options["limit"]
+
+    index = _get_index(log_object)
+    if index is not None:
+        try:
+            numbers, total = index.search(filters, q, start, stop)
+            lines = index.read_lines(numbers)
+        except FileNotFoundError:
+            # Evicted from the log cache since it was indexed
+            index = None
+    if index is not None:
+        counts = index.counts()
+        size = len(index)
+    else:
+        chunks = download_file_from_minio(**log_object)
+        if chunks is None:
+            return None
+        try:
+            numbers, lines, total, counts = _stream_search(chunks, filters, q, start, stop)
+        except Exception:
+            # Logged by the download. A partial count would look like a complete one.
+            return None
+        size = None
+
+    return {
+        "items": [_item(number, line) for number, line in zip(numbers, lines)],
+        "total": total,
+        "page": options["page"],
+        "limit": options["limit"],
+        "lines": size,
+        "indexed": index is not None,
+        "levels": counts["level"],
+        "namespaces": counts["namespace"],
+        "resources": counts["resource"],
+    }
@@ -0,0 +1,153 @@
+import zlib
+import time
+import logging
+from collections import deque
+
+from flask import Response
+
+from velero_ui.metrics import count_decompress_time
+
+logger = logging.getLogger(__name__)
+
+# Size of the chunks read from object storage and written to the client
+CHUNK_SIZE = 64 * 1024
+
+# Upper bound of the output of one decompression step, so a highly
+# compressed log never expands into a single huge buffer
+DECOMPRESSED_CHUNK_SIZE = 4 * CHUNK_SIZE
+
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+# Incrementally gunzip a stream of compressed chunks. Concatenated gzip
+# members are decompressed one after another like gzip does.
+# Raise EOFError when the stream ends within a member, i.e. it is truncated.
+def gunzip_stream(chunks):
+    decompressor = zlib.decompressobj(GZIP_WBITS)
+    # Whether the current member has received any input
+    started = False
+    for chunk in chunks:
+        while chunk:
+            started = True
+            start = time.perf_counter()
+            data = decompressor.decompress(chunk, DECOMPRESSED_CHUNK_SIZE)
+            count_decompress_time(time.perf_counter() - start)
+            if data:
+                yield data
+            if decompressor.eof:
+                chunk = decompressor.unused_data
+                decompressor = zlib.decompressobj(GZIP_WBITS)
+                started = False
+            else:
+                chunk = decompressor.unconsumed_tail
+
+    data = decompressor.flush()
+    if data:
+        yield data
+    if started and not decompressor.eof:
+        raise EOFError("Compressed stream ended before the end-of-stream marker was reached")
+
+
+# Keep only bytes offset..offset+limit of a stream of chunks
+def byte_window(chunks, offset, limit):
+    position = 0
+    end = offset + limit if limit else None
+
+    for chunk in chunks:
+        chunk_start = position
+        position += len(chunk)
+        if position <= offset:
+            continue
+
+        start = max(offset - chunk_start, 0)
+        stop = len(chunk) if end is None else min(end - chunk_start, len(chunk))
+        if stop > start:
+            yield chunk[start:stop]
+
+        if end is not None and position >= end:
+            return
+
+
+def split_lines(chunks):
+    pending = b""
+    for chunk in chunks:
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line + b"\n"
+
+    if pending:
+        yield pending
+
+
+# Group lines back into chunks of about CHUNK_SIZE bytes
+def join_lines(lines):
+    batch = []
+    size = 0
+    for line in lines:
+        batch.append(line)
+        size += len(line)
+        if size >= CHUNK_SIZE:
+            yield b"".join(batch)
+            batch = []
+            size = 0
+
+    if batch:
+        yield b"".join(batch)
+
+
+def tail_lines(lines, count):
+    yield from deque(lines, maxlen=count)
+
+
+# Apply the log query options to a stream of decompressed chunks. The byte
+# window is applied first, then grep, then tail. Memory stays bounded by the
+# chunk size, plus the kept lines when tail is used.
+def filter_log(chunks, tail=None, offset=0, limit=None, grep=None):
+    if offset or limit:
+        chunks = byte_window(chunks, offset, limit)
+
+    if grep is None and tail is None:
+        return chunks
+
+    lines = split_lines(chunks)
+    if grep is not None:
+        pattern = grep.encode("utf-8")
+        lines = (line for line in lines if pattern in line)
+    if tail is not None:
+        lines = tail_lines(lines, tail)
+
+    return join_lines(lines)
+
+
+def _int_option(args, param, minimum):
+    value = args.get(param)
+    if value is None or value == "":
+        return None
+    try:
+        number = int(value)
+    except ValueError:
+        raise ValueError(f"Query parameter '{param}' must be an integer")
+    if number < minimum:
+        raise ValueError(f"Query parameter '{param}' must be at least {minimum}")
+    return number
+
+
+# Read tail, offset, bytes and grep from the request query parameters. The
+# byte window is offset and bytes, limit being the page size of a log search.
+# Raise ValueError on invalid parameters.
+def parse_log_options(args):
+    return {
+        "tail": _int_option(args, "tail", 1),
+        "offset": _int_option(args, "offset", 0) or 0,
+        "limit": _int_option(args, "bytes", 1),
+        "grep": args.get("grep") or None,
+    }
+
+
+# Chunked plain text response streaming the filtered log
+def log_response(chunks, options):
+    response = Response(filter_log(chunks, **options), mimetype="text/plain")
+    # Ask reverse proxies such as ingress-nginx not to buffer the whole log
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
@@ -0,0 +1,148 @@
+import os
+import time
+import logging
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from flask import request, g, Response
+
+logger = logging.getLogger(__name__)
+
+# prometheus_client is optional, without it the instrumentation does nothing
+try:
+    import prometheus_client
+    from prometheus_client import Counter, Histogram, CollectorRegistry, generate_latest, multiprocess, CONTENT_TYPE_LATEST
+except ImportError:
+    prometheus_client = None
+
+METRICS_DISABLED = os.getenv("DISABLE_METRICS", "").lower() == "true" or prometheus_client is None
+
+# Set by gunicorn deployments so every worker writes its samples to a shared
+# directory and /metrics reports the sum of all workers
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+if not METRICS_DISABLED:
+    REQUEST_LATENCY = Histogram("velero_ui_http_request_duration_seconds", "Time to produce the response of a request, excluding streamed bodies",
+                                ["method", "route", "status"], buckets=LATENCY_BUCKETS)
+    UPSTREAM_LATENCY = Histogram("velero_ui_upstream_request_duration_seconds", "Duration of calls to the Kubernetes API server and object storage",
+                                 ["service", "verb", "resource"], buckets=LATENCY_BUCKETS)
+    UPSTREAM_ERRORS = Counter("velero_ui_upstream_errors_total", "Failed calls to the Kubernetes API server and object storage",
+                              ["service", "verb", "resource"])
+    S3_BYTES = Counter("velero_ui_s3_bytes_total", "Compressed bytes read from object storage")
+    DECOMPRESS_SECONDS = Counter("velero_ui_log_decompress_seconds_total", "Time spent decompressing logs")
+    CACHE_READS = Counter("velero_ui_cache_reads_total", "Reads of the in-process caches by outcome",
+                          ["cache", "result"])
+    COLLAPSED_CALLS = Counter("velero_ui_upstream_calls_collapsed_total", "Reads answered by an identical upstream call already in flight",
+                              ["verb", "resource"])
+    PASSWORD_CHECK_LATENCY = Histogram("velero_ui_password_check_duration_seconds", "Duration of password hash checks",
+                                       buckets=LATENCY_BUCKETS)
+
+
+# Time a call to an upstream service. Exceptions are counted as errors and
+# raised again.
+@contextmanager
+def upstream_call(service, verb, resource):
+    if METRICS_DISABLED:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        UPSTREAM_ERRORS.labels(service, verb, resource).inc()
+        raise
+    finally:
+        UPSTREAM_LATENCY.labels(service, verb, resource).observe(time.perf_counter() - start)
+
+
+# Verb and resource of a Kubernetes API request, e.g. ("list", "backups")
+def kube_call_labels(method, url, query_params=None):
+    parts = urlsplit(url)
+    segments = [segment for segment in parts.path.split("/") if segment]
+
+    # /api/<version>/... for the core group, /apis/<group>/<version>/... otherwise
+    path = segments[2:] if segments[:1] == ["api"] else segments[3:]
+    if len(path) > 2 and path[0] == "namespaces":
+        path = path[2:]
+    resource = path[0] if path else "unknown"
+    named = len(path) > 1
+
+    watching = "watch=true" in parts.query.lower() or any(key == "watch" and value for key, value in query_params or [])
+    if method == "GET":
+        verb = "watch" if watching else ("get" if named else "list")
+    else:
+        verb = {"POST": "create", "PUT": "replace", "PATCH": "patch", "DELETE": "delete"}.get(method, method.lower())
+    return verb, resource
+
+
+# Wrap the requests of a Kubernetes ApiClient with upstream_call
+def instrument_api_client(api_client):
+    if METRICS_DISABLED:
+        return api_client
+
+    rest_request = api_client.rest_client.request
+
+    def timed_request(method, url, *args, **kwargs):
+        verb, resource = kube_call_labels(method, url, kwargs.get("query_params"))
+        with upstream_call("kubernetes", verb, resource):
+            return rest_request(method, url, *args, **kwargs)
+
+    api_client.rest_client.request = timed_request
+    return api_client
+
+
+def count_s3_bytes(amount):
+    if not METRICS_DISABLED:
+        S3_BYTES.inc(amount)
+
+def count_decompress_time(seconds):
+    if not METRICS_DISABLED:
+        DECOMPRESS_SECONDS.inc(seconds)
+
+def count_cache_read(cache, result):
+    if not METRICS_DISABLED:
+        CACHE_READS.labels(cache, result).inc()
+
+def count_collapsed_call(verb, resource):
+    if not METRICS_DISABLED:
+        COLLAPSED_CALLS.labels(verb, resource).inc()
+
+def observe_password_check(seconds):
+    if not METRICS_DISABLED:
+        PASSWORD_CHECK_LATENCY.observe(seconds)
+
+
+def get_metrics():
+    if METRICS_DISABLED:
+        return {"message": "Metrics are disabled. Install prometheus-client and unset DISABLE_METRICS to enable them"}, 404
+
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+
+# Time every request per route and serve the samples at /metrics
+def init_metrics(app):
+    app.route('/metrics', methods=['GET'])(get_metrics)
+
+    if METRICS_DISABLED:
+        logger.info("Metrics are disabled")
+        return
+
+    @app.before_request
+    def start_timer():
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def observe_request(response):
+        start = g.pop("request_start", None)
+        if start is not None:
+            route = request.url_rule.rule if request.url_rule else "unmatched"
+            REQUEST_LATENCY.labels(request.method, route, str(response.status_code)).observe(time.perf_counter() - start)
+        return response
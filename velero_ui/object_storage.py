@@ -0,0 +1,193 @@
+import os
+import base64
+import hashlib
+import logging
+import threading
+import configparser
+from collections import OrderedDict
+
+import boto3
+from botocore.config import Config
+from kubernetes import client
+
+from velero_ui.kube_api import get_namespace, get_api_client, core_v1_api, apps_v1_api, REQUEST_TIMEOUT
+from velero_ui.cache import ResourceCache, register_cache, get_custom_object
+from velero_ui.executor import gather
+from velero_ui.singleflight import shared_call
+
+logger = logging.getLogger(__name__)
+
+# Connections kept open by each pooled S3 client
+S3_MAX_POOL_CONNECTIONS = int(os.getenv("S3_MAX_POOL_CONNECTIONS", "10"))
+
+# Number of S3 clients kept, one per endpoint and credentials
+S3_CLIENT_POOL_SIZE = 16
+
+VELERO_DEPLOYMENT = "velero"
+CLOUD_CREDENTIALS_VOLUME = "cloud-credentials"
+
+
+def parse_config_string(config_str):
+    config = configparser.ConfigParser()
+    config.read_string(config_str)
+
+    # Access the 'default' section values only
+    if 'default' in config:
+        credentials = {
+            'aws_access_key_id': config.get('default', 'aws_access_key_id'),
+            'aws_secret_access_key': config.get('default', 'aws_secret_access_key')
+        }
+        return credentials
+    else:
+        return None
+
+
+def _deployment_cache():
+    name = f"deployments/{VELERO_DEPLOYMENT}"
+
+    def list_call(**kwargs):
+        return apps_v1_api().list_namespaced_deployment(get_namespace(), field_selector=f"metadata.name={VELERO_DEPLOYMENT}", **kwargs)
+
+    return register_cache(name, lambda: ResourceCache(name, list_call))
+
+def _secret_cache(secret_name):
+    name = f"secrets/{secret_name}"
+
+    def list_call(**kwargs):
+        return core_v1_api().list_namespaced_secret(get_namespace(), field_selector=f"metadata.name={secret_name}", **kwargs)
+
+    return register_cache(name, lambda: ResourceCache(name, list_call))
+
+
+# The velero Deployment as a JSON dict, from its watch when available
+def read_velero_deployment():
+    cache = _deployment_cache()
+    if cache is not None and cache.is_fresh():
+        return cache.get(VELERO_DEPLOYMENT)
+
+    def read_call():
+        deployment = apps_v1_api().read_namespaced_deployment(VELERO_DEPLOYMENT, get_namespace(), _request_timeout=REQUEST_TIMEOUT)
+        return get_api_client().sanitize_for_serialization(deployment)
+
+    return shared_call("get", "deployments", read_call, name=VELERO_DEPLOYMENT)
+
+# A secret as a JSON dict, from its watch when available. None if not found.
+def read_secret(secret_name):
+    cache = _secret_cache(secret_name)
+    if cache is not None and cache.is_fresh():
+        return cache.get(secret_name)
+
+    def read_call():
+        try:
+            secret = core_v1_api().read_namespaced_secret(secret_name, get_namespace(), _request_timeout=REQUEST_TIMEOUT)
+        except client.exceptions.ApiException as e:
+            if e.status == 404:
+                return None
+            raise e
+        return get_api_client().sanitize_for_serialization(secret)
+
+    return shared_call("get", "secrets", read_call, name=secret_name)
+
+# Name of the secret mounted as cloud credentials in the velero Deployment
+def cloud_secret_name(deployment):
+    volumes = deployment["spec"]["template"]["spec"].get("volumes") or []
+
+    for volume in volumes:
+        # Check if the volume is of type 'secret'
+        if volume["name"] == CLOUD_CREDENTIALS_VOLUME and volume.get("secret"):
+            return volume["secret"]["secretName"]
+
+    logger.error(f"Fail to look for mountned secret with name cloud-credentials to velero deployment")
+    return ""
+
+
+def _parse_storage_location(location, secret):
+    spec = location["spec"]
+    name = location["metadata"]["name"]
+
+    if "s3Url" in spec.get("config", {}):
+        endpoint = spec["config"]["s3Url"]
+    else:
+        raise Exception(f"Only support S3 backup storage. Cannot find S3 URL in backup location {name}")
+
+    if "bucket" in spec["objectStorage"]:
+        bucket_name = spec["objectStorage"]["bucket"]
+    else:
+        raise Exception(f"Only support S3 backup storage. Cannot find bucket name object storage configuration of backup location {name}")
+
+    file_prefix = spec["objectStorage"].get("prefix", "")
+
+    if not secret:
+        raise Exception(f"Only support S3 backup storage. Cannot find S3 credential of backup location {name}")
+
+    secret_data = base64.b64decode(secret["data"]["cloud"]).decode('utf-8')
+    parsed = parse_config_string(secret_data)
+    if not parsed:
+        raise Exception(f"Cannot find default profile in S3 credential of backup location {name}")
+
+    return endpoint, bucket_name, file_prefix, parsed["aws_access_key_id"], parsed["aws_secret_access_key"]
+
+
+resolved_locations = {}
+resolved_locations_lock = threading.Lock()
+
+
+# Resolve a backup storage location into (endpoint, bucket, prefix, access key,
+# secret key). The result is reused until the location, the velero Deployment
+# or the cloud credentials secret changes. Raise an Exception when the location
+# cannot be used.
+def resolve_storage_location(location_name):
+    location, deployment = gather(lambda: get_custom_object("backupstoragelocations", location_name), read_velero_deployment)
+    if location is None:
+        raise Exception(f"Backup storage location {location_name} not found")
+    if deployment is None:
+        raise Exception(f"Deployment {VELERO_DEPLOYMENT} not found")
+
+    secret_name = cloud_secret_name(deployment)
+    secret = read_secret(secret_name) if secret_name else None
+
+    version = (
+        location["metadata"].get("resourceVersion"),
+        deployment["metadata"].get("resourceVersion"),
+        secret["metadata"].get("resourceVersion") if secret else None,
+    )
+
+    with resolved_locations_lock:
+        entry = resolved_locations.get(location_name)
+    if entry is not None and entry[0] == version:
+        return entry[1]
+
+    resolved = _parse_storage_location(location, secret)
+    logger.debug(f"Resolved backup storage location {location_name} to {resolved[0]}")
+
+    with resolved_locations_lock:
+        resolved_locations[location_name] = (version, resolved)
+    return resolved
+
+
+s3_clients = OrderedDict()
+s3_clients_lock = threading.Lock()
+
+
+# Shared S3 client of an endpoint and credentials. boto3 clients are thread
+# safe and keep their connection pool between requests.
+def get_s3_client(endpoint_url, access_key, secret_key):
+    key = (endpoint_url, access_key, hashlib.sha256(secret_key.encode("utf-8")).hexdigest())
+
+    with s3_clients_lock:
+        s3 = s3_clients.get(key)
+        if s3 is not None:
+            s3_clients.move_to_end(key)
+            return s3
+
+        # Initialize the S3 client with custom endpoint URL
+        s3 = boto3.client('s3',
+                          endpoint_url=endpoint_url,
+                          aws_access_key_id=access_key,
+                          aws_secret_access_key=secret_key,
+                          config=Config(max_pool_connections=S3_MAX_POOL_CONNECTIONS))
+        s3_clients[key] = s3
+        while len(s3_clients) > S3_CLIENT_POOL_SIZE:
+            s3_clients.popitem(last=False)
+
+    return s3
@@ -0,0 +1,75 @@
+# Compact summaries of Velero custom resources, holding only the fields the
+# UI tables need. Full objects stay available through the describe endpoints.
+
+def summarize_backup(backup):
+    metadata = backup.get("metadata", {})
+    spec = backup.get("spec", {})
+    status = backup.get("status", {})
+
+    return {
+        "name": metadata.get("name"),
+        "phase": status.get("phase") or "New",
+        "errors": status.get("errors", 0),
+        "warnings": status.get("warnings", 0),
+        "created": metadata.get("creationTimestamp"),
+        "expiration": status.get("expiration"),
+        "storageLocation": spec.get("storageLocation"),
+        "selector": spec.get("labelSelector"),
+    }
+
+def summarize_restore(restore):
+    metadata = restore.get("metadata", {})
+    spec = restore.get("spec", {})
+    status = restore.get("status", {})
+
+    return {
+        "name": metadata.get("name"),
+        "backup": spec.get("backupName") or spec.get("scheduleName"),
+        "phase": status.get("phase") or "New",
+        "errors": status.get("errors", 0),
+        "warnings": status.get("warnings", 0),
+        "started": status.get("startTimestamp"),
+        "completed": status.get("completionTimestamp"),
+        "created": metadata.get("creationTimestamp"),
+        "selector": spec.get("includedNamespaces"),
+    }
+
+def summarize_schedule(schedule):
+    metadata = schedule.get("metadata", {})
+    spec = schedule.get("spec", {})
+    template = spec.get("template", {})
+    status = schedule.get("status", {})
+
+    return {
+        "name": metadata.get("name"),
+        "phase": status.get("phase") or "New",
+        "created": metadata.get("creationTimestamp"),
+        "schedule": spec.get("schedule"),
+        "ttl": template.get("ttl"),
+        "lastBackup": status.get("lastBackup"),
+        "selector": template.get("labelSelector"),
+        "paused": spec.get("paused", False),
+    }
+
+def summarize_storage(storage):
+    metadata = storage.get("metadata", {})
+    spec = storage.get("spec", {})
+    status = storage.get("status", {})
+
+    return {
+        "name": metadata.get("name"),
+        "phase": status.get("phase") or "New",
+        "created": metadata.get("creationTimestamp"),
+        "lastValidationTime": status.get("lastValidationTime"),
+        "backupSyncPeriod": spec.get("backupSyncPeriod"),
+        "default": spec.get("default", False),
+        "provider": spec.get("provider"),
+        "config": spec.get("config"),
+    }
+
+PROJECTIONS = {
+    "backups": summarize_backup,
+    "restores": summarize_restore,
+    "schedules": summarize_schedule,
+    "backupstoragelocations": summarize_storage,
+}
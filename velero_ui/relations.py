@@ -0,0 +1,212 @@
+import logging
+import threading
+from abc import ABC, abstractmethod
+
+from velero_ui.cache import get_cache, list_custom_objects, get_custom_objects
+from velero_ui.projection import PROJECTIONS
+from velero_ui.timestamps import parse_time
+
+logger = logging.getLogger(__name__)
+
+SCHEDULE_LABEL = "velero.io/schedule-name"
+
+
+# State derived from a Velero collection, kept up to date from the changes
+# recorded by the collection cache instead of going over the whole collection
+# for every request. Subclasses implement _reset, _add and _remove, which are
+# called with the lock held.
+class SyncedIndex(ABC):
+    def __init__(self, plural):
+        self.plural = plural
+        self.lock = threading.Lock()
+        self.resource_version = None
+        # resourceVersion of the direct list the index was last rebuilt from
+        self.listed_version = None
+        self._reset()
+
+    # Empty the index
+    @abstractmethod
+    def _reset(self):
+        pass
+
+    # Account for obj, which is not in the index
+    @abstractmethod
+    def _add(self, obj):
+        pass
+
+    # Forget the object named name, if it is in the index
+    @abstractmethod
+    def _remove(self, name):
+        pass
+
+    def _rebuild(self, items):
+        self._reset()
+        for obj in items:
+            self._add(obj)
+
+    def _apply(self, event_type, obj):
+        self._remove(obj["metadata"]["name"])
+        if event_type != "DELETED":
+            self._add(obj)
+
+    # Bring the index up to date and return the resourceVersion it reflects,
+    # None when the cache is not available and the index was rebuilt from a
+    # direct list
+    def sync(self):
+        cache = get_cache(self.plural)
+
+        if cache is None or not cache.is_fresh():
+            # Listed without the lock, so requests do not queue behind a full
+            # list one after another. Concurrent lists share one call, and a
+            # list at the resourceVersion of the last rebuild is not applied again.
+            listed = list_custom_objects(self.plural)
+            listed_version = listed.get("metadata", {}).get("resourceVersion")
+            with self.lock:
+                if listed_version is None or listed_version != self.listed_version:
+                    self._rebuild(listed.get("items", []))
+                    self.listed_version = listed_version
+                self.resource_version = None
+            return None
+
+        with self.lock:
+            self.listed_version = None
+            if self.resource_version is not None:
+                events = cache.events_since(self.resource_version, 0)
+                if events is not None:
+                    for version, event_type, obj in events:
+                        self._apply(event_type, obj)
+                        self.resource_version = version
+                    return self.resource_version
+
+            snapshot = cache.list()
+            self._rebuild(snapshot["items"])
+            self.resource_version = snapshot["metadata"]["resourceVersion"]
+            logger.debug(f"Index of {self.plural} rebuilt at resourceVersion {self.resource_version}")
+            return self.resource_version
+
+
+# Names of the objects of a collection grouped by the value key_func returns
+# for each of them, e.g. backups by schedule
+class RelationIndex(SyncedIndex):
+    def __init__(self, plural, key_func):
+        self.key_func = key_func
+        super().__init__(plural)
+
+    def _reset(self):
+        self.keys = {}
+        self.names = {}
+
+    def _add(self, obj):
+        key = self.key_func(obj)
+        if not key:
+            return
+        name = obj["metadata"]["name"]
+        self.keys[name] = key
+        self.names.setdefault(key, set()).add(name)
+
+    def _remove(self, name):
+        key = self.keys.pop(name, None)
+        if key is None:
+            return
+        names = self.names[key]
+        names.discard(name)
+        if not names:
+            del self.names[key]
+
+    # Names of the objects related to key
+    def related(self, key):
+        self.sync()
+        with self.lock:
+            return set(self.names.get(key, ()))
+
+
+def _backup_schedule(backup):
+    return (backup["metadata"].get("labels") or {}).get(SCHEDULE_LABEL)
+
+def _restore_backup(restore):
+    return restore.get("spec", {}).get("backupName")
+
+
+# Backups by the schedule that created them
+backups_by_schedule = RelationIndex("backups", _backup_schedule)
+
+# Restores by the backup they restore
+restores_by_backup = RelationIndex("restores", _restore_backup)
+
+
+# Latest successful backup of each schedule
+class LatestSuccessIndex(SyncedIndex):
+    def __init__(self):
+        super().__init__("backups")
+
+    def _reset(self):
+        # name -> (schedule, completed) of the completed backups of schedules
+        self.completed = {}
+        # schedule -> names of its completed backups
+        self.schedule_backups = {}
+        # schedule -> (completed, backup name)
+        self.latest = {}
+
+    def _track(self, name, schedule, completed):
+        current = self.latest.get(schedule)
+        if current is None or completed > current[0]:
+            self.latest[schedule] = (completed, name)
+
+    def _add(self, backup):
+        status = backup.get("status", {})
+        schedule = _backup_schedule(backup)
+        completed = parse_time(status.get("completionTimestamp"))
+        if status.get("phase") != "Completed" or not schedule or completed is None:
+            return
+
+        name = backup["metadata"]["name"]
+        self.completed[name] = (schedule, completed)
+        self.schedule_backups.setdefault(schedule, set()).add(name)
+        self._track(name, schedule, completed)
+
+    def _remove(self, name):
+        entry = self.completed.pop(name, None)
+        if entry is None:
+            return
+
+        schedule = entry[0]
+        names = self.schedule_backups[schedule]
+        names.discard(name)
+        if not names:
+            del self.schedule_backups[schedule]
+
+        if self.latest[schedule][1] == name:
+            # The latest success of the schedule is gone, look for the previous one
+            del self.latest[schedule]
+            for other in names:
+                self._track(other, schedule, self.completed[other][1])
+
+    # Latest successful backup of a schedule, None if it has none
+    def latest_success(self, schedule):
+        self.sync()
+        with self.lock:
+            entry = self.latest.get(schedule)
+        return _success(entry) if entry else None
+
+    # Latest successful backup of every schedule that has one
+    def latest_successes(self):
+        self.sync()
+        with self.lock:
+            return {schedule: _success(entry) for schedule, entry in self.latest.items()}
+
+
+def _success(entry):
+    completed, name = entry
+    return {"name": name, "completed": completed.isoformat().replace("+00:00", "Z")}
+
+
+# Latest successful backup by schedule
+latest_successes = LatestSuccessIndex()
+
+
+# Summaries of the objects of an index related to key, newest first
+def related_summaries(index, key):
+    objects = get_custom_objects(index.plural, sorted(index.related(key)))
+    summaries = [PROJECTIONS[index.plural](obj) for obj in objects.values()]
+    summaries.sort(key=lambda summary: summary["created"] or "", reverse=True)
+    return summaries
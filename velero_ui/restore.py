@@ -1,11 +1,20 @@
-import json
 import velero_ui.velero_api as velero_api
+from velero_ui.list_query import list_response
+from velero_ui.events import events_response
+from velero_ui.bulk import bulk_delete
+from velero_ui.log_stream import parse_log_options, log_response
+from velero_ui.log_index import is_log_search, parse_search_options, search_log
+from velero_ui.log_batch import log_batch_response
+from velero_ui.describe import describe_details_response, is_batch_describe
+from velero_ui.relations import latest_successes
 
 from flask import request, jsonify
 
 def get_restore_list():
-    restores = json.dumps(velero_api.get_restore_list())
-    return jsonify(restores)
+    try:
+        return list_response("restores")
+    except ValueError as e:
+        return {"message": str(e)}, 400
 
 def create_restore():
     data = request.get_json()
@@ -19,12 +28,17 @@ def create_restore():
         resource_type = "backup"
         resource_name = backup_name
     elif schedule_name:
+        # Restore the latest successful backup of the schedule
+        latest = latest_successes.latest_success(schedule_name)
+        if latest is None:
+            return {"message": f"Schedule {schedule_name} has no successful backup to restore from"}, 404
+        backup_name = latest["name"]
         resource_type = "schedule"
-        resource_name = schedule_name
+        resource_name = f"{schedule_name} (backup {backup_name})"
     else:
         return jsonify({"error": "Invalid request. Please provide either backupName or scheduleName."})
 
-    outcome = velero_api.create_restore(resource_name)
+    outcome = velero_api.create_restore(backup_name)
     status = outcome["status"]
     message = outcome["message"]
 
@@ -52,15 +66,75 @@ def get_restore_logs():
     if not restore_name:
         return {"message": "Restore name is required as a query parameter"}
 
+    try:
+        options = parse_log_options(request.args)
+        search = parse_search_options(request.args) if is_log_search(request.args) else None
+    except ValueError as e:
+        return {"message": str(e)}, 400
+
+    # Structured search: a page of the parsed lines matching the filters
+    if search is not None:
+        log_object = velero_api.find_restore_log(restore_name)
+        if isinstance(log_object, str):
+            return {"message": log_object}
+        result = search_log(log_object, search)
+        if result is None:
+            return {"message": f"Cannot retrieve logs of restore {restore_name}"}
+        return result
+
+    # Either a message explaining why there is no log, or the log content
     output = velero_api.get_restore_log(restore_name)
+    if output is None:
+        return {"message": f"Cannot retrieve logs of restore {restore_name}"}
+    if isinstance(output, str):
+        return {"message": output}
 
-    return {"logs": output}
+    return log_response(output, options)
+
+# Function to stream the logs of several restores at once, by name or by selector
+def get_restore_logs_batch():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return {"message": "Request body must be a JSON object"}, 400
+
+    try:
+        return log_batch_response("restores", data)
+    except ValueError as e:
+        return {"message": str(e)}, 400
 
 def describe_restore():
-    restore_name = request.args.get("name")
-    if not restore_name:
+    restore_names = [name for name in request.args.getlist("name") if name]
+    if not restore_names:
         return {"message": "Restore name is required as a query parameter"}
 
-    output = velero_api.get_restore_describe(restore_name)
+    # details=true answers structured descriptions with the progress of the
+    # file system volume restores
+    if request.args.get("details", "").lower() == "true":
+        return describe_details_response("restores", restore_names, is_batch_describe(request.args))
+
+    # Batch form name=a&name=b... or batch=true answers the descriptions of
+    # all found restores
+    if is_batch_describe(request.args):
+        try:
+            return {"items": velero_api.get_describes("restores", restore_names)}
+        except ValueError as e:
+            return {"message": str(e)}, 400
+
+    output = velero_api.get_restore_describe(restore_names[0])
 
     return {"logs": output}
+
+# Function to stream changes of restores as Server-Sent Events
+def get_restore_events():
+    return events_response("restores")
+
+# Function for deleting several restores at once, by name or by selector
+def bulk_delete_restores():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return {"message": "Request body must be a JSON object"}, 400
+
+    try:
+        return bulk_delete("restores", data)
+    except ValueError as e:
+        return {"message": str(e)}, 400
@@ -1,21 +1,33 @@
-from flask import request, session, redirect, url_for, render_template, send_from_directory
+from flask import request, session, redirect, url_for, render_template
 
 
 # User related imports
-from velero_ui.user import user_list_get, user_list_post, user_list_delete, change_password_post, check_password
+from velero_ui.user import user_list_get, user_list_post, user_list_delete, change_password_post, check_password, TooManyAttempts
 
 # Backup related imports
-from velero_ui.backup import get_backup_list, create_backup, delete_backup, get_backup_logs, describe_backup
+from velero_ui.backup import get_backup_list, create_backup, delete_backup, get_backup_logs, describe_backup, get_backup_events, bulk_delete_backups, get_backup_restores, get_backup_contents, get_backup_logs_batch
 
 # Restore related imports
-from velero_ui.restore import get_restore_list, create_restore, delete_restore, get_restore_logs, describe_restore
+from velero_ui.restore import get_restore_list, create_restore, delete_restore, get_restore_logs, describe_restore, get_restore_events, bulk_delete_restores, get_restore_logs_batch
 
 # Schedule related imports
-from velero_ui.schedule import get_schedules, create_schedule, delete_schedule, describe_schedule
+from velero_ui.schedule import get_schedules, create_schedule, delete_schedule, describe_schedule, get_schedule_events, bulk_delete_schedules, get_schedule_backups
 
 # Storage related imports
 from velero_ui.storage import get_storages
 
+# Dashboard related imports
+from velero_ui.dashboard import get_dashboard_summary
+
+# History related imports
+from velero_ui.history import get_success_rate, get_duration_percentiles, get_failures
+
+# Statistics related imports
+from velero_ui.stats import get_stats
+
+# Health related imports
+from velero_ui.health import get_healthz, get_readyz
+
 
 def configure_routes(app, api, api_version, use_auth):
     @app.before_request
@@ -24,9 +36,20 @@ def configure_routes(app, api, api_version, use_auth):
             return
         if request.path == "/login":
             return
+        # Scraped by Prometheus, which has no session
+        if request.path == "/metrics":
+            return
+        # Probed by the kubelet, which has no session either
+        if request.path in ("/healthz", "/readyz"):
+            return
         if use_auth and "username" not in session:
             return redirect(url_for("login"))
 
+    # The navbar is rendered within every page
+    @app.context_processor
+    def inject_app_version():
+        return {"app_version": api_version}
+
     @app.route("/")
     def serve_index():
         return render_template("index.html", use_auth=use_auth)
@@ -61,7 +84,11 @@ def configure_routes(app, api, api_version, use_auth):
             data = request.get_json()
             username = data.get("username")
             password = data.get("password")
-            if check_password(username, password):
+            try:
+                valid = check_password(username, password)
+            except TooManyAttempts as e:
+                return {"success": False, "message": str(e)}, 429, {"Retry-After": str(e.retry_after)}
+            if valid:
                 session["username"] = username
                 return {"success": True}, 200
             else:
@@ -74,16 +101,6 @@ def configure_routes(app, api, api_version, use_auth):
         session.pop("username", None)
         return redirect(url_for("login"))
 
-    @app.route("/static/<path:path>")
-    def serve_static(path):
-        if path.endswith(".js"):
-            mimetype = "application/javascript"
-        elif path.endswith(".css"):
-            mimetype = "text/css"
-        else:
-            mimetype = None
-        return send_from_directory(app.static_folder, path, mimetype=mimetype)
-
     @app.route("/templates/<path:template_name>")
     def serve_templates(template_name):
         return render_template(template_name)
@@ -98,22 +115,48 @@ def configure_routes(app, api, api_version, use_auth):
     app.route('/backups', methods=['GET'])(get_backup_list)
     app.route('/backups', methods=['POST'])(create_backup)
     app.route('/backups', methods=['DELETE'])(delete_backup)
+    app.route('/backups/bulk-delete', methods=['POST'])(bulk_delete_backups)
     app.route('/backups/logs', methods=['GET'])(get_backup_logs)
+    app.route('/backups/logs/batch', methods=['POST'])(get_backup_logs_batch)
     app.route('/backups/describe', methods=['GET'])(describe_backup)
+    app.route('/backups/events', methods=['GET'])(get_backup_events)
+    app.route('/backups/<name>/restores', methods=['GET'])(get_backup_restores)
+    app.route('/backups/<name>/contents', methods=['GET'])(get_backup_contents)
 
     # Restore routes
     app.route('/restores', methods=['GET'])(get_restore_list)
     app.route('/restores', methods=['POST'])(create_restore)
     app.route('/restores', methods=['DELETE'])(delete_restore)
+    app.route('/restores/bulk-delete', methods=['POST'])(bulk_delete_restores)
     app.route('/restores/logs', methods=['GET'])(get_restore_logs)
+    app.route('/restores/logs/batch', methods=['POST'])(get_restore_logs_batch)
     app.route('/restores/describe', methods=['GET'])(describe_restore)
+    app.route('/restores/events', methods=['GET'])(get_restore_events)
 
     # Schedule routes
     app.route('/schedules', methods=['GET'])(get_schedules)
     app.route('/schedules', methods=['POST'])(create_schedule)
     app.route('/schedules', methods=['DELETE'])(delete_schedule)
+    app.route('/schedules/bulk-delete', methods=['POST'])(bulk_delete_schedules)
     app.route('/schedules/describe', methods=['GET'])(describe_schedule)
+    app.route('/schedules/events', methods=['GET'])(get_schedule_events)
+    app.route('/schedules/<name>/backups', methods=['GET'])(get_schedule_backups)
 
     # Storage routes
     app.route('/storages', methods=['GET'])(get_storages)
 
+    # Dashboard routes
+    app.route('/dashboard/summary', methods=['GET'])(get_dashboard_summary)
+
+    # History routes
+    app.route('/history/success-rate', methods=['GET'])(get_success_rate)
+    app.route('/history/durations', methods=['GET'])(get_duration_percentiles)
+    app.route('/history/failures', methods=['GET'])(get_failures)
+
+    # Statistics routes
+    app.route('/stats', methods=['GET'])(get_stats)
+
+    # Health routes
+    app.route('/healthz', methods=['GET'])(get_healthz)
+    app.route('/readyz', methods=['GET'])(get_readyz)
+
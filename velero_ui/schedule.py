@@ -1,15 +1,22 @@
-import json
 import velero_ui.velero_api as velero_api
+from velero_ui.list_query import list_response
+from velero_ui.events import events_response
+from velero_ui.bulk import bulk_delete
+from velero_ui.relations import backups_by_schedule, latest_successes, related_summaries
+from velero_ui.describe import is_batch_describe
+from velero_ui.executor import gather
 import logging
 
-from flask import request, jsonify
+from flask import request
 
 logger = logging.getLogger(__name__)
 
 # ScheduleList related functions
 def get_schedules():
-    schedules = json.dumps(velero_api.get_schedule_list())
-    return jsonify(schedules)
+    try:
+        return list_response("schedules")
+    except ValueError as e:
+        return {"message": str(e)}, 400
 
 def create_schedule():
     try: 
@@ -77,10 +84,38 @@ def delete_schedule():
 
 # DescribeSchedule related function
 def describe_schedule():
-    schedule_name = request.args.get("name")
-    if not schedule_name:
+    schedule_names = [name for name in request.args.getlist("name") if name]
+    if not schedule_names:
         return {"message": "Schedule name is required as a query parameter"}
 
-    output = velero_api.get_schedule_describe(schedule_name)
+    # Batch form name=a&name=b... or batch=true answers the descriptions of
+    # all found schedules
+    if is_batch_describe(request.args):
+        try:
+            return {"items": velero_api.get_describes("schedules", schedule_names)}
+        except ValueError as e:
+            return {"message": str(e)}, 400
+
+    output = velero_api.get_schedule_describe(schedule_names[0])
 
     return {"logs": output}
+
+# Function to stream changes of schedules as Server-Sent Events
+def get_schedule_events():
+    return events_response("schedules")
+
+# Function for deleting several schedules at once, by name or by selector
+def bulk_delete_schedules():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return {"message": "Request body must be a JSON object"}, 400
+
+    try:
+        return bulk_delete("schedules", data)
+    except ValueError as e:
+        return {"message": str(e)}, 400
+
+# Backups created by a schedule, newest first, with its latest successful backup
+def get_schedule_backups(name):
+    items, latest = gather(lambda: related_summaries(backups_by_schedule, name), lambda: latest_successes.latest_success(name))
+    return {"schedule": name, "items": items, "total": len(items), "latestSuccessful": latest}
@@ -0,0 +1,80 @@
+import os
+import logging
+import threading
+
+from velero_ui.metrics import count_collapsed_call
+
+logger = logging.getLogger(__name__)
+
+COALESCING_DISABLED = os.getenv("DISABLE_COALESCING", "").lower() == "true"
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+# Concurrent identical reads share one upstream call. The first caller of a
+# key runs the call, callers arriving while it is in flight wait for it and
+# get the same result, or the same exception. Nothing is kept once the call
+# returns, so a later read always reaches the API server.
+# Results are shared between callers and must not be modified.
+class SingleFlight:
+    def __init__(self):
+        self.calls = {}
+        self.lock = threading.Lock()
+        self.collapsed = 0
+
+    def do(self, key, call):
+        with self.lock:
+            flight = self.calls.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Call()
+                self.calls[key] = flight
+            else:
+                flight.waiters += 1
+                self.collapsed += 1
+
+        if not leader:
+            count_collapsed_call(key[0], key[1])
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = call()
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            flight.done.set()
+            if flight.waiters:
+                logger.debug(f"Collapsed {flight.waiters} calls into {key}")
+
+    def stats(self):
+        with self.lock:
+            return {"inFlight": len(self.calls), "collapsed": self.collapsed}
+
+
+flights = SingleFlight()
+
+
+# Run call, or wait for the identical call already in flight in this process.
+# verb and resource label the collapsed calls metric, name and selector tell
+# reads of the same resource apart.
+def shared_call(verb, resource, call, name=None, selector=None):
+    if COALESCING_DISABLED:
+        return call()
+    return flights.do((verb, resource, name, selector), call)
+
+
+def coalescing_stats():
+    return {**flights.stats(), "disabled": COALESCING_DISABLED}
@@ -1,8 +1,15 @@
-import { createButton, displayDataInModal, hideSpinnerAndShowData } from "./utils.js";
+import { createButton, displayDataInModal, hideSpinnerAndShowData, fetchLogs, debounce, subscribeChanges, isLive, replaceRow, rowName, displayName } from "./utils.js";
 
 let currentPage = 1;
 const itemsPerPage = 10;
 
+// Descriptions of the backups of the current page, fetched in one request
+let prefetchedDescribes = {};
+
+// Live updates of the backups, see subscribeChanges
+let backupChanges = null;
+const refreshBackups = debounce(() => listBackups(), 500);
+
 function initBackupPage() {
   listBackups();
   document.getElementById("deleteSelectedBtn").addEventListener("click", deleteSelectedBackups);
@@ -21,15 +28,42 @@ async function deleteSelectedBackups() {
   let deletedBackups = [];
   let failedBackups = [];
 
-  for (const checkbox of selectedBackups) {
-    const backupName = checkbox.getAttribute('data-backup-name');
-    const response = await fetch(`backups?name=${backupName}`, { method: 'DELETE' });
+  if (selectedBackups.length > 0) {
+    // One request for all selected backups, the server deletes them concurrently
+    const rows = {};
+    for (const checkbox of selectedBackups) {
+      rows[checkbox.getAttribute('data-backup-name')] = checkbox.closest('tr');
+    }
+
+    try {
+      const response = await fetch('backups/bulk-delete', {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({ names: Object.keys(rows) }),
+      });
+      if (!response.ok) {
+        const data = await response.json();
+        throw new Error(data.message || `${response.status} ${response.statusText}`);
+      }
 
-    if (response.ok) {
-      checkbox.closest('tr').remove();
-      deletedBackups.push(backupName);
-    } else {
-      failedBackups.push(backupName);
+      // NDJSON: one result per object, then a summary
+      const results = (await response.text()).split('\n').filter((line) => line).map((line) => JSON.parse(line));
+      for (const result of results) {
+        if (result.done) {
+          continue;
+        }
+        if (result.status) {
+          rows[result.name].remove();
+          deletedBackups.push(result.name);
+        } else {
+          failedBackups.push(result.name);
+        }
+      }
+    } catch (error) {
+      console.error("Error deleting backups:", error);
+      failedBackups.push(...Object.keys(rows));
     }
   }
 
@@ -44,111 +78,111 @@ async function deleteSelectedBackups() {
   }
 
   // Refresh the backup list to reflect the deleted backups
-  listBackups();
+  if (!isLive(backupChanges)) {
+    listBackups();
+  }
 }
 
 
-function fetchData() {
-  fetch('backups')
-    .then((response) => response.json())
-    .then((data) => {
-      const backupList = parseBackupData(JSON.parse(data));
-      displayBackupData(backupList);
-    });
-}
-
-function displayBackupData(backupData) {
-  const tableBody = document.getElementById("backupTableBody");
-  tableBody.innerHTML = "";
+function addBackupRow(tableBody, backup, index = -1) {
+  const newRow = tableBody.insertRow(index);
+  newRow.setAttribute("data-name", rowName(backup));
+
+  const selectCell = newRow.insertCell();
+  const selectCheckbox = document.createElement("input");
+  selectCheckbox.type = "checkbox";
+  selectCheckbox.classList.add("backup-select-checkbox");
+  selectCheckbox.setAttribute('data-backup-name', backup.name);
+  selectCell.appendChild(selectCheckbox);
+
+  newRow.insertCell().innerText = displayName(backup);
+  newRow.insertCell().innerText = backup.status;
+  newRow.insertCell().innerText = backup.errors;
+  newRow.insertCell().innerText = backup.warnings;
+  newRow.insertCell().innerText = backup.created === '<nil>' ? '<nil>' : new Date(backup.created).toLocaleString();
+  newRow.insertCell().innerText = backup.expiration === 'n/a' ? 'n/a' : new Date(backup.expiration).toLocaleString();
+  newRow.insertCell().innerText = backup.storageLocation;
+  newRow.insertCell().innerText = backup.selector;
+
+  const actionsCell = newRow.insertCell();
+  if (backup.readOnly) {
+    selectCheckbox.disabled = true;
+    actionsCell.innerText = `Managed in ${backup.cluster}`;
+    return newRow;
+  }
 
-  const startIndex = (currentPage - 1) * itemsPerPage;
-  const endIndex = startIndex + itemsPerPage;
-  const currentPageData = backupData.slice(startIndex, endIndex);
-
-  currentPageData.forEach((backup) => {
-    const newRow = tableBody.insertRow();
-
-    const selectCell = newRow.insertCell();
-    const selectCheckbox = document.createElement("input");
-    selectCheckbox.type = "checkbox";
-    selectCheckbox.classList.add("backup-select-checkbox");
-    selectCheckbox.setAttribute('data-backup-name', backup.name);
-    selectCell.appendChild(selectCheckbox);
-
-    newRow.insertCell().innerText = backup.name;
-    newRow.insertCell().innerText = backup.status;
-    newRow.insertCell().innerText = backup.errors;
-    newRow.insertCell().innerText = backup.warnings;
-    newRow.insertCell().innerText = backup.created === '<nil>' ? '<nil>' : new Date(backup.created).toLocaleString();
-    newRow.insertCell().innerText = backup.expiration === 'n/a' ? 'n/a' : new Date(backup.expiration).toLocaleString();
-    newRow.insertCell().innerText = backup.storageLocation;
-    newRow.insertCell().innerText = backup.selector;
-
-    const actionsCell = newRow.insertCell();
-
-    const logsButton = createButton("Logs", () => {
-      displayDataInModal(null, "backupLogsModal", async () => {
-        try {
-          const response = await fetch(`backups/logs?name=${backup.name}`);
-          if (!response.ok) {
-            throw new Error(`${response.status} ${response.statusText}`);
-          }
-          const data = await response.json();
-          if (data.message) {
-            alert(data.message);
-          } else {
-            displayDataInModal(data, "backupLogsModal");
-          }
-        } catch (error) {
-          console.error("Error fetching backup logs:", error);
-          alert(`Error fetching backup logs: ${error.message}`);
-        } finally {
-          hideSpinnerAndShowData("backupLogsModal");
+  const logsButton = createButton("Logs", () => {
+    displayDataInModal(null, "backupLogsModal", async () => {
+      try {
+        const data = await fetchLogs(`backups/logs?name=${backup.name}`);
+        if (data.message) {
+          alert(data.message);
+        } else {
+          displayDataInModal(data, "backupLogsModal");
         }
-      });
-      $("#backupLogsModal").modal("show");
+      } catch (error) {
+        console.error("Error fetching backup logs:", error);
+        alert(`Error fetching backup logs: ${error.message}`);
+      } finally {
+        hideSpinnerAndShowData("backupLogsModal");
+      }
     });
-    actionsCell.appendChild(logsButton);
-
-    const describeButton = createButton("Describe", () => {
-      displayDataInModal(null, "backupDescribeModal", async () => {
-        try {
-          const response = await fetch(`backups/describe?name=${backup.name}`);
-          if (!response.ok) {
-            throw new Error(`${response.status} ${response.statusText}`);
-          }
-          const data = await response.json();
-          if (data.message) {
-            alert(data.message);
-          } else {
-            displayDataInModal(data, "backupDescribeModal");
-          }
-        } catch (error) {
-          console.error("Error fetching backup describe:", error);
-          alert(`Error fetching backup describe: ${error.message}`);
-        } finally {
-          hideSpinnerAndShowData("backupDescribeModal");
+    $("#backupLogsModal").modal("show");
+  });
+  actionsCell.appendChild(logsButton);
+
+  const describeButton = createButton("Describe", () => {
+    displayDataInModal(null, "backupDescribeModal", async () => {
+      try {
+        if (prefetchedDescribes[backup.name]) {
+          displayDataInModal({ logs: prefetchedDescribes[backup.name] }, "backupDescribeModal");
+          return;
         }
-      });
-      $("#backupDescribeModal").modal("show");
-    });
-    actionsCell.appendChild(describeButton);
 
-    const deleteButton = createButton("Delete", () => {
-      const confirmation = confirm(`Are you sure you want to delete backup "${backup.name}"?`);
-      if (confirmation) {
-        deleteBackup(backup.name);
+        const response = await fetch(`backups/describe?name=${backup.name}`);
+        if (!response.ok) {
+          throw new Error(`${response.status} ${response.statusText}`);
+        }
+        const data = await response.json();
+        if (data.message) {
+          alert(data.message);
+        } else {
+          displayDataInModal(data, "backupDescribeModal");
+        }
+      } catch (error) {
+        console.error("Error fetching backup describe:", error);
+        alert(`Error fetching backup describe: ${error.message}`);
+      } finally {
+        hideSpinnerAndShowData("backupDescribeModal");
       }
     });
-    actionsCell.appendChild(deleteButton);
+    $("#backupDescribeModal").modal("show");
+  });
+  actionsCell.appendChild(describeButton);
 
-    const restoreButton = createButton('Restore', () => {
-      showRestoreModal(backup.name);
-    });
-    actionsCell.appendChild(restoreButton);
+  const deleteButton = createButton("Delete", () => {
+    const confirmation = confirm(`Are you sure you want to delete backup "${backup.name}"?`);
+    if (confirmation) {
+      deleteBackup(backup.name);
+    }
+  });
+  actionsCell.appendChild(deleteButton);
+
+  const restoreButton = createButton('Restore', () => {
+    showRestoreModal(backup.name);
   });
+  actionsCell.appendChild(restoreButton);
+
+  return newRow;
+}
+
+function displayBackupData(backupData, totalItems) {
+  const tableBody = document.getElementById("backupTableBody");
+  tableBody.innerHTML = "";
 
-  updatePagination(backupData.length);
+  backupData.forEach((backup) => addBackupRow(tableBody, backup));
+
+  updatePagination(totalItems);
 
   const dismissButtons = document.querySelectorAll(".modal-header button");
   for (const dismissButton of dismissButtons) {
@@ -223,31 +257,20 @@ function parseBackupData(data) {
   const backupList = [];
 
   function parseBackup(backup) {
-    console.log(backup)
-    const {
-      metadata: { name, creationTimestamp },
-      status: { phase, expiration, errors = 0, warnings = 0 },
-      spec: { storageLocation, labelSelector },
-    } = backup;
-
     return {
-      name,
-      status: phase || 'New',
-      errors,
-      warnings,
-      created: creationTimestamp || '<nil>',
-      expiration: expiration || 'n/a',
-      storageLocation: storageLocation || '<none>',
-      selector: JSON.stringify(labelSelector, null, 2) || '<none>',
+      name: backup.name,
+      status: backup.phase,
+      errors: backup.errors,
+      warnings: backup.warnings,
+      created: backup.created || '<nil>',
+      expiration: backup.expiration || 'n/a',
+      storageLocation: backup.storageLocation || '<none>',
+      selector: JSON.stringify(backup.selector, null, 2) || '<none>',
     };
   }
 
-  if (data) {
-    if (data.items) {
-      backupList.push(...data.items.filter(item => item.metadata).map(parseBackup));
-    } else if (data.metadata) {
-      backupList.push(parseBackup(data));
-    }
+  if (data && data.items) {
+    backupList.push(...data.items.map(parseBackup));
   }
 
   return backupList;
@@ -255,33 +278,64 @@ function parseBackupData(data) {
 
 async function listBackups() {
   try {
-    const response = await fetch(`backups`);
+    // The server filters, sorts by creation date and returns only the current page
+    const response = await fetch(`backups?page=${currentPage}&limit=${itemsPerPage}&sort=created&order=desc`);
     if (response.ok) {
       const data = await response.json();
-      const backupList = parseBackupData(JSON.parse(data));
-
-      // Sort the backupList by the 'created' field in descending order
-      backupList.sort((a, b) => {
-        const dateA = new Date(a.created);
-        const dateB = new Date(b.created);
 
-        if (isNaN(dateA)) {
-          return 1;
-        }
-        if (isNaN(dateB)) {
-          return -1;
-        }
+      // The current page disappeared, e.g. after deleting its last backups
+      const totalPages = Math.ceil(data.total / itemsPerPage);
+      if (data.items.length === 0 && currentPage > 1 && totalPages > 0) {
+        currentPage = totalPages;
+        return listBackups();
+      }
 
-        return dateB - dateA;
-      });
+      const backupList = parseBackupData(data);
+      displayBackupData(backupList, data.total);
+      prefetchDescribes(backupList.map((backup) => backup.name));
 
-      displayBackupData(backupList);
+      if (!isLive(backupChanges)) {
+        backupChanges = subscribeChanges("backups/events", data.resourceVersion, onBackupChange, listBackups);
+      }
     }
   } catch (error) {
     console.error("Error fetching backups:", error);
   }
 }
 
+function onBackupChange(type, item) {
+  delete prefetchedDescribes[item.name];
+
+  // Backups are shown by creation date, an update never moves a backup to
+  // another page
+  if (type === "MODIFIED") {
+    const tableBody = document.getElementById("backupTableBody");
+    replaceRow(tableBody, parseBackupData({ items: [item] })[0], addBackupRow);
+    return;
+  }
+
+  // Added and deleted backups shift the pages, fetch the current one again
+  refreshBackups();
+}
+
+async function prefetchDescribes(backupNames) {
+  prefetchedDescribes = {};
+  if (backupNames.length < 2) {
+    return;
+  }
+
+  try {
+    const query = backupNames.map((name) => `name=${encodeURIComponent(name)}`).join("&");
+    const response = await fetch(`backups/describe?${query}`);
+    if (response.ok) {
+      const data = await response.json();
+      prefetchedDescribes = data.items || {};
+    }
+  } catch (error) {
+    console.error("Error prefetching backup describe:", error);
+  }
+}
+
 
 async function createBackup() {
   const createBackupForm = document.getElementById("createBackupForm");
@@ -321,7 +375,9 @@ async function createBackup() {
   const response = await fetch(`backups`, requestOptions);
   const data = await response.json();
   alert(data.message);
-  listBackups();
+  if (!isLive(backupChanges)) {
+    listBackups();
+  }
 }
 
 // Create Backup Modal
@@ -345,10 +401,11 @@ async function deleteBackup(backupName) {
   });
   const data = await response.json();
   alert(data.message);
-  listBackups();
+  if (!isLive(backupChanges)) {
+    listBackups();
+  }
 }
 
 window.listBackups = listBackups;
 window.parseBackupData = window.parseBackupData || parseBackupData;
-fetchData(1);
 initBackupPage();
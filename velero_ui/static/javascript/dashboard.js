@@ -1,139 +1,21 @@
-
-function parseBackupData(data) {
-  const backupList = [];
-
-  function parseBackup(backup) {
-    const {
-      metadata: { name, creationTimestamp },
-      status: { phase, expiration, errors = 0, warnings = 0 },
-      spec: { storageLocation },
-    } = backup;
-
-    return {
-      name,
-      status: phase || 'New',
-      errors,
-      warnings,
-      created: creationTimestamp || '<nil>',
-      expiration: expiration || 'n/a',
-      storageLocation: storageLocation || '<none>',
-      selector: '<none>',
-    };
-  }
-
-  if (data) {
-    if (data.items) {
-      backupList.push(...data.items.filter(item => item.metadata).map(parseBackup));
-    } else if (data.metadata) {
-      backupList.push(parseBackup(data));
-    }
-  }
-
-  return backupList;
-}
-
-function parseScheduleData(data) {
-  const scheduleList = [];
-
-  if (data.kind === "ScheduleList" && data.items) {
-    data.items.forEach((item) => {
-      const scheduleData = extractScheduleData(item);
-      if (scheduleData) {
-        scheduleList.push(scheduleData);
-      }
-    });
-  } else if (data.kind === "Schedule") {
-    const scheduleData = extractScheduleData(data);
-    if (scheduleData) {
-      scheduleList.push(scheduleData);
-    }
-  }
-
-  return scheduleList;
-}
-
-function parseStorageData(data) {
-  const storageList = [];
-
-  function parseStorage(storage) {
-    const {
-      metadata: { name, creationTimestamp },
-      status: { phase, lastValidationTime },
-      spec: { backupSyncPeriod, config },
-    } = storage;
-
-    return {
-      name,
-      status: phase || 'New',
-      lastValidationTime: lastValidationTime,
-      created: creationTimestamp || '<nil>',
-      backupSyncPeriod,
-      config
-    };
-  }
-
-  if (data) {
-    if (data.items) {
-      storageList.push(...data.items.filter(item => item.metadata).map(parseStorage));
-    } else if (data.metadata) {
-      storageList.push(parseStorage(data));
-    }
-  }
-
-  return storageList;
-}
-
-function extractScheduleData(item) {
-  if (item.metadata && item.spec && item.status) {
-    const {
-      metadata: { name, creationTimestamp },
-      spec: { schedule, template: { ttl } },
-      status: { phase },
-    } = item;
-
-    return {
-      name,
-      status: phase,
-      created: creationTimestamp,
-      schedule,
-      backupTtl: ttl,
-      lastBackup: "n/a", // You need to update this value based on your API response
-      selector: "<none>",
-      paused: false, // You need to update this value based on your API response
-    };
-  }
-  return null;
-}
-
 async function loadDashboardSummary() {
-  const backupResponse = await fetch(`backups`);
-  const backupData = await backupResponse.json();
-  const backupList = parseBackupData(JSON.parse(backupData));
-
-
-  const scheduleResponse = await fetch(`schedules`);
-  const scheduleData = await scheduleResponse.json();
-  const scheduleList = parseScheduleData(JSON.parse(scheduleData));
+  // Counts and storage locations are computed by the server in one small response
+  const response = await fetch(`dashboard/summary`);
+  const summary = await response.json();
 
-  const storageReponse = await fetch(`storages`);
-  const storageData = await storageReponse.json();
-  const storageList = parseStorageData(JSON.parse(storageData));
-
-  displayDashboardSummary(backupList, scheduleList, storageList);
+  displayDashboardSummary(summary);
 }
 
-function displayDashboardSummary(backupList, scheduleList, storageList) {
-  const totalBackups = backupList.length;
-  const totalSchedules = scheduleList.length;
-
-  const backupsByStatus = backupList.reduce((statusCounts, backup) => {
-    if (statusCounts[backup.status]) {
-      statusCounts[backup.status]++;
-    } else {
-      statusCounts[backup.status] = 1;
-    }
-    return statusCounts;
-  }, {});
+function displayDashboardSummary(summary) {
+  const totalBackups = summary.backups.total;
+  const totalSchedules = summary.schedules.total;
+  const backupsByStatus = summary.backups.byPhase;
+  const storageList = summary.storageLocations.items.map((storage) => ({
+    name: storage.name,
+    config: storage.config,
+    status: storage.phase,
+    lastValidationTime: storage.lastValidationTime,
+  }));
 
   document.getElementById("totalBackups").innerText = `Total Backups: ${totalBackups}`;
   document.getElementById("totalSchedules").innerText = `Total Schedules: ${totalSchedules}`;
@@ -170,7 +52,16 @@ function displayDashboardSummary(backupList, scheduleList, storageList) {
   for (const [status, count] of Object.entries(backupsByStatus)) {
     backupsByStatusText += `\n- ${status}: ${count}`;
   }
+  backupsByStatusText += `\n\nFailed in the last 24 hours: ${summary.backups.failedLast24h}`;
   document.getElementById("backupsByStatus").innerText = backupsByStatusText;
+
+  let lastBackupsText = "Last successful backup:";
+  for (const schedule of summary.schedules.items) {
+    const lastSuccess = schedule.lastSuccessfulBackup;
+    const lastSuccessText = lastSuccess ? new Date(lastSuccess.completed).toLocaleString() : "n/a";
+    lastBackupsText += `\n- ${schedule.name}${schedule.paused ? " (paused)" : ""}: ${lastSuccessText}`;
+  }
+  document.getElementById("schedulesLastBackup").innerText = lastBackupsText;
 }
 
 document.addEventListener("DOMContentLoaded", loadDashboardSummary);
@@ -1,8 +1,12 @@
-import { createButton, displayDataInModal, hideSpinnerAndShowData } from "./utils.js";
+import { createButton, displayDataInModal, hideSpinnerAndShowData, fetchLogs, debounce, subscribeChanges, isLive, replaceRow, rowName, displayName } from "./utils.js";
 
 let currentPage = 1;
 const itemsPerPage = 10;
 
+// Live updates of the restores, see subscribeChanges
+let restoreChanges = null;
+const refreshRestores = debounce(() => listRestores(), 500);
+
 function initRestorePage() {
   listRestores();
   document.getElementById("deleteSelectedRestoreBtn").addEventListener("click", deleteSelectedRestores);
@@ -21,15 +25,42 @@ async function deleteSelectedRestores() {
   let deletedRestores = [];
   let failedRestores = [];
 
-  for (const checkbox of selectedRestores) {
-    const restoreName = checkbox.getAttribute('data-restore-name');
-    const response = await fetch(`restores?name=${restoreName}`, { method: 'DELETE' });
+  if (selectedRestores.length > 0) {
+    // One request for all selected restores, the server deletes them concurrently
+    const rows = {};
+    for (const checkbox of selectedRestores) {
+      rows[checkbox.getAttribute('data-restore-name')] = checkbox.closest('tr');
+    }
 
-    if (response.ok) {
-      checkbox.closest('tr').remove();
-      deletedRestores.push(restoreName);
-    } else {
-      failedRestores.push(restoreName);
+    try {
+      const response = await fetch('restores/bulk-delete', {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({ names: Object.keys(rows) }),
+      });
+      if (!response.ok) {
+        const data = await response.json();
+        throw new Error(data.message || `${response.status} ${response.statusText}`);
+      }
+
+      // NDJSON: one result per object, then a summary
+      const results = (await response.text()).split('\n').filter((line) => line).map((line) => JSON.parse(line));
+      for (const result of results) {
+        if (result.done) {
+          continue;
+        }
+        if (result.status) {
+          rows[result.name].remove();
+          deletedRestores.push(result.name);
+        } else {
+          failedRestores.push(result.name);
+        }
+      }
+    } catch (error) {
+      console.error("Error deleting restores:", error);
+      failedRestores.push(...Object.keys(rows));
     }
   }
 
@@ -44,105 +75,100 @@ async function deleteSelectedRestores() {
   }
 
   // Refresh the restore list to reflect the deleted restores
-  listRestores();
-}
-
-function fetchData() {
-  fetch('restores')
-    .then((response) => response.json())
-    .then((data) => {
-      const restoreList = parseRestoreData(JSON.parse(data));
-      displayRestoreData(restoreList);
-    });
+  if (!isLive(restoreChanges)) {
+    listRestores();
+  }
 }
 
-function displayRestoreData(restoreData) {
-  const tableBody = document.getElementById("restoreTableBody");
-  tableBody.innerHTML = "";
-
-  const startIndex = (currentPage - 1) * itemsPerPage;
-  const endIndex = startIndex + itemsPerPage;
-  const currentPageData = restoreData.slice(startIndex, endIndex);
-
-  currentPageData.forEach((restore) => {
-    const newRow = tableBody.insertRow();
-
-    const selectCell = newRow.insertCell();
-    const selectCheckbox = document.createElement("input");
-    selectCheckbox.type = "checkbox";
-    selectCheckbox.classList.add("restore-select-checkbox");
-    selectCheckbox.setAttribute('data-restore-name', restore.name);
-    selectCell.appendChild(selectCheckbox);
-
-    newRow.insertCell().innerText = restore.name;
-    newRow.insertCell().innerText = restore.backup;
-    newRow.insertCell().innerText = restore.status;
-    newRow.insertCell().innerText = restore.started;
-    newRow.insertCell().innerText = restore.completed;
-    newRow.insertCell().innerText = restore.errors;
-    newRow.insertCell().innerText = restore.warnings;
-    newRow.insertCell().innerText = restore.created === '<nil>' ? '<nil>' : new Date(restore.created).toLocaleString();
-    newRow.insertCell().innerText = restore.selector;
-
-    const actionsCell = newRow.insertCell();
-    const logsButton = createButton("Logs", () => {
-      displayDataInModal(null, "restoreLogsModal", async () => {
-        try {
-          const response = await fetch(`restores/logs?name=${restore.name}`);
-          if (!response.ok) {
-            throw new Error('${response.status} ${response.statusText}');
-          }
-          const data = await response.json();
-          if (data.message) {
-            alert(data.message);
-          } else {
-            displayDataInModal(data, "restoreLogsModal");
-          }
-        } catch (error) {
-          console.error("Error fetching restore logs:", error);
-          alert('Error fetching restore logs: ${error.message}');
-        } finally {
-          hideSpinnerAndShowData("restoreLogsModal");
+function addRestoreRow(tableBody, restore, index = -1) {
+  const newRow = tableBody.insertRow(index);
+  newRow.setAttribute("data-name", rowName(restore));
+
+  const selectCell = newRow.insertCell();
+  const selectCheckbox = document.createElement("input");
+  selectCheckbox.type = "checkbox";
+  selectCheckbox.classList.add("restore-select-checkbox");
+  selectCheckbox.setAttribute('data-restore-name', restore.name);
+  selectCell.appendChild(selectCheckbox);
+
+  newRow.insertCell().innerText = displayName(restore);
+  newRow.insertCell().innerText = restore.backup;
+  newRow.insertCell().innerText = restore.status;
+  newRow.insertCell().innerText = restore.started;
+  newRow.insertCell().innerText = restore.completed;
+  newRow.insertCell().innerText = restore.errors;
+  newRow.insertCell().innerText = restore.warnings;
+  newRow.insertCell().innerText = restore.created === '<nil>' ? '<nil>' : new Date(restore.created).toLocaleString();
+  newRow.insertCell().innerText = restore.selector;
+
+  const actionsCell = newRow.insertCell();
+  if (restore.readOnly) {
+    selectCheckbox.disabled = true;
+    actionsCell.innerText = `Managed in ${restore.cluster}`;
+    return newRow;
+  }
+  const logsButton = createButton("Logs", () => {
+    displayDataInModal(null, "restoreLogsModal", async () => {
+      try {
+        const data = await fetchLogs(`restores/logs?name=${restore.name}`);
+        if (data.message) {
+          alert(data.message);
+        } else {
+          displayDataInModal(data, "restoreLogsModal");
         }
-      });
-      $("#restoreLogsModal").modal("show");
+      } catch (error) {
+        console.error("Error fetching restore logs:", error);
+        alert('Error fetching restore logs: ${error.message}');
+      } finally {
+        hideSpinnerAndShowData("restoreLogsModal");
+      }
     });
-    actionsCell.appendChild(logsButton);
-
-    const describeButton = createButton("Describe", () => {
-      displayDataInModal(null, "restoreDescribeModal", async () => {
-        try {
-          const response = await fetch(`restores/describe?name=${restore.name}`);
-          if (!response.ok) {
-            throw new Error('${response.status} ${response.statusText}');
-          }
-          const data = await response.json();
-          if (data.message) {
-            alert(data.message);
-          } else {
-            displayDataInModal(data, "restoreDescribeModal");
-          }
-        } catch (error) {
-          console.error("Error fetching restore describe:", error);
-          alert(`Error fetching restore describe: ${error.message}`);
-        } finally {
-          hideSpinnerAndShowData("restoreDescribeModal");
+    $("#restoreLogsModal").modal("show");
+  });
+  actionsCell.appendChild(logsButton);
+
+  const describeButton = createButton("Describe", () => {
+    displayDataInModal(null, "restoreDescribeModal", async () => {
+      try {
+        const response = await fetch(`restores/describe?name=${restore.name}`);
+        if (!response.ok) {
+          throw new Error('${response.status} ${response.statusText}');
         }
-      });
-      $("#restoreDescribeModal").modal("show");
-    });
-    actionsCell.appendChild(describeButton);
-
-    const deleteButton = createButton("Delete", () => {
-      const confirmation = confirm(`Are you sure you want to delete restore "${restore.name}"?`);
-      if (confirmation) {
-        deleteRestore(restore.name);
+        const data = await response.json();
+        if (data.message) {
+          alert(data.message);
+        } else {
+          displayDataInModal(data, "restoreDescribeModal");
+        }
+      } catch (error) {
+        console.error("Error fetching restore describe:", error);
+        alert(`Error fetching restore describe: ${error.message}`);
+      } finally {
+        hideSpinnerAndShowData("restoreDescribeModal");
       }
     });
-    actionsCell.appendChild(deleteButton);
+    $("#restoreDescribeModal").modal("show");
   });
+  actionsCell.appendChild(describeButton);
 
-  updatePagination(restoreData.length);
+  const deleteButton = createButton("Delete", () => {
+    const confirmation = confirm(`Are you sure you want to delete restore "${restore.name}"?`);
+    if (confirmation) {
+      deleteRestore(restore.name);
+    }
+  });
+  actionsCell.appendChild(deleteButton);
+
+  return newRow;
+}
+
+function displayRestoreData(restoreData, totalItems) {
+  const tableBody = document.getElementById("restoreTableBody");
+  tableBody.innerHTML = "";
+
+  restoreData.forEach((restore) => addRestoreRow(tableBody, restore));
+
+  updatePagination(totalItems);
 
   const dismissButtons = document.querySelectorAll(".modal-header button");
   for (const dismissButton of dismissButtons) {
@@ -186,33 +212,21 @@ function parseRestoreData(data) {
   const restoreList = [];
 
   function parseRestore(restore) {
-    const {
-      metadata: { name, creationTimestamp },
-      spec: { backupName, scheduleName, includedNamespaces },
-      status: { phase, warnings, startTimestamp, completionTimestamp },
-    } = restore;
-
     return {
-      name,
-      backup: backupName || scheduleName || '-',
-      status: phase || 'New',
-      started: startTimestamp ? new Date(startTimestamp).toLocaleString() : '-',
-      completed: completionTimestamp ? new Date(completionTimestamp).toLocaleString() : '-',
-      errors: 0, // No "errors" field found in the JSON output, so set it to 0 by default
-      warnings: warnings || 0,
-      created: creationTimestamp ? new Date(creationTimestamp).toLocaleString() : '<nil>',
-      selector: includedNamespaces ? includedNamespaces.join(', ') : '<none>',
+      name: restore.name,
+      backup: restore.backup || '-',
+      status: restore.phase,
+      started: restore.started ? new Date(restore.started).toLocaleString() : '-',
+      completed: restore.completed ? new Date(restore.completed).toLocaleString() : '-',
+      errors: restore.errors,
+      warnings: restore.warnings,
+      created: restore.created || '<nil>',
+      selector: restore.selector ? restore.selector.join(', ') : '<none>',
     };
   }
 
-
-  if (data) {
-    if (data.items) {
-      
-      restoreList.push(...data.items.filter(item => item.metadata).map(parseRestore));
-    } else if (data.metadata) {
-      restoreList.push(parseRestore(data));
-    }
+  if (data && data.items) {
+    restoreList.push(...data.items.map(parseRestore));
   }
 
   return restoreList;
@@ -220,29 +234,41 @@ function parseRestoreData(data) {
 
 async function listRestores() {
   try {
-    const response = await fetch(`restores`);
+    // The server filters, sorts by creation date and returns only the current page
+    const response = await fetch(`restores?page=${currentPage}&limit=${itemsPerPage}&sort=created&order=desc`);
     const data = await response.json();
-    const restoreList = parseRestoreData(JSON.parse(data));
-    // Sort the restoreList by the 'created' field in descending order
-    restoreList.sort((a, b) => {
-      const dateA = new Date(a.created);
-      const dateB = new Date(b.created);
-
-      if (isNaN(dateA)) {
-        return 1;
-      }
-      if (isNaN(dateB)) {
-        return -1;
-      }
 
-      return dateB - dateA;
-    });
-    displayRestoreData(restoreList);
+    // The current page disappeared, e.g. after deleting its last restores
+    const totalPages = Math.ceil(data.total / itemsPerPage);
+    if (data.items.length === 0 && currentPage > 1 && totalPages > 0) {
+      currentPage = totalPages;
+      return listRestores();
+    }
+
+    const restoreList = parseRestoreData(data);
+    displayRestoreData(restoreList, data.total);
+
+    if (!isLive(restoreChanges)) {
+      restoreChanges = subscribeChanges("restores/events", data.resourceVersion, onRestoreChange, listRestores);
+    }
   } catch (error) {
     console.error("Error fetching restores:", error);
   }
 }
 
+function onRestoreChange(type, item) {
+  // Restores are shown by creation date, an update never moves a restore to
+  // another page
+  if (type === "MODIFIED") {
+    const tableBody = document.getElementById("restoreTableBody");
+    replaceRow(tableBody, parseRestoreData({ items: [item] })[0], addRestoreRow);
+    return;
+  }
+
+  // Added and deleted restores shift the pages, fetch the current one again
+  refreshRestores();
+}
+
 
 async function deleteRestore(restoreName) {
   console.log('Deleting restore ${restoreName}');
@@ -254,12 +280,13 @@ async function deleteRestore(restoreName) {
   });
   const data = await response.json();
   alert(data.message);
-  listRestores();
+  if (!isLive(restoreChanges)) {
+    listRestores();
+  }
 }
 
-window.listRestores = fetchData;
+window.listRestores = listRestores;
 window.parseRestoreData = window.parseRestoreData || parseRestoreData;
-fetchData(1);
 initRestorePage();
 
 
@@ -1,7 +1,11 @@
-import { createButton, displayDataInModal, hideSpinnerAndShowData } from "./utils.js";
+import { createButton, displayDataInModal, hideSpinnerAndShowData, debounce, subscribeChanges, isLive, replaceRow, rowName, displayName } from "./utils.js";
 
 let submitCreateScheduleInitialized = false;
 
+// Live updates of the schedules, see subscribeChanges
+let scheduleChanges = null;
+const refreshSchedules = debounce(() => listSchedules(), 500);
+
 function initSchedulePage() {
   listSchedules();
 
@@ -46,54 +50,63 @@ async function restoreSchedule(scheduleName, optionalParameters) {
 
 $(document).ready(initSchedulePage);
 
+function addScheduleRow(tableBody, schedule, index = -1) {
+  const newRow = tableBody.insertRow(index);
+  newRow.setAttribute("data-name", rowName(schedule));
+
+  newRow.insertCell().innerText = displayName(schedule);
+  newRow.insertCell().innerText = schedule.status;
+  newRow.insertCell().innerText = new Date(schedule.created).toLocaleString();
+  newRow.insertCell().innerText = schedule.schedule;
+  newRow.insertCell().innerText = schedule.backupTtl;
+  newRow.insertCell().innerText = schedule.lastBackup;
+  newRow.insertCell().innerText = schedule.selector;
+  newRow.insertCell().innerText = schedule.paused;
+
+  const actionsCell = newRow.insertCell();
+  if (schedule.readOnly) {
+    actionsCell.innerText = `Managed in ${schedule.cluster}`;
+    return newRow;
+  }
+  const deleteButton = createButton("Delete", () => {
+    const confirmation = confirm(`Are you sure you want to delete schedule "${schedule.name}"?`);
+    if (confirmation) {
+      deleteSchedule(schedule.name);
+    }
+  });
+  actionsCell.appendChild(deleteButton);
+  const describeButton = createButton("Describe", () => {
+    displayDataInModal(null, "scheduleDescribeModal", async () => {
+      try {
+      const response = await fetch(`schedules/describe?name=${schedule.name}`);
+        if (!response.ok) {
+          throw new Error(`${response.status} ${response.statusText}`);
+        }
+        const data = await response.json();
+        if (data.message) {
+          alert(data.message);
+        } else {
+          displayDataInModal(data, "scheduleDescribeModal");
+        }
+      } catch (error) {
+        console.error("Error fetching schedule describe:", error);
+        alert(`Error fetching schedule describe: ${error.message}`);
+      } finally {
+        hideSpinnerAndShowData("scheduleDescribeModal");
+      }
+    });
+    $("#scheduleDescribeModal").modal("show");
+  });
+  actionsCell.appendChild(describeButton);
+
+  return newRow;
+}
+
 function displayScheduleData(scheduleData) {
   const tableBody = document.querySelector("#schedulesTableBody");
   tableBody.innerHTML = "";
 
-  scheduleData.forEach((schedule) => {
-    const newRow = tableBody.insertRow();
-
-    newRow.insertCell().innerText = schedule.name;
-    newRow.insertCell().innerText = schedule.status;
-    newRow.insertCell().innerText = new Date(schedule.created).toLocaleString();
-    newRow.insertCell().innerText = schedule.schedule;
-    newRow.insertCell().innerText = schedule.backupTtl;
-    newRow.insertCell().innerText = schedule.lastBackup;
-    newRow.insertCell().innerText = schedule.selector;
-    newRow.insertCell().innerText = schedule.paused;
-
-    const actionsCell = newRow.insertCell();
-    const deleteButton = createButton("Delete", () => {
-      const confirmation = confirm(`Are you sure you want to delete schedule "${schedule.name}"?`);
-      if (confirmation) {
-        deleteSchedule(schedule.name);
-      }
-    });
-    actionsCell.appendChild(deleteButton);
-    const describeButton = createButton("Describe", () => {
-      displayDataInModal(null, "scheduleDescribeModal", async () => {
-        try {
-        const response = await fetch(`schedules/describe?name=${schedule.name}`);
-          if (!response.ok) {
-            throw new Error(`${response.status} ${response.statusText}`);
-          }
-          const data = await response.json();
-          if (data.message) {
-            alert(data.message);
-          } else {
-            displayDataInModal(data, "scheduleDescribeModal");
-          }
-        } catch (error) {
-          console.error("Error fetching schedule describe:", error);
-          alert(`Error fetching schedule describe: ${error.message}`);
-        } finally {
-          hideSpinnerAndShowData("scheduleDescribeModal");
-        }
-      });
-      $("#scheduleDescribeModal").modal("show");
-    });
-    actionsCell.appendChild(describeButton);
-  });
+  scheduleData.forEach((schedule) => addScheduleRow(tableBody, schedule));
 
   // Add the event listener for the dismiss buttons once, outside the loop
   const dismissButtons = document.querySelectorAll(".modal-header button");
@@ -108,50 +121,48 @@ function displayScheduleData(scheduleData) {
 function parseScheduleData(data) {
   const scheduleList = [];
 
-  if (data.kind === "ScheduleList" && data.items) {
+  if (data && data.items) {
     data.items.forEach((item) => {
-      const scheduleData = extractScheduleData(item);
-      if (scheduleData) {
-        scheduleList.push(scheduleData);
-      }
+      scheduleList.push(extractScheduleData(item));
     });
-  } else if (data.kind === "Schedule") {
-    const scheduleData = extractScheduleData(data);
-    if (scheduleData) {
-      scheduleList.push(scheduleData);
-    }
   }
 
   return scheduleList;
 }
 
 function extractScheduleData(item) {
-  if (item.metadata && item.spec && item.status) {
-    const {
-      metadata: { name, creationTimestamp },
-      spec: { schedule, template: { ttl, labelSelector } },
-      status: { phase, lastBackup },
-    } = item;
-
-    return {
-      name,
-      status: phase,
-      created: creationTimestamp,
-      schedule,
-      backupTtl: ttl,
-      lastBackup: lastBackup ? new Date(lastBackup).toLocaleString() : "n/a",
-      selector: JSON.stringify(labelSelector, null, 2) || "<none>",
-      paused: false,
-    };
-  }
-  return null;
+  return {
+    name: item.name,
+    status: item.phase,
+    created: item.created,
+    schedule: item.schedule,
+    backupTtl: item.ttl,
+    lastBackup: item.lastBackup ? new Date(item.lastBackup).toLocaleString() : "n/a",
+    selector: JSON.stringify(item.selector, null, 2) || "<none>",
+    paused: item.paused,
+  };
 }
 
 async function listSchedules() {
-  const response = await fetch(`schedules`);
+  const response = await fetch(`schedules?sort=name`);
   const data = await response.json();
-  const scheduleList = parseScheduleData(JSON.parse(data));
+  const scheduleList = parseScheduleData(data);
   displayScheduleData(scheduleList);
+
+  if (!isLive(scheduleChanges)) {
+    scheduleChanges = subscribeChanges("schedules/events", data.resourceVersion, onScheduleChange, listSchedules);
+  }
+}
+
+function onScheduleChange(type, item) {
+  // Schedules are shown by name, an update never moves a schedule
+  if (type === "MODIFIED") {
+    const tableBody = document.querySelector("#schedulesTableBody");
+    replaceRow(tableBody, extractScheduleData(item), addScheduleRow);
+    return;
+  }
+
+  refreshSchedules();
 }
 
 async function createSchedule() {
@@ -215,7 +226,9 @@ async function deleteSchedule(scheduleName) {
   });
   const data = await response.json();
   alert(data.message);
-  listSchedules();
+  if (!isLive(scheduleChanges)) {
+    listSchedules();
+  }
 }
 
 window.parseScheduleData = window.parseScheduleData || parseScheduleData;
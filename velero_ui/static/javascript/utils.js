@@ -35,6 +35,85 @@ export function hideSpinnerAndShowData(modalId) {
   preElement.classList.remove("d-none");
 }
 
+// Log endpoints stream plain text, or answer JSON with a message when there is
+// no log to show. Returns an object usable with displayDataInModal.
+export async function fetchLogs(url) {
+  const response = await fetch(url);
+  if (!response.ok) {
+    throw new Error(`${response.status} ${response.statusText}`);
+  }
+
+  const contentType = response.headers.get("Content-Type") || "";
+  if (contentType.includes("application/json")) {
+    return await response.json();
+  }
+  return { logs: await response.text() };
+}
+
 export function saveAuthToken(token) {
   sessionStorage.setItem("authToken", token);
 }
+
+export function debounce(callback, delay) {
+  let timer = null;
+  return (...args) => {
+    clearTimeout(timer);
+    timer = setTimeout(() => callback(...args), delay);
+  };
+}
+
+// Follow the Server-Sent Events stream of a collection, starting after the
+// resourceVersion of the list shown. onChange(type, item) receives the ADDED,
+// MODIFIED and DELETED changes and onResync() is called when the list must be
+// fetched again. Returns null when the browser has no EventSource.
+export function subscribeChanges(url, resourceVersion, onChange, onResync) {
+  if (!window.EventSource) {
+    return null;
+  }
+
+  const query = resourceVersion ? `?resourceVersion=${encodeURIComponent(resourceVersion)}` : "";
+  const source = new EventSource(`${url}${query}`);
+  for (const type of ["ADDED", "MODIFIED", "DELETED"]) {
+    source.addEventListener(type, (event) => onChange(type, JSON.parse(event.data)));
+  }
+  source.addEventListener("RESYNC", () => onResync());
+  return source;
+}
+
+// Whether a stream of subscribeChanges still delivers changes. The browser
+// reconnects by itself after network errors but gives up when the server
+// refuses the stream.
+export function isLive(source) {
+  return source !== null && source.readyState !== EventSource.CLOSED;
+}
+
+// Render item again in place of the table row of the same name, keeping its
+// checkbox state. addRow(tableBody, item, index) must insert the row at index
+// with a data-name attribute. Returns false when no row has that name.
+export function replaceRow(tableBody, item, addRow) {
+  const row = tableBody.querySelector(`tr[data-name="${CSS.escape(item.name)}"]`);
+  if (!row) {
+    return false;
+  }
+
+  const checkbox = row.querySelector('input[type="checkbox"]');
+  const checked = checkbox ? checkbox.checked : false;
+  const index = row.sectionRowIndex;
+  row.remove();
+
+  const newCheckbox = addRow(tableBody, item, index).querySelector('input[type="checkbox"]');
+  if (newCheckbox) {
+    newCheckbox.checked = checked;
+  }
+  return true;
+}
+
+// Row key and displayed name of a list item. Items of other clusters of a
+// merged list are keyed by cluster too, names are only unique per cluster.
+export function rowName(item) {
+  return item.readOnly ? `${item.cluster}/${item.name}` : item.name;
+}
+
+export function displayName(item) {
+  return item.cluster ? `${item.name} (${item.cluster})` : item.name;
+}
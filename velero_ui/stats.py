@@ -0,0 +1,22 @@
+from flask import jsonify
+
+from velero_ui.cache import caches
+from velero_ui.log_cache import get_log_cache
+from velero_ui.contents import contents_cache_stats
+from velero_ui.log_index import log_index_stats
+from velero_ui.describe import pod_volume_cache_stats
+from velero_ui.singleflight import coalescing_stats
+
+
+# Counters of the in-process caches. Every gunicorn worker keeps its own.
+def get_stats():
+    log_cache = get_log_cache()
+
+    return jsonify({
+        "resourceCache": {plural: cache.stats() for plural, cache in list(caches.items())},
+        "logCache": log_cache.stats() if log_cache else None,
+        "contentsCache": contents_cache_stats(),
+        "logIndex": log_index_stats(),
+        "podVolumeCache": pod_volume_cache_stats(),
+        "coalescing": coalescing_stats(),
+    })
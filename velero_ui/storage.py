@@ -1,9 +1,9 @@
-import json
-import velero_ui.velero_api as velero_api
-from flask import request, jsonify
+from velero_ui.list_query import list_response
 
 
-# ScheduleList related functions
+# BackupStorageLocationList related functions
 def get_storages():
-    schedules = json.dumps(velero_api.get_storage_list())
-    return jsonify(schedules)
+    try:
+        return list_response("backupstoragelocations")
+    except ValueError as e:
+        return {"message": str(e)}, 400
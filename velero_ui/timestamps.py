@@ -0,0 +1,10 @@
+from datetime import datetime
+
+
+# Timezone aware datetime of an RFC 3339 timestamp of the Kubernetes API, e.g.
+# 2024-01-25T01:24:00Z. None when value is empty.
+# Raise ValueError on an invalid timestamp.
+def parse_time(value):
+    if not value:
+        return None
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
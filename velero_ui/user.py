@@ -1,17 +1,118 @@
+import os
+import time
 import bcrypt
 import base64
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from kubernetes import client
 from flask import request, jsonify
-from velero_ui.kube_api import get_namespace
+from velero_ui.kube_api import get_namespace, get_api_client, core_v1_api, REQUEST_TIMEOUT
+from velero_ui.cache import ResourceCache, register_cache
+from velero_ui.metrics import observe_password_check
 
+logger = logging.getLogger(__name__)
+
+# Users are the secrets carrying this label, the secret name is the username
+USER_LABEL = "velero-ui/user"
+USER_LABEL_SELECTOR = f"{USER_LABEL}=true"
+
+# Password hash checks run at once by a worker, off the request threads
+PASSWORD_CHECK_CONCURRENCY = int(os.getenv("PASSWORD_CHECK_CONCURRENCY", "2"))
+# Checks waiting for a free slot before new logins are turned away
+PASSWORD_CHECK_QUEUE = int(os.getenv("PASSWORD_CHECK_QUEUE", "8"))
+# Failed logins of a user within the window before further attempts are refused
+LOGIN_MAX_FAILURES = int(os.getenv("LOGIN_MAX_FAILURES", "5"))
+LOGIN_FAILURE_WINDOW = int(os.getenv("LOGIN_FAILURE_WINDOW_SECONDS", "60"))
+
+# Users tracked by the login throttle before expired entries are dropped
+MAX_THROTTLED_USERS = 10000
+
+# Checked instead of the hash of an unknown user, so answering takes as long
+# whether the user exists or not. Made with the default bcrypt cost.
+UNKNOWN_USER_HASH = b"$2b$12$MSv.CvUcFH0XLTRefy5VwehvxaSj0xHNpcz6W.ep.b8DOE2vzGWqC"
+
+
+# Raised when a password cannot be checked now, either because the user failed
+# too many times recently or because too many checks are already pending
+class TooManyAttempts(Exception):
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = max(int(retry_after + 0.999), 1)
+
+
+# Failed login times per user over a sliding window
+class LoginThrottle:
+    def __init__(self, max_failures, window):
+        self.max_failures = max_failures
+        self.window = window
+        self.failures = {}
+        self.lock = threading.Lock()
+
+    def _recent(self, username, now):
+        failures = self.failures.get(username)
+        if failures is None:
+            return None
+        while failures and now - failures[0] > self.window:
+            failures.popleft()
+        if not failures:
+            del self.failures[username]
+            return None
+        return failures
+
+    def check(self, username):
+        now = time.monotonic()
+        with self.lock:
+            failures = self._recent(username, now)
+            if failures is not None and len(failures) >= self.max_failures:
+                raise TooManyAttempts(f"Too many failed logins for user '{username}'. Try again later", failures[0] + self.window - now)
+
+    def failed(self, username):
+        now = time.monotonic()
+        with self.lock:
+            if len(self.failures) >= MAX_THROTTLED_USERS:
+                for name in list(self.failures):
+                    self._recent(name, now)
+            self.failures.setdefault(username, deque(maxlen=self.max_failures)).append(now)
+
+    def succeeded(self, username):
+        with self.lock:
+            self.failures.pop(username, None)
+
+
+login_throttle = LoginThrottle(LOGIN_MAX_FAILURES, LOGIN_FAILURE_WINDOW)
+
+password_executor = ThreadPoolExecutor(max_workers=PASSWORD_CHECK_CONCURRENCY, thread_name_prefix="password-check")
+pending_checks = 0
+pending_checks_lock = threading.Lock()
+
+
+def _users_cache():
+    def list_call(**kwargs):
+        return core_v1_api().list_namespaced_secret(get_namespace(), label_selector=USER_LABEL_SELECTOR, **kwargs)
+
+    return register_cache("secrets/users", lambda: ResourceCache("secrets/users", list_call))
+
+def _is_user_secret(secret):
+    return (secret["metadata"].get("labels") or {}).get(USER_LABEL) == "true"
+
+# The secret of a user as a JSON dict, from the users watch when available.
+# None if the user does not exist.
 def get_user_secret(username):
+    cache = _users_cache()
+    if cache is not None and cache.is_fresh():
+        return cache.get(username)
+
     namespace = get_namespace()
     try:
-        return client.CoreV1Api().read_namespaced_secret(username, namespace)
+        secret = core_v1_api().read_namespaced_secret(username, namespace, _request_timeout=REQUEST_TIMEOUT)
     except client.exceptions.ApiException as e:
         if e.status == 404:
             return None
         raise e
+    secret = get_api_client().sanitize_for_serialization(secret)
+    return secret if _is_user_secret(secret) else None
 
 def create_user_secret(username, password):
     namespace = get_namespace()
@@ -21,29 +122,37 @@ def create_user_secret(username, password):
     secret = client.V1Secret(
         api_version="v1",
         kind="Secret",
-        metadata=client.V1ObjectMeta(name=username, namespace=namespace),
+        metadata=client.V1ObjectMeta(name=username, namespace=namespace, labels={USER_LABEL: "true"}),
         type="Opaque",
         data=secret_data
     )
 
-    client.CoreV1Api().create_namespaced_secret(namespace, secret)
+    core_v1_api().create_namespaced_secret(namespace, secret, _request_timeout=REQUEST_TIMEOUT)
 
 def update_user_password(username, password):
     namespace = get_namespace()
-    secret = get_user_secret(username)
-    if not secret:
+    try:
+        secret = core_v1_api().read_namespaced_secret(username, namespace, _request_timeout=REQUEST_TIMEOUT)
+    except client.exceptions.ApiException as e:
+        if e.status == 404:
+            return False
+        raise e
+    if (secret.metadata.labels or {}).get(USER_LABEL) != "true":
         return False
 
     hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
     secret.data = {"password": base64.b64encode(hashed_password).decode('utf-8')}
 
-    client.CoreV1Api().replace_namespaced_secret(username, namespace, secret)
+    core_v1_api().replace_namespaced_secret(username, namespace, secret, _request_timeout=REQUEST_TIMEOUT)
     return True
 
 def delete_user_secret(username):
+    if get_user_secret(username) is None:
+        return False
+
     namespace = get_namespace()
     try:
-        client.CoreV1Api().delete_namespaced_secret(username, namespace)
+        core_v1_api().delete_namespaced_secret(username, namespace, _request_timeout=REQUEST_TIMEOUT)
     except client.exceptions.ApiException as e:
         if e.status == 404:
             return False
@@ -51,23 +160,88 @@ def delete_user_secret(username):
     return True
 
 def list_users():
-    namespace = get_namespace()
-    secrets = client.CoreV1Api().list_namespaced_secret(namespace)
-    users = [secret.metadata.name for secret in secrets.items if secret.type == "Opaque"]
-    return users
+    cache = _users_cache()
+    if cache is not None and cache.is_fresh():
+        secrets = cache.list()["items"]
+    else:
+        namespace = get_namespace()
+        response = core_v1_api().list_namespaced_secret(namespace, label_selector=USER_LABEL_SELECTOR, _request_timeout=REQUEST_TIMEOUT)
+        secrets = get_api_client().sanitize_for_serialization(response)["items"]
+    return sorted(secret["metadata"]["name"] for secret in secrets)
+
+def _checkpw(password, hashed_password):
+    start = time.perf_counter()
+    matches = bcrypt.checkpw(password.encode('utf-8'), hashed_password)
+    observe_password_check(time.perf_counter() - start)
+    return matches
 
+# Verify a password on the password check threads, so at most
+# PASSWORD_CHECK_CONCURRENCY hashes are computed at once whatever the number of
+# logins. Raise TooManyAttempts when the user is throttled or the queue is full.
 def check_password(username, password):
-    secret = get_user_secret(username)
-    if not secret:
+    global pending_checks
+
+    if not username or not password:
         return False
 
-    hashed_password = base64.b64decode(secret.data["password"])
-    return bcrypt.checkpw(password.encode('utf-8'), hashed_password)
+    login_throttle.check(username)
+
+    secret = get_user_secret(username)
+    hashed_password = base64.b64decode(secret["data"]["password"]) if secret else UNKNOWN_USER_HASH
+
+    with pending_checks_lock:
+        if pending_checks >= PASSWORD_CHECK_CONCURRENCY + PASSWORD_CHECK_QUEUE:
+            raise TooManyAttempts("Too many logins in progress. Try again later", 1)
+        pending_checks += 1
+    try:
+        matches = password_executor.submit(_checkpw, password, hashed_password).result()
+    finally:
+        with pending_checks_lock:
+            pending_checks -= 1
+
+    # Guesses of unknown users are throttled as well
+    matches = matches and secret is not None
+    if matches:
+        login_throttle.succeeded(username)
+    else:
+        login_throttle.failed(username)
+    return matches
 
 def is_admin_user(username):
     return username == 'admin'
 
+# Label the user secrets created before users were selected by label: Opaque
+# secrets holding only a bcrypt password hash. The admin secret is labelled
+# last, so a labelled admin tells the migration is done.
+def label_legacy_users():
+    namespace = get_namespace()
+    secrets = core_v1_api().list_namespaced_secret(namespace, field_selector="type=Opaque", _request_timeout=REQUEST_TIMEOUT)
+
+    for secret in sorted(secrets.items, key=lambda secret: secret.metadata.name == "admin"):
+        if (secret.metadata.labels or {}).get(USER_LABEL) == "true":
+            continue
+        if set(secret.data or {}) != {"password"}:
+            continue
+        try:
+            if not base64.b64decode(secret.data["password"]).startswith(b"$2"):
+                continue
+        except ValueError:
+            continue
+
+        secret.metadata.labels = {**(secret.metadata.labels or {}), USER_LABEL: "true"}
+        core_v1_api().replace_namespaced_secret(secret.metadata.name, namespace, secret, _request_timeout=REQUEST_TIMEOUT)
+        logger.info(f"Labelled existing user secret {secret.metadata.name}")
+
+# Once users are migrated this is a single read of the admin secret
 def create_admin_user_if_not_exists():
+    if get_user_secret("admin") is not None:
+        return
+
+    try:
+        label_legacy_users()
+    except client.exceptions.ApiException as e:
+        logger.error(f"Cannot label existing user secrets: {e.status} {e.reason}")
+
     if get_user_secret("admin") is None:
         create_user_secret("admin", "admin")
 
@@ -87,7 +261,13 @@ def user_list_post():
     if get_user_secret(username) is not None:
         return {"message": f"User '{username}' already exists"}, 400
 
-    create_user_secret(username, password)
+    try:
+        create_user_secret(username, password)
+    except client.exceptions.ApiException as e:
+        # Another secret of the namespace already has this name
+        if e.status == 409:
+            return {"message": f"User '{username}' already exists"}, 400
+        raise e
     return {"message": f"User '{username}' created successfully"}
 
 def user_list_delete():
@@ -110,8 +290,11 @@ def change_password_post():
     if not username or not old_password or not new_password:
         return {"message": "Username, oldPassword, and newPassword are required as JSON properties in the request body"}, 400
 
-    if not check_password(username, old_password):
-        return {"message": "Incorrect username or old password"}, 403
+    try:
+        if not check_password(username, old_password):
+            return {"message": "Incorrect username or old password"}, 403
+    except TooManyAttempts as e:
+        return {"message": str(e)}, 429, {"Retry-After": str(e.retry_after)}
 
     if not update_user_password(username, new_password):
         return {"message": f"User '{username}' not found"}, 404
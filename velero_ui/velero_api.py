@@ -1,5 +1,5 @@
-from kubernetes import client
-from velero_ui.kube_api import get_namespace
+from velero_ui.kube_api import get_namespace, custom_objects_api, REQUEST_TIMEOUT
+from velero_ui.cache import list_custom_objects, get_custom_object, get_custom_objects
 
 import logging
 
@@ -7,43 +7,49 @@ from velero_ui.velero_api_utils import *
 
 logger = logging.getLogger(__name__)
 
+# Phases after which Velero does not rewrite the log of a backup or restore
+TERMINAL_PHASES = ("Completed", "PartiallyFailed", "Failed", "FailedValidation")
+
+# Maximum number of names of a batch describe request
+MAX_DESCRIBE_BATCH = 100
+
 def delete_schedule(name):
     try:
-        api_client = client.ApiClient()
-        api_instance = client.CustomObjectsApi(api_client)
+        api_instance = custom_objects_api()
         res =  api_instance.delete_namespaced_custom_object(
             group="velero.io",
             version="v1",
             namespace = get_namespace(),
             plural="schedules",  # Use the appropriate resource type
             name=name,
+            _request_timeout=REQUEST_TIMEOUT,
         )
 
         logger.info(f"Delete schedule: {name}")
         logger.debug(f"Delete schedule: {res}")
     except Exception as e:
         logger.error(f"Exception: {str(e)}")
-        return {"status": False, "message": str(e)}
+        return {"status": False, "message": str(e), "code": getattr(e, "status", None)}
     
     return {"status": True, "message": ""}
 
 def delete_restore(restoreName):
     try:
-        api_client = client.ApiClient()
-        api_instance = client.CustomObjectsApi(api_client)
+        api_instance = custom_objects_api()
         res =  api_instance.delete_namespaced_custom_object(
             group="velero.io",
             version="v1",
             namespace = get_namespace(),
             plural="restores",  # Use the appropriate resource type
             name=restoreName,
+            _request_timeout=REQUEST_TIMEOUT,
         )
 
         logger.info(f"Delete restore: {restoreName}")
         logger.debug(f"Delete restore: {res}")
     except Exception as e:
         logger.error(f"Exception: {str(e)}")
-        return {"status": False, "message": str(e)}
+        return {"status": False, "message": str(e), "code": getattr(e, "status", None)}
     
     return {"status": True, "message": ""}
 
@@ -60,35 +66,35 @@ def create_backup_delete_request(backupName):
     }
 
     try:
-        api_client = client.ApiClient()
-        api_instance = client.CustomObjectsApi(api_client)
+        api_instance = custom_objects_api()
         res =  api_instance.create_namespaced_custom_object(
             group="velero.io",
             version="v1",
             namespace = get_namespace(),
             plural="deletebackuprequests",  # Use the appropriate resource type
             body=delete_request,
+            _request_timeout=REQUEST_TIMEOUT,
         )
 
         logger.info(f"Delete backup request is created for backup: {backupName}")
         logger.debug(f"Delete backup request is created: {res}")
     except Exception as e:
         logger.error(f"Exception: {str(e)}")
-        return {"status": False, "message": str(e)}
+        return {"status": False, "message": str(e), "code": getattr(e, "status", None)}
     
     return {"status": True, "message": ""}
 
 
 def create_schedule(data):
     try:
-        api_client = client.ApiClient()
-        api_instance = client.CustomObjectsApi(api_client)
+        api_instance = custom_objects_api()
         res =  api_instance.create_namespaced_custom_object(
             group="velero.io",
             version="v1",
             namespace = get_namespace(),
             plural="schedules",  # Use the appropriate resource type
             body=data,
+            _request_timeout=REQUEST_TIMEOUT,
         )
 
         logger.info(f"Schedule created: {res}")
@@ -100,14 +106,14 @@ def create_schedule(data):
 
 def create_backup(data):
     try:
-        api_client = client.ApiClient()
-        api_instance = client.CustomObjectsApi(api_client)
+        api_instance = custom_objects_api()
         res =  api_instance.create_namespaced_custom_object(
             group="velero.io",
             version="v1",
             namespace = get_namespace(),
             plural="backups",  # Use the appropriate resource type
             body=data,
+            _request_timeout=REQUEST_TIMEOUT,
         )
 
         logger.info(f"Backup created: {res}")
@@ -132,14 +138,14 @@ def create_restore(backupName):
     }
 
     try:
-        api_client = client.ApiClient()
-        api_instance = client.CustomObjectsApi(api_client)
+        api_instance = custom_objects_api()
         res =  api_instance.create_namespaced_custom_object(
             group="velero.io",
             version="v1",
             namespace = get_namespace(),
             plural="restores",  # Use the appropriate resource type
             body=restore_request,
+            _request_timeout=REQUEST_TIMEOUT,
         )
 
         logger.info(f"Restore created: {res}")
@@ -150,54 +156,46 @@ def create_restore(backupName):
     return {"status": True, "message": ""}
 
 def get_storage_list():
-    return client.CustomObjectsApi().list_namespaced_custom_object(group="velero.io", version="v1", namespace="velero", plural="backupstoragelocations") 
+    return list_custom_objects("backupstoragelocations")
 
 def get_schedule_list():
-    return client.CustomObjectsApi().list_namespaced_custom_object(group="velero.io", version="v1", namespace="velero", plural="schedules") 
+    return list_custom_objects("schedules")
 
 def get_backup_list():
-    return client.CustomObjectsApi().list_namespaced_custom_object(group="velero.io", version="v1", namespace="velero", plural="backups")
+    return list_custom_objects("backups")
 
 def get_restore_list():
-    return client.CustomObjectsApi().list_namespaced_custom_object(group="velero.io", version="v1", namespace="velero", plural="restores")
+    return list_custom_objects("restores")
 
 def get_schedule_describe(name):
-  schedule_list_response = client.CustomObjectsApi().list_namespaced_custom_object(group="velero.io", version="v1", namespace="velero", plural="schedules")
-  schedule_list = schedule_list_response.get('items', [])
-
-  for schedule in schedule_list:
-      if schedule["metadata"]["name"] == name:
-          res = client.CustomObjectsApi().get_namespaced_custom_object(group="velero.io", version="v1", namespace="velero", plural="schedules", name=name)
-          return parse_describe_response(res)
-      
-  return ""
+  schedule = get_custom_object("schedules", name)
+  return parse_describe_response(schedule) if schedule else ""
 
 def get_restore_describe(name):
-  restoreListResponse = client.CustomObjectsApi().list_namespaced_custom_object(group="velero.io", version="v1", namespace="velero", plural="restores")
-  restoreList = restoreListResponse.get('items', [])
-
-  for restore in restoreList:
-    if restore["metadata"]["name"] == name:
-      res = client.CustomObjectsApi().get_namespaced_custom_object(group="velero.io", version="v1", namespace="velero", plural="restores", name=name)
-      return parse_describe_response(res)
-    
-  return ""    
+  restore = get_custom_object("restores", name)
+  return parse_describe_response(restore) if restore else ""
 
 def get_backup_describe(name):
-  backupListResponse = client.CustomObjectsApi().list_namespaced_custom_object(group="velero.io", version="v1", namespace="velero", plural="backups")
-  backupList = backupListResponse.get('items', [])
+  backup = get_custom_object("backups", name)
+  return parse_describe_response(backup) if backup else ""
 
-  for backup in backupList:
-    if backup["metadata"]["name"] == name:
-      res = client.CustomObjectsApi().get_namespaced_custom_object(group="velero.io", version="v1", namespace="velero", plural="backups", name=name)
-      return parse_describe_response(res)
-    
-  return ""
+# Describe several objects of a plural at once. Return a dict of name to
+# description for the ones that exist.
+def get_describes(plural, names):
+  if len(names) > MAX_DESCRIBE_BATCH:
+    raise ValueError(f"Cannot describe more than {MAX_DESCRIBE_BATCH} objects at once")
 
-def get_restore_log(name):
+  objects = get_custom_objects(plural, list(dict.fromkeys(names)))
+  return {name: parse_describe_response(obj) for name, obj in objects.items()}
+
+# Arguments of download_file_from_minio for the log of a restore, or a message
+# explaining why there is no log to read
+def find_restore_log(name):
     # Make sure backup is not in progress 
     restore = find_restore_from_name(name)
-    phase = restore["status"]["phase"]
+    if not restore:
+        return f"Restore {name} not found"
+    phase = restore.get("status", {}).get("phase", "New")
 
     if  phase == "New" or phase == "InProgress":
         return f"Restore is in {phase} phase. Please wait until the restore is finished to retrieve log again"
@@ -213,21 +211,31 @@ def get_restore_log(name):
         else:
             file_key = "restores/" + name + "/" + file_name
 
-        return download_file_from_minio(endpoint_url=minio_endpoint, access_key=access_key, secret_key=secret_key, bucket_name=bucket_name, file_key=file_key)
+        return {"endpoint_url": minio_endpoint, "access_key": access_key, "secret_key": secret_key, "bucket_name": bucket_name, "file_key": file_key, "cacheable": phase in TERMINAL_PHASES}
     else:
         logger.debug("Cannot retrieve backup storage location")
         return "Cannot retrieve backup storage location"
-    
-def get_backup_log(name):
+
+def get_restore_log(name):
+    log_object = find_restore_log(name)
+    if isinstance(log_object, str):
+        return log_object
+    return download_file_from_minio(**log_object)
+
+# Arguments of download_file_from_minio for the log of a backup, or a message
+# explaining why there is no log to read
+def find_backup_log(name):
     # Make sure backup is not in progress 
     backup = find_backup_from_name(name)
-    phase = backup["status"]["phase"]
+    if not backup:
+        return f"Backup {name} not found"
+    phase = backup.get("status", {}).get("phase", "New")
 
     if  phase == "New" or phase == "InProgress":
         return f"Backup is in {phase} phase. Please wait until the backup is finished to retrieve log again"
     
     # Get backup location
-    minio_endpoint, bucket_name, file_prefix, access_key, secret_key = find_backup_storageLocation(name)
+    minio_endpoint, bucket_name, file_prefix, access_key, secret_key = find_backup_storageLocation(name, backup)
     file_name = name + "-logs.gz"
 
     if minio_endpoint:    
@@ -236,9 +244,13 @@ def get_backup_log(name):
         else:
             file_key = "backups/" + name + "/" + file_name
 
-        return download_file_from_minio(endpoint_url=minio_endpoint, access_key=access_key, secret_key=secret_key, bucket_name=bucket_name, file_key=file_key)
+        return {"endpoint_url": minio_endpoint, "access_key": access_key, "secret_key": secret_key, "bucket_name": bucket_name, "file_key": file_key, "cacheable": phase in TERMINAL_PHASES}
     else:
         logger.debug("Cannot retrieve backup storage location")
         return "Cannot retrieve backup storage location"
 
-
+def get_backup_log(name):
+    log_object = find_backup_log(name)
+    if isinstance(log_object, str):
+        return log_object
+    return download_file_from_minio(**log_object)
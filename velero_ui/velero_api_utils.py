@@ -1,32 +1,38 @@
 
 import yaml
-import configparser
-import gzip
-from io import BytesIO
-import base64
 import logging
-from velero_ui.kube_api import get_namespace
+from velero_ui.cache import get_custom_object
+from velero_ui.log_stream import gunzip_stream, CHUNK_SIZE
+from velero_ui.log_cache import get_log_cache
+from velero_ui.object_storage import get_s3_client, resolve_storage_location
+from velero_ui.metrics import upstream_call, count_s3_bytes
 
-from kubernetes import client
-
-import boto3
 from botocore.exceptions import ClientError
 
 logger = logging.getLogger(__name__)
 
-def download_file_from_minio(endpoint_url, access_key, secret_key, bucket_name, file_key):
-    # Initialize the S3 client with custom endpoint URL
-    s3 = boto3.client('s3',
-                      endpoint_url=endpoint_url,
-                      aws_access_key_id=access_key,
-                      aws_secret_access_key=secret_key)
+# Open a gzipped object and return a generator of its decompressed content,
+# read from object storage chunk by chunk. Return None if it cannot be opened.
+# Objects that will not change any more can be served from the log cache.
+def download_file_from_minio(endpoint_url, access_key, secret_key, bucket_name, file_key, cacheable=False):
+    s3 = get_s3_client(endpoint_url, access_key, secret_key)
+
+    log_cache = get_log_cache() if cacheable else None
     
-    # Make sure file exists
+    # Make sure file exists. The body is only read when the generator is consumed
     try:
-        s3.head_object(Bucket=bucket_name, Key=file_key)
+        if log_cache:
+            with upstream_call("s3", "head", "objects"):
+                etag = s3.head_object(Bucket=bucket_name, Key=file_key)["ETag"]
+            cached = log_cache.read(bucket_name, file_key, etag)
+            if cached is not None:
+                return cached
+
+        with upstream_call("s3", "get", "objects"):
+            response = s3.get_object(Bucket=bucket_name, Key=file_key)
         logger.debug(f"File '{file_key}' exists in bucket '{bucket_name}'")
     except ClientError as e:
-        if e.response['Error']['Code'] == '404':
+        if e.response['Error']['Code'] in ('404', 'NoSuchKey'):
             logger.error(f"File '{file_key}' does not exist in bucket '{bucket_name}'")
             return None
         else:
@@ -34,38 +40,30 @@ def download_file_from_minio(endpoint_url, access_key, secret_key, bucket_name,
             logger.error(f"An error occurred: {e}")
             return None
 
-    # Download file
+    logger.debug(f"Download " + file_key + " from " + endpoint_url)
+    body = response["Body"]
+    chunks = gunzip_stream(count_read_bytes(body.iter_chunks(CHUNK_SIZE)))
+    if log_cache:
+        chunks = log_cache.write_through(bucket_name, file_key, response["ETag"], chunks)
+
+    return stream_object_content(chunks, body, file_key, endpoint_url)
+
+def count_read_bytes(chunks):
+    for chunk in chunks:
+        count_s3_bytes(len(chunk))
+        yield chunk
+
+def stream_object_content(chunks, body, file_key, endpoint_url):
     try:
-        # Download the file from MinIO bucket to a BytesIO buffer
-        file_content = BytesIO()
-  
-        logger.debug(f"Download " + file_key + " from " + endpoint_url)
-        s3.download_fileobj(bucket_name, file_key, file_content)
-
-        # Go to the beginning of the buffer before reading
-        file_content.seek(0)
-        with gzip.GzipFile(fileobj=BytesIO(file_content.read())) as f:
-            decompressed_content = f.read()
-
-        return decompressed_content.decode('utf-8')  # Assuming the file is UTF-8 encoded
+        yield from chunks
     except Exception as e:
-        logger.error(f"Error printing file content: {e}")
-        return f"Failed to retrieve file {file_key} in {endpoint_url}"
-
-def parse_config_string(config_str):
-    config = configparser.ConfigParser()
-    config.read_string(config_str)
-
-    # Access the 'default' section values only
-    if 'default' in config:
-        credentials = {
-            'aws_access_key_id': config.get('default', 'aws_access_key_id'),
-            'aws_secret_access_key': config.get('default', 'aws_secret_access_key')
-        }
-        return credentials
-    else:
-        return None
-    
+        # Raised again so a streamed response is aborted instead of ending like
+        # a complete log, and readers of the content see the failure
+        logger.error(f"Error reading file {file_key} in {endpoint_url}: {e}")
+        raise
+    finally:
+        chunks.close()
+        body.close()
 
 def get_backup_name(yaml_content):
     try:
@@ -114,73 +112,25 @@ def is_valid_backup_yaml(yaml_content):
         return False  # Invalid YAML
 
 def find_backup_from_name(backup_name):
-    backupListResponse = client.CustomObjectsApi().list_namespaced_custom_object(group="velero.io", version="v1", namespace="velero", plural="backups")
-    backupList = backupListResponse.get('items', [])
-
-    for backup in backupList:
-        if backup["metadata"]["name"] == backup_name:
-            return backup
-
-    logger.error(f"Backup {backup_name} not found")
-    return None
+    backup = get_custom_object("backups", backup_name)
+    if backup is None:
+        logger.error(f"Backup {backup_name} not found")
+    return backup
 
 def find_restore_from_name(restore_name):
-    restoreListResponse = client.CustomObjectsApi().list_namespaced_custom_object(group="velero.io", version="v1", namespace="velero", plural="restores")
-    restoreList = restoreListResponse.get('items', [])
-
-    for restore in restoreList:
-        if restore["metadata"]["name"] == restore_name:
-            return restore
-
-    logger.error(f"Restore {restore_name} not found")
-    return None
-    
-
+    restore = get_custom_object("restores", restore_name)
+    if restore is None:
+        logger.error(f"Restore {restore_name} not found")
+    return restore
 
-def find_backup_storageLocation(backupName):
-    backupLocationsResponse = client.CustomObjectsApi().list_namespaced_custom_object(group="velero.io", version="v1", namespace="velero", plural="backupstoragelocations")  
-    backupLocations = backupLocationsResponse.get('items', [])
-    
-    if len(backupLocations) == 0:
-        logger.error(f"No backup storage found")
-        return "", "", "", "", ""
 
+def find_backup_storageLocation(backupName, backup=None):
     try:
-        backup = find_backup_from_name(backupName)
+        if backup is None:
+            backup = find_backup_from_name(backupName)
+
         if backup:
-            toFindBackupLocationbackup = backup["spec"]["storageLocation"]
-
-            for backupLocation in backupLocations:
-                if backupLocation["metadata"]["name"] == toFindBackupLocationbackup:
-                    spec = backupLocation["spec"]
-                    
-                    if "s3Url" in spec["config"]:
-                        minio_endpoint = backupLocation["spec"]["config"]["s3Url"]
-                    else:
-                        raise Exception(f"Only support S3 backup storage. Cannot find S3 URL in backup location {str(backupLocation)} of backup {str(backup)}")
-                    
-                    if "bucket" in spec["objectStorage"]:
-                        bucket_name = backupLocation["spec"]["objectStorage"]["bucket"]
-                    else:
-                        raise Exception(f"Only support S3 backup storage. Cannot find bucket name object storage configuration {str(backupLocation)} of backup {str(backup)}")
-                    
-                    if "prefix" in spec["objectStorage"]:
-                        file_prefix = backupLocation["spec"]["objectStorage"]["prefix"]
-                    else:
-                        file_prefix = ""
-
-                    secret_name = get_cloud_secret_credential()
-                    if secret_name:    
-                        secret = client.CoreV1Api().read_namespaced_secret(secret_name, get_namespace())
-                        secret_data = base64.b64decode(secret.data["cloud"]).decode('utf-8')
-                        parsed = parse_config_string(secret_data)
-                    
-                        access_key = parsed["aws_access_key_id"]
-                        secret_key = parsed["aws_secret_access_key"]
-                    else:
-                        raise Exception(f"Only support S3 backup storage. Cannot find S3 credential {str(backupLocation)} of backup {str(backup)}")
-
-                    return minio_endpoint, bucket_name, file_prefix, access_key, secret_key
+            return resolve_storage_location(backup["spec"]["storageLocation"])
         else:
             logger.error(f"No Velero backup found")
             return "", "", "", "", ""
@@ -191,22 +141,6 @@ def find_backup_storageLocation(backupName):
     return "", "", "", "", ""
 
 
-def get_cloud_secret_credential():
-    deployment = client.AppsV1Api().read_namespaced_deployment("velero", get_namespace())
-
-    # Extract the volumes from the deployment spec
-    volumes = deployment.spec.template.spec.volumes
-
-    for volume in volumes:
-        # Check if the volume is of type 'secret'
-        if volume.name == "cloud-credentials" and volume.secret:
-            return volume.secret.secret_name
-        
-    logger.error(f"Fail to look for mountned secret with name cloud-credentials to velero deployment")
-    return ""
-
-
-
 def parse_describe_response(response):
   formatted_output = f""
   for key, value in response.items():